@@ -0,0 +1,148 @@
+import json
+import queue
+import threading
+import time
+
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.client import connect
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_CLOSED = {"type": "error", "stage": "connection", "message": "connection closed"}
+
+
+class StreamingASRClient:
+    """Kiosk side of ``/ws/asr``: one WebSocket kept open across turns.
+
+    ``prepare`` is called before listening (connects if needed), ``send_audio`` forwards each voiced
+    frame as VAD produces it, and ``finish`` sends the end marker and waits for the final text plus
+    the reply of the ``/ask`` pipeline the server started on it. Any transport error makes
+    ``finish`` return None so the caller can fall back to recognizing the buffered audio.
+    """
+
+    def __init__(self, url, connect_timeout=3.0, reply_deadline=20.0):
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.reply_deadline = reply_deadline
+        self._ws = None
+        self._events = queue.Queue()
+        self._start = None
+        self._started = False
+        self._failed = False
+        self.speech_ended_at = None
+
+    def _connect(self):
+        if self._ws is not None:
+            return
+        started = time.monotonic()
+        self._ws = connect(self.url, open_timeout=self.connect_timeout, max_size=None)
+        logger.info(f"🔌 ASR stream connected in {(time.monotonic() - started) * 1000:.0f} ms")
+        threading.Thread(target=self._receive, args=(self._ws,), daemon=True).start()
+
+    def _receive(self, ws):
+        try:
+            for message in ws:
+                if isinstance(message, bytes):
+                    self._events.put(message)
+                    continue
+                data = json.loads(message)
+                if data.get("type") == "partial":
+                    logger.debug(f"📝 partial: {data.get('text')}")
+                else:
+                    self._events.put(data)
+        except ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.warning(f"ASR stream receive failed: {e}")
+        finally:
+            if self._ws is ws:
+                self._ws = None
+            self._events.put(_CLOSED)
+
+    def prepare(self, session_id, sample_rate, stream_tts=False, inline_audio=False) -> bool:
+        # เชื่อมต่อไว้ก่อนลูกค้าพูด ส่ง start จริงตอนได้ frame แรก (ไม่เปิด stream ค้างไว้ตอนเงียบ)
+        self._start = {"type": "start", "session_id": session_id, "sample_rate": sample_rate,
+                       "stream_tts": stream_tts, "inline_audio": inline_audio}
+        self._started = False
+        self._failed = False
+        self.speech_ended_at = None
+        while not self._events.empty():
+            self._events.get_nowait()
+        try:
+            self._connect()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ ASR stream unavailable, will recognize after speech: {e}")
+            self._failed = True
+            return False
+
+    def send_audio(self, frame: bytes):
+        if self._failed:
+            return
+        try:
+            if not self._started:
+                self._ws.send(json.dumps(self._start))
+                self._started = True
+            self._ws.send(frame)
+        except Exception as e:
+            logger.warning(f"⚠️ ASR stream send failed: {e}")
+            self._failed = True
+
+    def cancel(self):
+        if self._started and not self._failed and self._ws is not None:
+            try:
+                self._ws.send(json.dumps({"type": "cancel"}))
+            except Exception:
+                pass
+        self._started = False
+
+    def finish(self):
+        """Return ``(text, reply)`` from the server, or None if the stream broke."""
+        self.speech_ended_at = time.monotonic()
+        if self._failed or not self._started or self._ws is None:
+            return None
+        try:
+            self._ws.send(json.dumps({"type": "end"}))
+        except Exception as e:
+            logger.warning(f"⚠️ ASR stream end failed: {e}")
+            return None
+        deadline = self.speech_ended_at + self.reply_deadline
+
+        final = self._next(deadline)
+        if final is None or final.get("type") != "final":
+            return None
+        text = final.get("text", "")
+        logger.info(f"🎙️ Final in {(time.monotonic() - self.speech_ended_at) * 1000:.0f} ms: {text}")
+        if not text:
+            return "", None
+
+        reply = self._next(deadline)
+        if reply is None or reply.get("type") != "reply":
+            # ได้ข้อความแล้วแต่ pipeline ล้ม ให้ฝั่งเรียกส่ง /ask เองได้
+            return text, None
+        reply.pop("type")
+        if reply.get("audio_bytes") is not None:
+            audio = self._next(deadline, binary=True)
+            if audio is None:
+                return text, None
+            reply["audio"] = audio
+        return text, reply
+
+    def _next(self, deadline, binary=False):
+        try:
+            event = self._events.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            logger.warning("⏱️ ASR stream reply deadline exceeded")
+            return None
+        if isinstance(event, bytes) != binary:
+            if isinstance(event, dict) and event.get("type") == "error":
+                logger.warning(f"⚠️ ASR stream {event.get('stage')} error: {event.get('message')}")
+            return None
+        return event
+
+    def close(self):
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            ws.close()
@@ -0,0 +1,203 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ConnectTimeoutError
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RETRY_STATUSES = {502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+
+class CircuitBreaker:
+    """closed -> open after ``failure_threshold`` consecutive failures -> half-open after ``reset_seconds``.
+
+    While open every call fails fast; in half-open one probe is let through and its result
+    decides whether the circuit closes again.
+    """
+
+    def __init__(self, failure_threshold=3, reset_seconds=10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("✅ Server healthy again, circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                logger.warning(f"⛔ Circuit open after {self.failures} failures, failing fast for {self.reset_seconds:g}s")
+
+
+class _ConnectTimer:
+    # นับ connection ใหม่และเวลา TCP/TLS handshake (ดูว่า Wi-Fi ของสาขาช้าตรงไหน)
+    opened = 0
+    total_ms = 0.0
+
+    def connect(self):
+        start = time.monotonic()
+        super().connect()
+        ms = (time.monotonic() - start) * 1000
+        _ConnectTimer.opened += 1
+        _ConnectTimer.total_ms += ms
+        logger.info(f"🔌 New connection to {self.host}:{self.port} in {ms:.0f} ms")
+
+
+class _TimedHTTPConnection(_ConnectTimer, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_ConnectTimer, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def _not_sent(exc: Exception) -> bool:
+    # ต่อ server ไม่ติดเลย = request ยังไม่ถูกส่ง จึง retry ได้แม้ไม่ idempotent (เช่น /ask)
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = exc.args[0] if exc.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class HttpClient:
+    """One keep-alive ``requests.Session`` for all calls to the kiosk server.
+
+    Every call has an overall deadline; each attempt's timeout is capped by what is left of it.
+    Idempotent calls are retried on connection errors, timeouts and 502/503/504 with full-jitter
+    exponential backoff; non-idempotent calls only when the request never reached the server.
+    Any 5xx counts as a failure for the circuit breaker, retried or not.
+    """
+
+    def __init__(self, base_url, retry_count=3, retry_delay=1.0, connect_timeout=3.0,
+                 breaker_failures=3, breaker_reset_seconds=10.0, pool_size=4):
+        self.base_url = base_url.rstrip("/")
+        self.retry_count = retry_count
+        self.retry_delay = retry_delay
+        self.connect_timeout = connect_timeout
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset_seconds)
+        self.session = requests.Session()
+        adapter = _TimedAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.retries = 0
+
+    def request(self, method, path, deadline, idempotent=None, **kwargs) -> requests.Response:
+        if idempotent is None:
+            idempotent = method in ("GET", "HEAD", "PUT", "DELETE")
+        url = f"{self.base_url}{path}"
+        expires_at = time.monotonic() + deadline
+
+        for attempt in range(self.retry_count + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"circuit open, not calling {path}")
+
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                raise requests.exceptions.Timeout(f"deadline of {deadline:.1f}s exceeded for {path}")
+            started = time.monotonic()
+            try:
+                res = self.session.request(
+                    method, url, timeout=(min(self.connect_timeout, remaining), remaining), **kwargs
+                )
+            except requests.RequestException as e:
+                self.breaker.record_failure()
+                retryable = idempotent or _not_sent(e)
+                error = e
+            else:
+                if res.status_code < 500:
+                    self.breaker.record_success()
+                    elapsed_ms = (time.monotonic() - started) * 1000
+                    logger.debug(f"{method} {path} -> {res.status_code} in {elapsed_ms:.0f} ms (attempt {attempt + 1})")
+                    return res
+                # 5xx ทุกตัวนับเป็นความล้มเหลวของ server (เปิดวงจรได้) แต่ retry เฉพาะที่อาจหายเอง
+                self.breaker.record_failure()
+                if res.status_code not in RETRY_STATUSES:
+                    return res
+                retryable = idempotent
+                error = requests.HTTPError(f"{res.status_code} from {path}", response=res)
+                if not retryable or attempt == self.retry_count:
+                    return res
+
+            if not retryable or attempt == self.retry_count:
+                raise error
+            # full jitter: กระจายจังหวะ retry ไม่ให้ทุกตู้ยิงพร้อมกันตอน server ฟื้น
+            backoff = random.uniform(0, self.retry_delay * (2 ** attempt))
+            if time.monotonic() + backoff >= expires_at:
+                raise error
+            self.retries += 1
+            logger.warning(f"🔁 Retry {attempt + 1}/{self.retry_count} for {method} {path} in {backoff:.2f}s: {error}")
+            time.sleep(backoff)
+        raise requests.exceptions.RetryError(f"retries exhausted for {path}")
+
+    def get(self, path, deadline, **kwargs):
+        return self.request("GET", path, deadline, **kwargs)
+
+    def post(self, path, deadline, idempotent=False, **kwargs):
+        return self.request("POST", path, deadline, idempotent=idempotent, **kwargs)
+
+    def stats(self):
+        return {
+            "connections_opened": _ConnectTimer.opened,
+            "connect_ms_total": round(_ConnectTimer.total_ms, 1),
+            "retries": self.retries,
+            "circuit": self.breaker.state,
+        }
@@ -1,20 +1,40 @@
-import requests
-import tempfile
-import os
-import pygame
-from config import SERVER_HOST
+import json
+import struct
+from api.asr_stream import StreamingASRClient
+from api.http_client import HttpClient
+from audio.player import player, Playback
+from config import (
+    SERVER_HOST, ASR_WS_URL, TTS_STREAMING, INLINE_AUDIO, RETRY_COUNT, RETRY_DELAY, CONNECT_TIMEOUT,
+    ASK_DEADLINE, TTS_DEADLINE, RESET_DEADLINE, CIRCUIT_FAILURES, CIRCUIT_RESET_SECONDS,
+)
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+INLINE_REPLY_MEDIA_TYPE = "application/x-vera-reply"
+
+http = HttpClient(
+    SERVER_HOST,
+    retry_count=RETRY_COUNT,
+    retry_delay=RETRY_DELAY,
+    connect_timeout=CONNECT_TIMEOUT,
+    breaker_failures=CIRCUIT_FAILURES,
+    breaker_reset_seconds=CIRCUIT_RESET_SECONDS,
+)
+
+asr_stream = StreamingASRClient(ASR_WS_URL, connect_timeout=CONNECT_TIMEOUT, reply_deadline=ASK_DEADLINE)
+
 
 def send_text_to_server(text, session_id="default-session"):
     try:
-        response = requests.post(
-            f"{SERVER_HOST}/ask",
-            json={"text": text, "session_id": session_id}
+        response = http.post(
+            "/ask",
+            ASK_DEADLINE,
+            json={"text": text, "session_id": session_id, "stream_tts": TTS_STREAMING, "inline_audio": INLINE_AUDIO}
         )
         if response.status_code == 200:
+            if response.headers.get("content-type", "").startswith(INLINE_REPLY_MEDIA_TYPE):
+                return decode_inline_reply(response.content)
             return response.json()
         else:
             logger.warning(f"Server responded with status {response.status_code}: {response.text}")
@@ -24,30 +44,93 @@ def send_text_to_server(text, session_id="default-session"):
         return None
 
 
+def listen_and_ask(listener, session_id="default-session", barge_in=None):
+    # ส่งเสียงไป ASR ฝั่ง server ระหว่างพูด แล้วได้คำตอบของ /ask กลับมาทาง WebSocket เดียวกัน
+    text, reply = listener.listen_streaming(asr_stream, session_id, stream_tts=TTS_STREAMING,
+                                            inline_audio=INLINE_AUDIO, barge_in=barge_in)
+    if text and reply is None:
+        reply = send_text_to_server(text, session_id)
+    return text, reply
+
+
+def decode_inline_reply(body):
+    # 4 ไบต์ความยาว header + JSON header + เสียง
+    (size,) = struct.unpack(">I", body[:4])
+    reply = json.loads(body[4:4 + size].decode("utf-8"))
+    reply["audio"] = body[4 + size:]
+    return reply
+
+
+def fetch_tts(tts_url):
+    res = http.get(tts_url, TTS_DEADLINE)
+    if res.status_code != 200:
+        logger.warning(f"TTS not found: {res.status_code}")
+        return []
+    return [res.content]
+
+
+def _read_exact(raw, size):
+    buf = b""
+    while len(buf) < size:
+        chunk = raw.read(size - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return buf
+
+
+def _iter_audio_frames(res):
+    # แต่ละท่อน: ความยาว 4 ไบต์ (big-endian) + ข้อมูล MP3
+    while True:
+        header = _read_exact(res.raw, 4)
+        if header is None:
+            return
+        (size,) = struct.unpack(">I", header)
+        audio = _read_exact(res.raw, size)
+        if audio is None:
+            return
+        yield audio
+
+
+def iter_tts_stream(stream_url):
+    # ท่อนถัดไปดาวน์โหลดระหว่างที่ท่อนก่อนหน้ากำลังเล่น (generator ถูกอ่านในเธรดของ player)
+    with http.get(stream_url, TTS_DEADLINE, params={"framed": "true"}, stream=True) as res:
+        if res.status_code != 200:
+            logger.warning(f"TTS stream not found: {res.status_code}")
+            return
+        yield from _iter_audio_frames(res)
+
+
+def play_tts_async(tts_url=None, stream_url=None, audio=None, on_done=None) -> Playback:
+    if audio:
+        return player.play_bytes(audio, on_done)
+    if stream_url:
+        return player.play(iter_tts_stream(stream_url), on_done)
+    return player.play(_lazy(fetch_tts, tts_url), on_done)
+
+
+def _lazy(fn, *args):
+    # ให้การดาวน์โหลดเกิดในเธรดของ player ไม่ block ผู้เรียก
+    yield from fn(*args)
+
+
 def play_tts(tts_url):
-    try:
-        url = f"{SERVER_HOST}{tts_url}"
-        res = requests.get(url)
-        if res.status_code == 200:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-                tmp.write(res.content)
-                tmp.flush()
-                pygame.mixer.init()
-                pygame.mixer.music.load(tmp.name)
-                pygame.mixer.music.play()
-                while pygame.mixer.music.get_busy():
-                    pass
-            os.unlink(tmp.name)
-        else:
-            logger.warning(f"TTS not found: {res.status_code}")
-    except Exception as e:
-        logger.error(f"Error playing TTS: {e}")
+    playback = play_tts_async(tts_url=tts_url)
+    playback.wait()
+
+
+def play_tts_stream(stream_url):
+    playback = play_tts_async(stream_url=stream_url)
+    playback.wait()
 
 
 def reset_session(session_id="default-session"):
     try:
-        response = requests.post(
-            f"{SERVER_HOST}/reset-session",
+        # reset ซ้ำได้ผลเหมือนเดิม จึง retry ได้
+        response = http.post(
+            "/reset-session",
+            RESET_DEADLINE,
+            idempotent=True,
             json={"session_id": session_id}
         )
         if response.status_code == 200:
@@ -0,0 +1,144 @@
+import io
+import threading
+import time
+
+import pygame
+
+from config import PLAYBACK_FREQUENCY
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Playback:
+    """Handle for one reply being played; ``done`` is set when the last chunk finishes."""
+
+    def __init__(self):
+        self.created_at = time.monotonic()
+        self.first_sound_at = None
+        self.finished_at = None
+        self.error = None
+        self.done = threading.Event()
+        self._stop = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def time_to_first_sound(self):
+        if self.first_sound_at is None:
+            return None
+        return self.first_sound_at - self.created_at
+
+    def wait(self, timeout=None) -> bool:
+        return self.done.wait(timeout)
+
+    def stop(self):
+        self._stop.set()
+
+    def add_done_callback(self, fn):
+        with self._lock:
+            if not self.done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self, error=None):
+        self.error = error
+        self.finished_at = time.monotonic()
+        with self._lock:
+            self.done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception as e:
+                logger.error(f"Playback callback failed: {e}")
+
+
+class AudioPlayer:
+    """Plays reply audio from memory on one reserved mixer channel.
+
+    The mixer is initialised once. Each chunk is decoded from a BytesIO (no temp files) and the
+    playback thread sleeps on an Event for the clip's duration instead of polling ``get_busy``.
+    While one chunk plays, the next one is downloaded and decoded.
+    """
+
+    def __init__(self, frequency=24000, buffer_size=1024):
+        self.frequency = frequency
+        self.buffer_size = buffer_size
+        self._channel = None
+        self._init_lock = threading.Lock()
+        # ตรวจ stop + สั่งเล่น/หยุด channel แบบ atomic กันเธรดเก่าไปหยุดเสียงของคำตอบใหม่
+        self._channel_lock = threading.Lock()
+        self._current = None
+
+    def _ensure_mixer(self):
+        with self._init_lock:
+            if self._channel is None:
+                if not pygame.mixer.get_init():
+                    # 24kHz ตรงกับเสียงจาก Google TTS ไม่ต้อง resample
+                    pygame.mixer.init(frequency=self.frequency, buffer=self.buffer_size)
+                pygame.mixer.set_reserved(1)
+                self._channel = pygame.mixer.Channel(0)
+        return self._channel
+
+    def play(self, chunks, on_done=None) -> Playback:
+        """Start playing an iterable of encoded audio chunks (MP3/WAV bytes) in the background."""
+        self.stop()
+        playback = Playback()
+        if on_done is not None:
+            playback.add_done_callback(on_done)
+        self._current = playback
+        threading.Thread(target=self._run, args=(playback, chunks), daemon=True).start()
+        return playback
+
+    def play_bytes(self, audio: bytes, on_done=None) -> Playback:
+        return self.play([audio], on_done)
+
+    def stop(self):
+        current = self._current
+        if current is not None and not current.done.is_set():
+            with self._channel_lock:
+                current.stop()
+                if self._channel is not None:
+                    self._channel.stop()
+
+    def _run(self, playback: Playback, chunks):
+        error = None
+        try:
+            channel = self._ensure_mixer()
+            ends_at = time.monotonic()
+            for audio in chunks:
+                if playback._stop.is_set():
+                    break
+                sound = pygame.mixer.Sound(file=io.BytesIO(audio))
+                # รอท่อนก่อนหน้าจบโดยไม่ spin
+                if playback._stop.wait(max(0.0, ends_at - time.monotonic())):
+                    break
+                with self._channel_lock:
+                    if playback._stop.is_set():
+                        break
+                    channel.play(sound)
+                now = time.monotonic()
+                if playback.first_sound_at is None:
+                    playback.first_sound_at = now
+                    logger.info(f"⏱️ Time to first sound: {playback.time_to_first_sound * 1000:.0f} ms")
+                ends_at = now + sound.get_length()
+
+            if not playback._stop.wait(max(0.0, ends_at - time.monotonic())):
+                # เผื่อ buffer ของ mixer ที่ยังเล่นไม่หมด
+                while channel.get_busy() and not playback._stop.wait(0.01):
+                    pass
+            if playback._stop.is_set():
+                with self._channel_lock:
+                    # Playback.stop() (เช่นลูกค้าพูดแทรก) ต้องตัดเสียงท่อนที่กำลังเล่นด้วย
+                    if self._current is playback:
+                        channel.stop()
+        except Exception as e:
+            error = e
+            logger.error(f"Error playing audio: {e}")
+        finally:
+            playback._finish(error)
+
+
+player = AudioPlayer(frequency=PLAYBACK_FREQUENCY)
@@ -0,0 +1,156 @@
+"""Kiosk playback CPU and time-to-first-sound: legacy play_tts vs. the in-memory AudioPlayer.
+
+    cd client && python -m benchmarks.bench_playback --dummy-audio
+
+Serves generated WAV replies from a local HTTP server (/speak/<id>, and framed
+/speak-stream/<id> with a delay between sentences) and plays each one with the old
+temp-file + busy-wait code and with ``audio.player``. CPU is process CPU time (all threads)
+divided by wall time while a reply plays.
+"""
+import argparse
+import io
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_wav(seconds: float, rate: int = 24000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"".join(struct.pack("<h", int(3000 * math.sin(i / 8))) for i in range(int(seconds * rate))))
+    return buf.getvalue()
+
+
+class Handler(BaseHTTPRequestHandler):
+    sentences = []
+    sentence_delay = 0.0
+    total_seconds = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/speak-stream/"):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.end_headers()
+            for audio in self.sentences:
+                time.sleep(self.sentence_delay)  # ประโยคถัดไปยังสังเคราะห์ไม่เสร็จ
+                self.wfile.write(struct.pack(">I", len(audio)) + audio)
+                self.wfile.flush()
+            return
+        audio = make_wav(self.total_seconds)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Content-Length", str(len(audio)))
+        self.end_headers()
+        self.wfile.write(audio)
+
+
+# --- legacy implementation (client/api/server_api.py before AudioPlayer), timestamps added ---
+
+def legacy_play_tts(host, tts_url, marks):
+    import pygame
+    import requests
+    res = requests.get(f"{host}{tts_url}")
+    # suffix .wav แทน .mp3 เพราะเสียงทดสอบเป็น WAV (ไม่มี MP3 encoder)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
+        tmp.write(res.content)
+        tmp.flush()
+        pygame.mixer.init()
+        pygame.mixer.music.load(tmp.name)
+        pygame.mixer.music.play()
+        marks["first_sound"] = time.monotonic()
+        while pygame.mixer.music.get_busy():
+            pass
+    os.unlink(tmp.name)
+
+
+def legacy_play_tts_stream(host, stream_url, marks):
+    import pygame
+    import requests
+    from api.server_api import _iter_audio_frames
+    with requests.get(f"{host}{stream_url}", params={"framed": "true"}, stream=True) as res:
+        pygame.mixer.init()
+        for audio in _iter_audio_frames(res):
+            while pygame.mixer.music.get_busy():
+                time.sleep(0.01)
+            pygame.mixer.music.load(io.BytesIO(audio), "wav")
+            pygame.mixer.music.play()
+            marks.setdefault("first_sound", time.monotonic())
+        while pygame.mixer.music.get_busy():
+            time.sleep(0.01)
+
+
+def measure(fn, rounds):
+    cpu = wall = ttfs = 0.0
+    for _ in range(rounds):
+        marks = {}
+        c0, t0 = time.process_time(), time.monotonic()
+        fn(marks)
+        cpu += time.process_time() - c0
+        wall += time.monotonic() - t0
+        ttfs += marks["first_sound"] - t0
+    return {"cpu_pct": cpu / wall * 100, "ttfs_ms": ttfs / rounds * 1000, "wall_s": wall / rounds}
+
+
+def main(args):
+    if args.dummy_audio:
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    from api import server_api
+    from audio.player import AudioPlayer
+
+    Handler.sentences = [make_wav(args.sentence_s) for _ in range(args.sentences)]
+    Handler.sentence_delay = args.sentence_delay_ms / 1000
+    Handler.total_seconds = args.sentence_s * args.sentences
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    host = f"http://127.0.0.1:{httpd.server_port}"
+    server_api.http = server_api.HttpClient(host)
+
+    player = AudioPlayer()
+    server_api.player = player
+
+    def new_play(url, stream):
+        def run(marks):
+            if stream:
+                playback = server_api.play_tts_async(stream_url=url)
+            else:
+                playback = server_api.play_tts_async(tts_url=url)
+            playback.wait()
+            marks["first_sound"] = playback.first_sound_at
+        return run
+
+    results = {
+        "legacy /speak": measure(lambda m: legacy_play_tts(host, "/speak/x", m), args.rounds),
+        "player /speak": measure(new_play("/speak/x", False), args.rounds),
+    }
+    pygame.mixer.quit()
+    results["legacy /speak-stream"] = measure(lambda m: legacy_play_tts_stream(host, "/speak-stream/x", m), args.rounds)
+    pygame.mixer.quit()
+    player._channel = None
+    results["player /speak-stream"] = measure(new_play("/speak-stream/x", True), args.rounds)
+    httpd.shutdown()
+
+    print(f"reply = {args.sentences} x {args.sentence_s}s sentences, stream delay {args.sentence_delay_ms}ms")
+    for name, r in results.items():
+        print(f"{name:22s} cpu={r['cpu_pct']:5.1f}%  time-to-first-sound={r['ttfs_ms']:7.1f}ms  wall={r['wall_s']:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentences", type=int, default=3)
+    parser.add_argument("--sentence-s", type=float, default=1.0)
+    parser.add_argument("--sentence-delay-ms", type=float, default=150)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--dummy-audio", action="store_true", help="use SDL's dummy driver (no sound card)")
+    main(parser.parse_args())
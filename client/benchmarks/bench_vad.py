@@ -0,0 +1,167 @@
+"""VAD front-end cost without a microphone: legacy _record_and_detect loop vs. voice.vad_pipeline.
+
+    cd client && python -m benchmarks.bench_vad recordings/*.wav
+    cd client && python -m benchmarks.bench_vad            # synthetic speech-like test signal
+
+WAV files (mono or stereo, 16-bit, any rate) are converted to 48 kHz mono and cut into 30 ms
+frames, then pushed through both pipelines including the capture hand-off (``bytes(indata)`` on
+a ``queue.Queue`` vs. copy into a preallocated slot + index on a ``SimpleQueue``). Reports CPU
+per frame, the utterances each one finds, and the bytes an utterance hands to ASR.
+
+The barge-in part mixes a reply playing through the kiosk speaker into the microphone and shows
+when the normal trigger and the stricter barge-in trigger fire.
+"""
+import argparse
+import collections
+import queue
+import time
+import wave
+
+import numpy as np
+import webrtcvad
+
+from voice.vad_pipeline import SpeechDetector
+
+MIC_RATE = 48000
+FRAME_MS = 30
+FRAME_SIZE = MIC_RATE * FRAME_MS // 1000
+
+
+def load_wav(path) -> np.ndarray:
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM is supported")
+        data = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+        channels, rate = w.getnchannels(), w.getframerate()
+    if channels > 1:
+        data = data.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if rate != MIC_RATE:
+        t = np.arange(int(len(data) * MIC_RATE / rate)) * rate / MIC_RATE
+        data = np.interp(t, np.arange(len(data)), data).astype(np.int16)
+    return data
+
+
+def synthetic_speech(seconds_on=(1.2, 2.0, 0.8), gap_s=1.0, seed=1) -> np.ndarray:
+    # เสียงคล้ายพูด: harmonic ของ pitch ที่แกว่ง + มอดูเลตตามจังหวะพยางค์ ~4Hz คั่นด้วยความเงียบ+noise เบาๆ
+    rng = np.random.default_rng(seed)
+    parts = [rng.normal(0, 30, int(gap_s * MIC_RATE))]
+    for on in seconds_on:
+        t = np.arange(int(on * MIC_RATE)) / MIC_RATE
+        pitch = 140 + 30 * np.sin(2 * np.pi * 1.5 * t)
+        phase = 2 * np.pi * np.cumsum(pitch) / MIC_RATE
+        voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+        envelope = 0.55 + 0.45 * np.sin(2 * np.pi * 4 * t)
+        parts.append(6000 * voice * envelope / 3 + rng.normal(0, 200, len(t)))
+        parts.append(rng.normal(0, 30, int(gap_s * MIC_RATE)))
+    return np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16)
+
+
+def frames_of(samples: np.ndarray) -> np.ndarray:
+    n = len(samples) // FRAME_SIZE
+    return samples[:n * FRAME_SIZE].reshape(n, FRAME_SIZE)
+
+
+# --- legacy implementation (voice_listener.py before vad_pipeline), one utterance after another ---
+
+def legacy_run(frames: np.ndarray, aggressiveness: int):
+    vad = webrtcvad.Vad(aggressiveness)
+    audio_queue = queue.Queue()
+    utterances = []
+    ring_buffer = collections.deque(maxlen=10)
+    triggered = False
+    voiced_frames = []
+    silence_counter = 0
+    start = 0
+    for index, indata in enumerate(frames):
+        audio_queue.put(bytes(indata.data))  # _callback
+        frame = audio_queue.get(timeout=1)
+        is_speech = vad.is_speech(frame, MIC_RATE)
+        if not triggered:
+            ring_buffer.append((frame, is_speech))
+            num_voiced = len([f for f, speech in ring_buffer if speech])
+            if num_voiced > 0.8 * ring_buffer.maxlen:
+                triggered = True
+                start = index - len(ring_buffer) + 1
+                voiced_frames.extend(f for f, s in ring_buffer)
+                ring_buffer.clear()
+        else:
+            voiced_frames.append(frame)
+            silence_counter = silence_counter + 1 if not is_speech else 0
+            if silence_counter > 6:
+                utterances.append((start, index, len(b"".join(voiced_frames))))
+                ring_buffer.clear()
+                triggered = False
+                voiced_frames = []
+                silence_counter = 0
+    return utterances
+
+
+def pipeline_run(frames: np.ndarray, aggressiveness: int, rate: int, strict=False):
+    detector = SpeechDetector(webrtcvad.Vad(aggressiveness), in_rate=MIC_RATE, rate=rate, frame_ms=FRAME_MS)
+    slots = np.zeros((64, FRAME_SIZE), dtype=np.int16)
+    ready = queue.SimpleQueue()
+    utterances = []
+    start = 0
+    for index, indata in enumerate(frames):
+        slots[index % len(slots)] = indata  # _callback
+        ready.put(index)
+        frame = slots[ready.get(timeout=1) % len(slots)]
+        event = detector.process(frame, strict=strict)
+        if event == "start":
+            start = index - detector.window.size + 1
+        elif event == "end":
+            utterances.append((start, index, len(detector.utterance.tobytes())))
+            detector.reset()
+    return utterances
+
+
+def first_trigger(frames: np.ndarray, echo: np.ndarray, rate: int, strict: bool):
+    # ลำโพงเล่นคำตอบ (echo เข้าไมค์) จนกว่า detector จะ trigger แล้วหยุดเสียง
+    detector = SpeechDetector(webrtcvad.Vad(2), in_rate=MIC_RATE, rate=rate, frame_ms=FRAME_MS)
+    for index, frame in enumerate(frames):
+        mixed = np.clip(frame.astype(np.int32) + echo[index % len(echo)], -32768, 32767).astype(np.int16)
+        if detector.process(mixed, strict=strict) == "start":
+            return index
+    return None
+
+
+def measure(name, fn, frames, rounds):
+    best = float("inf")
+    result = None
+    for _ in range(rounds):
+        c0 = time.process_time()
+        result = fn(frames)
+        best = min(best, time.process_time() - c0)
+    us = best / len(frames) * 1e6
+    print(f"  {name:24s} {us:7.1f} us/frame ({us / (FRAME_MS * 10):.2f}% of one core)  utterances={len(result)}")
+    for start, end, size in result:
+        print(f"    {start * FRAME_MS / 1000:6.2f}s - {end * FRAME_MS / 1000:6.2f}s  {size / 1024:7.1f} KiB to ASR")
+    return us
+
+
+def main(args):
+    inputs = [(path, load_wav(path)) for path in args.wav] or [("synthetic", synthetic_speech())]
+    for name, samples in inputs:
+        frames = frames_of(samples)
+        print(f"{name}: {len(frames) * FRAME_MS / 1000:.1f}s, {len(frames)} frames")
+        measure("legacy 48k", lambda f: legacy_run(f, args.aggressiveness), frames, args.rounds)
+        measure("pipeline 48k", lambda f: pipeline_run(f, args.aggressiveness, MIC_RATE), frames, args.rounds)
+        measure("pipeline 16k", lambda f: pipeline_run(f, args.aggressiveness, 16000), frames, args.rounds)
+
+    # barge-in: ลูกค้าพูดทับเสียงคำตอบที่ดังออกลำโพง (echo เบากว่าเสียงลูกค้าตาม --echo-gain)
+    frames = frames_of(synthetic_speech(seconds_on=(2.0,), gap_s=1.5, seed=2))
+    echo = (frames_of(synthetic_speech(seconds_on=(6.0,), gap_s=0.0, seed=3)) * args.echo_gain).astype(np.int16)
+    print(f"barge-in: reply audio at {args.echo_gain:.2f}x level, customer starts at 1.50s")
+    for label, strict in (("normal trigger", False), ("barge-in trigger", True)):
+        index = first_trigger(frames, echo, 16000, strict)
+        when = f"{index * FRAME_MS / 1000:.2f}s" if index is not None else "never"
+        print(f"  {label:24s} fires at {when}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("wav", nargs="*", help="16-bit PCM WAV recordings (default: synthetic signal)")
+    parser.add_argument("--aggressiveness", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--echo-gain", type=float, default=0.6, help="speaker echo level relative to the customer")
+    main(parser.parse_args())
@@ -9,10 +9,44 @@ SERVER_HOST = "http://localhost:8000"
 # Audio settings (if needed later)
 INPUT_DEVICE_INDEX = None  # หรือกำหนดเป็น index ของ mic เฉพาะ
 OUTPUT_DEVICE_INDEX = None
+PLAYBACK_FREQUENCY = 24000  # sample rate ของเสียง Google TTS
+VAD_SAMPLE_RATE = 16000  # ลดจาก 48kHz ของไมค์ก่อนเข้า VAD/ASR (None = ใช้ rate ของไมค์)
+# Listen while the reply is playing and stop it when the customer starts talking
+BARGE_IN = True
+BARGE_IN_MIN_RMS = 1000  # RMS (int16) ขั้นต่ำของการพูดแทรก กันเสียงลำโพงของตู้เอง ปรับตามความดังลำโพงแต่ละตู้
 
 
 SESSION_ID="kiosk-session-001"
 
+# Stream reply audio sentence by sentence (/speak-stream) instead of one finished MP3
+TTS_STREAMING = True
+# Get the reply audio inside the /ask response (one round trip) when not streaming
+INLINE_AUDIO = True
+# Stream microphone audio to the server's recognizer (/ws/asr) while the customer is still speaking
+ASR_STREAMING = True
+ASR_WS_URL = SERVER_HOST.replace("http", "ws", 1) + "/ws/asr"
+
+# Longest time the kiosk may stay in each state (seconds) before it gives up: silence while listening or
+# confirming goes IDLE, anything else returns to START. "idle" has no entry: it waits for a voice.
+STATE_TIMEOUTS = {
+    "start": 10.0,
+    "greeting": 25.0,  # reset + /ask + เสียงทักทายของลูกค้าก่อนหน้า
+    "listening": 45.0,  # ไม่มีใครพูดนานเท่านี้ถือว่าลูกค้าเดินไปแล้ว
+    "confirming": 45.0,
+    "thank_you": 20.0,
+    "end": 5.0,
+}
+
 # Timeout or retry logic
 RETRY_COUNT = 3
 RETRY_DELAY = 1.0
+# Server answered "please_wait" (overloaded): resend the same text after its retry_after_ms, at most this many times
+BUSY_RESEND_LIMIT = 3
+
+# HTTP transport (one keep-alive session, seconds)
+CONNECT_TIMEOUT = 3.0
+ASK_DEADLINE = 20.0  # รวม LLM + TTS ฝั่ง server
+TTS_DEADLINE = 15.0
+RESET_DEADLINE = 5.0
+CIRCUIT_FAILURES = 3  # ล้มเหลวติดกันกี่ครั้งถึงหยุดเรียกชั่วคราว
+CIRCUIT_RESET_SECONDS = 10.0
@@ -1,90 +1,240 @@
 from state_machine.state_manager import StateManager, State
-from api.server_api import send_text_to_server, reset_session, play_tts
+from api.server_api import send_text_to_server, reset_session, play_tts_async, listen_and_ask
+from config import ASR_STREAMING, BARGE_IN, STATE_TIMEOUTS, BUSY_RESEND_LIMIT
 from voice.voice_listener import VADVoiceListener
-import time
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+GREETING_TEXT = "สวัสดี"
+# ไม่มีใครพูดจน state เหล่านี้ timeout = ลูกค้าเดินไปแล้ว รอคนใหม่เงียบๆ แทนการทักทายซ้ำ
+IDLE_AFTER_TIMEOUT = (State.LISTENING, State.CONFIRMING)
+
+
 class InteractionManager:
+    """Event-driven kiosk loop: each state is a coroutine that returns the next state.
+
+    Blocking work runs off the event loop (the microphone on its own single thread, HTTP calls on
+    the default executor, audio in the player's thread), so playback, capture and network overlap:
+    the next customer's reset and greeting are fetched while "thank you" is still playing, and
+    listening starts while a reply plays (barge-in). Every state has a timeout in
+    ``STATE_TIMEOUTS``. When nobody speaks before LISTENING or CONFIRMING expires the kiosk goes
+    IDLE: the mic runs voice detection only and the greeting waits until someone speaks. Other
+    timeouts and errors go back to START.
+    """
+
     def __init__(self, session_id="kiosk-session"):
-        logging.debug("InteractionManager - Initialzied")
+        logger.debug("InteractionManager - Initialzied")
         self.session_id = session_id
         self.state = StateManager()
         self.voice_listener = VADVoiceListener()
-        
+        self.playback = None
+        self._greeting = None
+        # ไมค์มีตัวเดียว: งานฟังรันทีละงานเสมอ แม้งานเก่าที่ถูก timeout ยังปิด stream ไม่เสร็จ
+        self._mic = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mic")
+        self.handlers = {
+            State.IDLE: self.on_idle,
+            State.START: self.on_start,
+            State.GREETING: self.on_greeting,
+            State.LISTENING: self.on_listening,
+            State.CONFIRMING: self.on_confirming,
+            State.THANK_YOU: self.on_thank_you,
+            State.END: self.on_end,
+        }
 
     def run(self):
-        self.state.set_state(State.START)
+        asyncio.run(self.run_async())
 
+    async def run_async(self):
+        self.state.set_state(State.START)
         while True:
             current_state = self.state.get_state()
-
-            if current_state == State.START:
-                logging.debug("🔄 Resetting session and greeting user...")
-                reset_session(self.session_id)
-                self.state.set_state(State.GREETING)
-
-            elif current_state == State.GREETING:
-                response = send_text_to_server("สวัสดี", self.session_id)
-                self.handle_response(response)
-
-            elif current_state == State.LISTENING:
-                logging.info("🎧 Listening for user input...")
-                user_text = self.voice_listener.listen_and_recognize()
-                logging.info(f"user_text={user_text}")
-                if user_text:
-                    response = send_text_to_server(user_text, self.session_id)
-                    self.handle_response(response)
-                else:
-                    logging.info("🤷 ไม่เข้าใจเสียงที่พูด ลองใหม่อีกครั้ง")
-
-            elif current_state == State.CONFIRMING:
-                logging.info("📋 สรุปออเดอร์และยืนยัน")
-                user_text = self.voice_listener.listen_and_recognize()
-                if user_text:
-                    response = send_text_to_server(user_text, self.session_id)
-                    self.handle_response(response)
-                else:
-                    logging.warning("❌ ไม่เข้าใจคำพูดในการยืนยัน")
-                    self.state.set_state(State.LISTENING)  # หรือวนกลับให้ฟังใหม่
-
-            elif current_state == State.THANK_YOU:
-                logging.info("🙏 ขอบคุณลูกค้า")
-                time.sleep(2)
-                self.state.set_state(State.END)
-
-            elif current_state == State.END:
-                logging.info("🔁 กลับสู่การเริ่มต้นใหม่")
-                self.state.set_state(State.START)
+            timeout = STATE_TIMEOUTS.get(current_state.value)
+            try:
+                next_state = await asyncio.wait_for(self.handlers[current_state](), timeout)
+            except asyncio.TimeoutError:
+                next_state = State.IDLE if current_state in IDLE_AFTER_TIMEOUT else State.START
+                logger.warning(f"⏱️ {current_state.value} timed out after {timeout:g}s, going {next_state.value}")
+                self.abort()
+                self.state.set_state(next_state, reason="timeout")
+                continue
+            except Exception as e:
+                logger.error(f"❌ {current_state.value} failed: {e}")
+                self.abort()
+                self.state.set_state(State.START, reason="error")
+                continue
+            self.state.set_state(next_state)
+
+    # --- states ---
+
+    async def on_idle(self):
+        logger.info("💤 ตู้ว่าง รอเสียงลูกค้าคนถัดไป")
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._mic, self.voice_listener.wait_for_voice)
+        except asyncio.CancelledError:
+            self.voice_listener.abort()
+            raise
+        return State.START
+
+    async def on_start(self):
+        logger.debug("🔄 Resetting session and greeting user...")
+        if self._greeting is None:
+            self.prepare_next_customer()
+        return State.GREETING
+
+    async def on_greeting(self):
+        if self._greeting is None:
+            self.prepare_next_customer()
+        task, self._greeting = self._greeting, None
+        response = await self.resend_if_busy(GREETING_TEXT, await task)
+        # ไม่ตัดเสียงขอบคุณ/ยกเลิกของลูกค้าก่อนหน้า
+        await self.wait_for_playback()
+        return self.handle_response(response)
+
+    async def on_listening(self):
+        if not BARGE_IN:
+            await self.wait_for_playback()
+        logger.info("🎧 Listening for user input...")
+        user_text, response = await self.listen()
+        logger.info(f"user_text={user_text}")
+        if not user_text:
+            logger.info("🤷 ไม่เข้าใจเสียงที่พูด ลองใหม่อีกครั้ง")
+            return State.LISTENING
+        return self.handle_response(await self.resend_if_busy(user_text, response))
+
+    async def on_confirming(self):
+        logger.info("📋 สรุปออเดอร์และยืนยัน")
+        if not BARGE_IN:
+            await self.wait_for_playback()
+        user_text, response = await self.listen()
+        if not user_text:
+            logger.warning("❌ ไม่เข้าใจคำพูดในการยืนยัน")
+            return State.LISTENING  # หรือวนกลับให้ฟังใหม่
+        return self.handle_response(await self.resend_if_busy(user_text, response))
+
+    async def on_thank_you(self):
+        logger.info("🙏 ขอบคุณลูกค้า")
+        self.prepare_next_customer()
+        await self.wait_for_playback()
+        await asyncio.sleep(2)
+        return State.END
+
+    async def on_end(self):
+        logger.info("🔁 กลับสู่การเริ่มต้นใหม่")
+        return State.START
+
+    # --- helpers ---
+
+    def prepare_next_customer(self):
+        # reset session + ขอคำทักทายล่วงหน้า ระหว่างที่เสียงของ state ก่อนหน้ายังเล่นอยู่
+        if self._greeting is not None:
+            self._greeting.cancel()
+
+        async def prepare():
+            await asyncio.to_thread(reset_session, self.session_id)
+            return await asyncio.to_thread(send_text_to_server, GREETING_TEXT, self.session_id)
+
+        self._greeting = asyncio.create_task(prepare())
+
+    async def resend_if_busy(self, text, response):
+        # server ตอบ please_wait (คิวเต็ม/เกินโควตา) รอตาม retry_after_ms แล้วส่งข้อความเดิมซ้ำ ลูกค้าไม่ต้องพูดใหม่
+        for _ in range(BUSY_RESEND_LIMIT):
+            if not response or response.get("intent") != "please_wait":
+                break
+            delay = response.get("retry_after_ms", 1000) / 1000
+            logger.info(f"⏳ Server busy ({response.get('reason')}), resending in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            response = await asyncio.to_thread(send_text_to_server, text, self.session_id)
+        return response
+
+    async def listen(self):
+        # ฟังระหว่างที่คำตอบยังเล่นอยู่ได้ ถ้าลูกค้าพูดแทรก listener จะหยุดเสียงเอง
+        barge_in = self.playback if BARGE_IN else None
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._mic, self._listen_blocking, barge_in)
+        except asyncio.CancelledError:
+            self.voice_listener.abort()
+            raise
+
+    def _listen_blocking(self, barge_in):
+        if ASR_STREAMING:
+            return listen_and_ask(self.voice_listener, self.session_id, barge_in=barge_in)
+        user_text = self.voice_listener.listen_and_recognize(barge_in=barge_in)
+        return user_text, send_text_to_server(user_text, self.session_id) if user_text else None
 
     def handle_response(self, response_json):
         if response_json is None:
-            logging.error("❌ ไม่สามารถเชื่อมต่อกับ server หรือ server ไม่ตอบกลับ")
-            self.state.set_state(State.LISTENING)
-            return
+            logger.error("❌ ไม่สามารถเชื่อมต่อกับ server หรือ server ไม่ตอบกลับ")
+            return State.LISTENING
 
         intent = response_json.get("intent")
         tts_url = response_json.get("tts_url")
+        tts_stream_url = response_json.get("tts_stream_url")
+        audio = response_json.get("audio")
 
-        if tts_url:
-            play_tts(tts_url)
+        # เล่นเสียงใน thread ของ player แล้วเปลี่ยน state ต่อทันที
+        if audio or tts_stream_url or tts_url:
+            self.playback = play_tts_async(tts_url=tts_url, stream_url=tts_stream_url, audio=audio,
+                                           on_done=self.on_playback_done)
 
         if intent == "greeting":
-            self.state.set_state(State.LISTENING)
+            return State.LISTENING
 
-        elif intent == "add_order":
-            self.state.set_state(State.LISTENING)
+        elif intent in ("add_order", "modify_order", "remove_item"):
+            return State.LISTENING
 
         elif intent == "confirm_order":
-            self.state.set_state(State.CONFIRMING)
+            return State.CONFIRMING
 
         elif intent == "cancel_order":
-            self.state.set_state(State.START)
+            return State.START
 
         elif intent == "thank_you":
-            self.state.set_state(State.THANK_YOU)
+            return State.THANK_YOU
+
+        elif intent == "please_wait":
+            # ส่งซ้ำครบแล้วยังยุ่ง ให้ลูกค้าพูดอีกครั้ง
+            return State.LISTENING
+
+        elif intent == "clarify":
+            # server ไม่รู้ว่าหมายถึงรายการไหน/กี่แก้ว ตะกร้าไม่เปลี่ยน ให้ลูกค้าพูดใหม่
+            return State.LISTENING
+
+        elif intent == "apology":
+            # server ตอบไม่ทันงบเวลา ตะกร้าไม่เปลี่ยน ให้ลูกค้าพูดซ้ำ
+            return State.LISTENING
 
         else:
-            logging.warning(f"⚠️ ไม่รู้จัก intent: {intent}, default to LISTENING")
-            self.state.set_state(State.LISTENING)
\ No newline at end of file
+            logger.warning(f"⚠️ ไม่รู้จัก intent: {intent}, default to LISTENING")
+            return State.LISTENING
+
+    def on_playback_done(self, playback):
+        if playback.error is None and playback.time_to_first_sound is not None:
+            logger.info(f"🔈 Playback finished (first sound after {playback.time_to_first_sound * 1000:.0f} ms)")
+
+    async def wait_for_playback(self):
+        playback, self.playback = self.playback, None
+        if playback is None:
+            return
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def finished(_):
+            loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+        playback.add_done_callback(finished)
+        await done
+
+    def abort(self):
+        # งานที่ค้างอยู่ของ state ที่ timeout: หยุดไมค์ (ยกเลิก ASR stream ทิ้งข้อความที่ถอดได้) หยุดเสียง ทิ้งคำทักทายที่เตรียมไว้
+        self.voice_listener.abort()
+        if self.playback is not None:
+            self.playback.stop()
+            self.playback = None
+        if self._greeting is not None:
+            self._greeting.cancel()
+            self._greeting = None
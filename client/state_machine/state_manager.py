@@ -1,6 +1,12 @@
+import time
 from enum import Enum
 
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
 class State(Enum):
+    IDLE = "idle"
     START = "start"
     GREETING = "greeting"
     LISTENING = "listening"
@@ -11,10 +17,15 @@ class State(Enum):
 class StateManager:
     def __init__(self):
         self.state = State.START
+        self.entered_at = time.monotonic()
 
-    def set_state(self, new_state: State):
-        print(f"🔁 [State] {self.state.value} → {new_state.value}")
+    def set_state(self, new_state: State, reason: str = ""):
+        now = time.monotonic()
+        took_ms = (now - self.entered_at) * 1000
+        suffix = f" ({reason})" if reason else ""
+        logger.info(f"🔁 [State] {self.state.value} → {new_state.value} after {took_ms:.0f} ms{suffix}")
         self.state = new_state
+        self.entered_at = now
 
     def get_state(self) -> State:
         return self.state
\ No newline at end of file
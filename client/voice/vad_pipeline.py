@@ -0,0 +1,162 @@
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Downsampler:
+    """Integer-factor decimator (e.g. 48 kHz -> 16 kHz) with a windowed-sinc low-pass.
+
+    Filter history is carried across frames, and only the kept output samples are computed.
+    """
+
+    def __init__(self, in_rate, out_rate, taps=48):
+        if in_rate % out_rate:
+            raise ValueError(f"can only downsample by an integer factor ({in_rate} -> {out_rate})")
+        self.factor = in_rate // out_rate
+        n = np.arange(taps) - (taps - 1) / 2
+        kernel = np.sinc(n / self.factor) * np.hamming(taps)
+        self.kernel = (kernel / kernel.sum())[::-1].astype(np.float32)
+        self._buffer = None
+
+    def _allocate(self, frame_len):
+        # buffer = history (taps-1) + frame; view ของหน้าต่างที่ต้องคำนวณสร้างครั้งเดียว
+        taps = len(self.kernel)
+        self._buffer = np.zeros(taps - 1 + frame_len, dtype=np.float32)
+        self._windows = np.lib.stride_tricks.sliding_window_view(self._buffer, taps)[::self.factor]
+        self._out = np.empty(len(self._windows), dtype=np.float32)
+
+    def process(self, frame: np.ndarray) -> np.ndarray:
+        taps = len(self.kernel)
+        if self._buffer is None or len(self._buffer) != taps - 1 + len(frame):
+            self._allocate(len(frame))
+        buf = self._buffer
+        buf[:taps - 1] = buf[-(taps - 1):]
+        buf[taps - 1:] = frame
+        np.einsum("ij,j->i", self._windows, self.kernel, out=self._out)
+        return np.clip(self._out, -32768, 32767).astype(np.int16)
+
+
+class VoicedWindow:
+    """Last ``size`` frames in a preallocated ring with an O(1) running count of voiced frames."""
+
+    def __init__(self, size, frame_samples):
+        self.size = size
+        self.frames = np.zeros((size, frame_samples), dtype=np.int16)
+        self.flags = bytearray(size)
+        self.count = 0
+        self.voiced = 0
+        self.next = 0
+
+    def push(self, frame: np.ndarray, is_speech: bool):
+        i = self.next
+        if self.count == self.size:
+            self.voiced -= self.flags[i]
+        else:
+            self.count += 1
+        self.frames[i] = frame
+        self.flags[i] = is_speech
+        self.voiced += is_speech
+        self.next = (i + 1) % self.size
+
+    def ordered(self) -> np.ndarray:
+        # เก่าสุดก่อน (pre-roll ที่จะนำหน้าเสียงพูด)
+        if self.count < self.size:
+            return self.frames[:self.count].reshape(-1)
+        return np.concatenate((self.frames[self.next:], self.frames[:self.next])).reshape(-1)
+
+    def clear(self):
+        self.flags[:] = bytes(self.size)
+        self.count = self.voiced = self.next = 0
+
+
+class UtteranceBuffer:
+    """Preallocated sample buffer for one utterance (no per-frame list append + join)."""
+
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=np.int16)
+        self.length = 0
+
+    @property
+    def full(self) -> bool:
+        return self.length >= len(self.data)
+
+    def extend(self, samples: np.ndarray):
+        n = min(len(samples), len(self.data) - self.length)
+        self.data[self.length:self.length + n] = samples[:n]
+        self.length += n
+
+    def tobytes(self) -> bytes:
+        return self.data[:self.length].tobytes()
+
+    def clear(self):
+        self.length = 0
+
+
+class SpeechDetector:
+    """Frame-by-frame endpointing: pre-roll window -> trigger -> trailing silence ends the utterance.
+
+    Frames come in at ``in_rate`` and are downsampled to ``rate`` (16 kHz by default) before VAD,
+    so the utterance and anything passed to ``on_voiced`` are at ``rate``. With ``strict=True``
+    (reply audio still playing, i.e. barge-in) the trigger also needs ``barge_in_ratio`` voiced
+    frames and a pre-roll louder than ``barge_in_min_rms`` so the kiosk's own speaker does not
+    start a turn.
+    """
+
+    def __init__(self, vad, in_rate=48000, rate=16000, frame_ms=30, preroll_frames=10, trigger_ratio=0.8,
+                 end_silence_frames=6, max_seconds=15.0, barge_in_ratio=0.9, barge_in_min_rms=1000):
+        self.vad = vad
+        self.in_rate = in_rate
+        self.rate = rate or in_rate
+        self.frame_samples = int(self.rate * frame_ms / 1000)
+        self.downsampler = Downsampler(in_rate, self.rate) if self.rate != in_rate else None
+        self.window = VoicedWindow(preroll_frames, self.frame_samples)
+        self.utterance = UtteranceBuffer(int(max_seconds * self.rate))
+        self.trigger_voiced = trigger_ratio * preroll_frames
+        self.barge_in_voiced = barge_in_ratio * preroll_frames
+        self.barge_in_min_rms = barge_in_min_rms
+        self.end_silence_frames = end_silence_frames
+        self.reset()
+
+    def reset(self, on_voiced=None):
+        self.on_voiced = on_voiced
+        self.triggered = False
+        self.silence = 0
+        self.window.clear()
+        self.utterance.clear()
+
+    def process(self, frame: np.ndarray, strict=False):
+        """Feed one frame; returns "start", "end" or None."""
+        samples = self.downsampler.process(frame) if self.downsampler is not None else frame
+        is_speech = self.vad.is_speech(samples.tobytes(), self.rate)
+
+        if not self.triggered:
+            self.window.push(samples, is_speech)
+            if self.window.voiced <= (self.barge_in_voiced if strict else self.trigger_voiced):
+                return None
+            preroll = self.window.ordered()
+            if strict and rms(preroll) < self.barge_in_min_rms:
+                return None
+            self.triggered = True
+            self.utterance.extend(preroll)
+            if self.on_voiced is not None:
+                self.on_voiced(preroll.tobytes())
+            self.window.clear()
+            return "start"
+
+        self.utterance.extend(samples)
+        if self.on_voiced is not None:
+            self.on_voiced(samples.tobytes())
+        self.silence = 0 if is_speech else self.silence + 1
+        if self.silence > self.end_silence_frames:
+            return "end"
+        if self.utterance.full:
+            logger.warning("[VAD] Utterance reached max length, cutting off")
+            return "end"
+        return None
+
+
+def rms(samples: np.ndarray) -> float:
+    x = samples.astype(np.float32)
+    return float(np.sqrt(np.dot(x, x) / len(x)))
@@ -3,82 +3,142 @@ import sounddevice as sd
 import numpy as np
 import queue
 import threading
-import collections
 import time
 import logging
 import struct
 import speech_recognition as sr
 
+from config import INPUT_DEVICE_INDEX, VAD_SAMPLE_RATE, BARGE_IN_MIN_RMS
+from voice.vad_pipeline import SpeechDetector
+
 logger = logging.getLogger(__name__)
 
 SAMPLE_RATE = 48000
 FRAME_DURATION = 30
 
 class VADVoiceListener:
-    def __init__(self, aggressiveness=2, sample_rate=SAMPLE_RATE, frame_duration=FRAME_DURATION):
+    def __init__(self, aggressiveness=2, sample_rate=SAMPLE_RATE, frame_duration=FRAME_DURATION,
+                 vad_rate=VAD_SAMPLE_RATE, capture_slots=64):
         self.vad = webrtcvad.Vad(aggressiveness)
         self.sample_rate = sample_rate
         self.frame_duration = frame_duration  # ms
         self.frame_size = int(sample_rate * frame_duration / 1000)
         self.frame_bytes = self.frame_size * 2  # 16-bit audio
-        self.audio_queue = queue.Queue()
+        self.detector = SpeechDetector(self.vad, in_rate=sample_rate, rate=vad_rate, frame_ms=frame_duration,
+                                       barge_in_min_rms=BARGE_IN_MIN_RMS)
+        self.rate = self.detector.rate  # sample rate ของเสียงที่ส่งไป ASR
+        # ring ของ frame ที่จองไว้ล่วงหน้า callback แค่คัดลอกลง slot แล้วส่ง index ข้ามเธรด
+        self._slots = np.zeros((capture_slots, self.frame_size), dtype=np.int16)
+        self._written = 0
+        self._ready = queue.SimpleQueue()
+        self.overruns = 0
         self.running = False
+        self.aborted = False  # หยุดจากภายนอก (state timeout) ผลที่ได้ต้องทิ้ง ไม่ส่งต่อ
 
     def _callback(self, indata, frames, time_info, status):
         if status:
             logger.warning(f"VAD stream status: {status}")
-        self.audio_queue.put(bytes(indata))
-
-    def _record_and_detect(self):
-        ring_buffer = collections.deque(maxlen=10)
-        triggered = False
-        voiced_frames = []
-        silence_counter = 0
-
-        with sd.RawInputStream(samplerate=self.sample_rate,
-                               blocksize=self.frame_size,
-                               dtype='int16',
-                               channels=1,
-                               callback=self._callback):
+        i = self._written
+        self._slots[i % len(self._slots)] = indata[:, 0]
+        self._written = i + 1
+        self._ready.put(i)
+
+    def _next_frame(self):
+        i = self._ready.get(timeout=1)
+        if self._written - i > len(self._slots):
+            # ประมวลผลไม่ทัน slot ถูกเขียนทับไปแล้ว
+            self.overruns += 1
+            return None
+        return self._slots[i % len(self._slots)]
+
+    def _record_and_detect(self, on_voiced=None, barge_in=None, until="end"):
+        # on_voiced: ส่งเสียงพูด (ที่ self.rate) ออกไปทันที (streaming ASR) ระหว่างที่ลูกค้ายังพูดอยู่
+        # barge_in: Playback ของคำตอบที่กำลังเล่น ถ้าลูกค้าพูดแทรกจะหยุดเสียงนั้น
+        # until: "start" = หยุดทันทีที่เจอเสียงพูด (ปลุกตู้) ไม่ต้องรอจบประโยค
+        detector = self.detector
+        detector.reset(on_voiced)
+        self._ready = queue.SimpleQueue()
+
+        with sd.InputStream(samplerate=self.sample_rate,
+                            blocksize=self.frame_size,
+                            dtype='int16',
+                            channels=1,
+                            device=INPUT_DEVICE_INDEX,
+                            callback=self._callback):
             logger.info("[VAD] Listening for voice...")
 
             while self.running:
                 try:
-                    frame = self.audio_queue.get(timeout=1)
-                    is_speech = self.vad.is_speech(frame, self.sample_rate)
-                    
-                    if not triggered:
-                        ring_buffer.append((frame, is_speech))
-                        num_voiced = len([f for f, speech in ring_buffer if speech])
-                        if num_voiced > 0.8 * ring_buffer.maxlen:
-                            triggered = True
-                            logger.info("[VAD] Voice detected")
-                            voiced_frames.extend(f for f, s in ring_buffer)
-                            ring_buffer.clear()
-                    else:
-                        voiced_frames.append(frame)
-                        if not is_speech:
-                            silence_counter += 1
-                        else:
-                            silence_counter = 0
-
-                        if silence_counter > 6:
-                            logger.info("[VAD] Voice ended")
-                            break
-
+                    frame = self._next_frame()
                 except queue.Empty:
                     continue
+                if frame is None:
+                    continue
+
+                playing = barge_in is not None and not barge_in.done.is_set()
+                event = detector.process(frame, strict=playing)
+                if event == "start":
+                    logger.info("[VAD] Voice detected")
+                    if until == "start":
+                        break
+                    if playing:
+                        logger.info("[VAD] Barge-in, stopping reply audio")
+                        barge_in.stop()
+                elif event == "end":
+                    logger.info("[VAD] Voice ended")
+                    break
 
-        audio_data = b''.join(voiced_frames)
-        return audio_data
+        return detector.utterance.tobytes()
+
+    def abort(self):
+        # เรียกจาก thread อื่นได้: หยุดฟังและทิ้งเสียงที่อัดมาแล้ว
+        self.aborted = True
+        self.running = False
 
-    def listen_and_recognize(self, language="th-TH"):
+    def _start(self):
+        self.aborted = False
         self.running = True
-        audio_bytes = self._record_and_detect()
+
+    def wait_for_voice(self):
+        # ตู้ว่าง: เปิดไมค์แค่ VAD ไม่ส่งอะไรไป ASR/server จนกว่าจะมีคนพูด
+        self._start()
+        self._record_and_detect(until="start")
+        self.running = False
+        return not self.aborted
+
+    def listen_and_recognize(self, language="th-TH", barge_in=None):
+        self._start()
+        audio_bytes = self._record_and_detect(barge_in=barge_in)
         self.running = False
+        if self.aborted:
+            return ""
+        return self._recognize(audio_bytes, language)
 
+    def listen_streaming(self, asr, session_id, stream_tts=False, inline_audio=False, language="th-TH", barge_in=None):
+        """Stream voiced frames to the server while recording; returns ``(text, reply)``.
+
+        ``reply`` is the server's answer to the recognized text, or None when the stream was not
+        available and the buffered audio had to be recognized locally after speech ended.
+        """
+        asr.prepare(session_id, self.rate, stream_tts=stream_tts, inline_audio=inline_audio)
+        self._start()
+        audio_bytes = self._record_and_detect(on_voiced=asr.send_audio, barge_in=barge_in)
+        self.running = False
+        if self.aborted:
+            # หมดเวลากลางประโยค: ยกเลิก stream ไม่ส่ง end ไม่งั้น server จะถอดเสียงบางส่วนแล้วส่งเข้า /ask
+            asr.cancel()
+            return "", None
+
+        result = asr.finish()
+        if result is not None:
+            return result
+        return self._recognize(audio_bytes, language), None
+
+    def _recognize(self, audio_bytes, language="th-TH"):
+        if not audio_bytes:
+            return None
         recognizer = sr.Recognizer()
-        audio_data = sr.AudioData(audio_bytes, self.sample_rate, sample_width=2)
+        audio_data = sr.AudioData(audio_bytes, self.rate, sample_width=2)
 
         try:
             text = recognizer.recognize_google(audio_data, language=language)
@@ -89,4 +149,4 @@ class VADVoiceListener:
             return None
         except sr.RequestError as e:
             logger.error(f"[VAD] Speech recognition error: {e}")
-            return None
\ No newline at end of file
+            return None
@@ -7,13 +7,96 @@ load_dotenv()
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "your-default-openai-key")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # ใช้ชี้ไปยัง OpenAI-compatible server อื่น
+# Stream completion tokens into TTS when the client asks for streamed audio
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"
+# Menu sent as an id|name|price table and replies carry item ids ("compact") or full names ("legacy")
+MENU_PROTOCOL = os.getenv("MENU_PROTOCOL", "compact")
+# Ask the provider for structured output constrained by the reply JSON schema
+LLM_JSON_SCHEMA = os.getenv("LLM_JSON_SCHEMA", "false").lower() == "true"
+# Per-turn deadline: no LLM answer (first token when streaming) this long after the turn started -> canned apology (0 = none)
+LLM_TURN_BUDGET_MS = int(os.getenv("LLM_TURN_BUDGET_MS", "8000"))
+# Hedged LLM calls: still no answer after LLM_HEDGE_AFTER_MS ("auto" = the model's recent p95, "off" = never),
+# the same messages go to LLM_FALLBACK_MODEL ("" = OPENAI_MODEL) as well and the first answer wins
+LLM_HEDGE_AFTER_MS = os.getenv("LLM_HEDGE_AFTER_MS", "3000")
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "")
+# Reuse the LLM reply for an identical model + message list (conversation openings), opt-in
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+LLM_CACHE_INTENTS = [i.strip() for i in os.getenv("LLM_CACHE_INTENTS", "greeting,cancel_order").split(",") if i.strip()]
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
 GOOGLE_CLOUD_TTS_CREDENTIALS_PATH = os.getenv("GOOGLE_CLOUD_TTS_CREDENTIALS_PATH", "secrets/google-credentials.json")
 
 # TTS Configuration
 #TTS_PROVIDER = os.getenv("TTS_PROVIDER", "gTTS")  # or "GoogleCloudTTS"
 TTS_PATH = os.getenv("TTS_PATH", "app/storage/tts")
+TTS_TTL_MINUTES = int(os.getenv("TTS_TTL_MINUTES", "15"))
+TTS_REGISTRY_MAX = int(os.getenv("TTS_REGISTRY_MAX", "20000"))
 
-TTS_PROVIDER="GoogleCloudTTS"
+TTS_PROVIDER = os.getenv("TTS_PROVIDER", "GoogleCloudTTS")  # or "GoogleCloudTTSRest"
 GOOGLE_CLOUD_TTS_CREDENTIALS_PATH="secrets/google-credentials.json"
+GOOGLE_TTS_API_KEY = os.getenv("GOOGLE_TTS_API_KEY", "")
+GOOGLE_TTS_ENDPOINT = os.getenv("GOOGLE_TTS_ENDPOINT", "https://texttospeech.googleapis.com")
+# Hedged TTS: if the primary has not answered after TTS_HEDGE_AFTER_MS ("auto" = its recent p95),
+# the secondary ("" = none, "Offline", "GoogleCloudTTSRest", "GoogleCloudTTS") is asked too and the first answer wins
+TTS_SECONDARY_PROVIDER = os.getenv("TTS_SECONDARY_PROVIDER", "")
+TTS_SECONDARY_ENDPOINT = os.getenv("TTS_SECONDARY_ENDPOINT", GOOGLE_TTS_ENDPOINT)
+TTS_HEDGE_AFTER_MS = os.getenv("TTS_HEDGE_AFTER_MS", "800")
+# Offline engine: shell pipeline, plain text on stdin -> MP3 on stdout
+TTS_OFFLINE_COMMAND = os.getenv(
+    "TTS_OFFLINE_COMMAND", "espeak-ng -v th -s 150 --stdin --stdout | ffmpeg -loglevel error -f wav -i - -f mp3 -"
+)
+
+# TTS synthesis cache (content-addressed, LRU by bytes)
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+TTS_CACHE_PATH = os.getenv("TTS_CACHE_PATH", "app/storage/tts_cache")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+
+# Concurrency / connection pooling (ต่อ 1 uvicorn worker)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "16"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "32"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+
+# Admission control in front of /ask (per worker): at most ADMISSION_MAX_ACTIVE turns run at once (0 = no limit),
+# up to ADMISSION_MAX_QUEUE wait for a slot; a turn not admitted within ADMISSION_MAX_WAIT_MS gets "please_wait"
+ADMISSION_MAX_ACTIVE = int(os.getenv("ADMISSION_MAX_ACTIVE", "16"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_MAX_WAIT_MS = int(os.getenv("ADMISSION_MAX_WAIT_MS", "3000"))
+# A repeated turn while the session's previous one is still running: "coalesce" (share its reply) or "reject"
+ADMISSION_DUPLICATES = os.getenv("ADMISSION_DUPLICATES", "coalesce")
+# Upstream request budgets per worker (divide the account's limits by the number of workers, 0 = unlimited),
+# charged per request actually sent: LLM attempts incl. hedges and summaries, each TTS chunk
+LLM_RATE_LIMIT_RPM = float(os.getenv("LLM_RATE_LIMIT_RPM", "0"))
+TTS_RATE_LIMIT_RPM = float(os.getenv("TTS_RATE_LIMIT_RPM", "0"))
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "5"))  # bucket size in seconds of budget
+
+# Session store
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_IDLE_TTL_SECONDS = int(os.getenv("SESSION_IDLE_TTL_SECONDS", "900"))
+# Shared by all uvicorn workers and kept across restarts: "sqlite" (one file, WAL), "redis" or "memory" (one worker only)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "app/storage/sessions.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+
+# Conversation history budget in tokens (system/menu prompt is pinned and not counted)
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")
+TOKENIZER_LOAD_TIMEOUT_SECONDS = float(os.getenv("TOKENIZER_LOAD_TIMEOUT_SECONDS", "10"))  # BPE download at startup
+HISTORY_SOFT_TOKENS = int(os.getenv("HISTORY_SOFT_TOKENS", "1500"))  # start background summary
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "3000"))  # hard cap, oldest trimmed
+HISTORY_KEEP_TOKENS = int(os.getenv("HISTORY_KEEP_TOKENS", "600"))  # recent turns kept verbatim
+
+# Local fast-path intent engine (skips the LLM for unambiguous utterances)
+INTENT_FASTPATH_ENABLED = os.getenv("INTENT_FASTPATH_ENABLED", "true").lower() == "true"
+INTENT_FASTPATH_THRESHOLD = float(os.getenv("INTENT_FASTPATH_THRESHOLD", "0.9"))
+
+# Streaming speech recognition for /ws/asr ("google" = Cloud Speech streaming, "standin" = offline test engine)
+ASR_ENGINE = os.getenv("ASR_ENGINE", "google")
+ASR_LANGUAGE = os.getenv("ASR_LANGUAGE", "th-TH")
+# Longest wait for the final transcript after the client ends an utterance; the stream is cancelled after it
+ASR_FINAL_TIMEOUT_SECONDS = float(os.getenv("ASR_FINAL_TIMEOUT_SECONDS", "5"))
+
 # System Config
 DEBUG_MODE = os.getenv("DEBUG_MODE", "true").lower() == "true"
\ No newline at end of file
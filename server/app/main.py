@@ -1,28 +1,70 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
-from typing import Optional
-from fastapi.responses import FileResponse, JSONResponse
+from typing import Optional, Tuple
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+import time
 import uuid
 import os
 import json
-import re
-import unicodedata
-
-from app.config import OPENAI_API_KEY, OPENAI_MODEL, TTS_PATH
-from app.services.tts_module import generate_tts
-from app.services.prompt_builder import PromptBuilder
-from app.services.gpt_client import ask_gpt
-from app.services.cleaner import cleanup_old_tts_files
-from app.services.session_manager import SessionManager
-from app.services.order import OrderItem
+import struct
+
+from app.config import (
+    OPENAI_API_KEY, OPENAI_MODEL, TTS_PATH, TTS_TTL_MINUTES, TTS_REGISTRY_MAX, LLM_STREAMING,
+    SESSION_MAX, SESSION_IDLE_TTL_SECONDS, HISTORY_SOFT_TOKENS, HISTORY_MAX_TOKENS, HISTORY_KEEP_TOKENS,
+    TTS_CACHE_ENABLED, TTS_CACHE_PATH, TTS_CACHE_MAX_BYTES, TTS_CACHE_MEMORY_BYTES,
+    INTENT_FASTPATH_ENABLED, INTENT_FASTPATH_THRESHOLD, MENU_PROTOCOL, LLM_JSON_SCHEMA, ASR_LANGUAGE,
+    SESSION_BACKEND, SESSION_DB_PATH, REDIS_URL, LLM_TURN_BUDGET_MS,
+    ADMISSION_MAX_ACTIVE, ADMISSION_MAX_QUEUE, ADMISSION_MAX_WAIT_MS, ADMISSION_DUPLICATES,
+    LLM_CACHE_ENABLED, LLM_CACHE_INTENTS, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS,
+)
+from app.services.tts_module import (
+    generate_tts_async, synthesize_async, voice_config_key, close_tts_clients, tts_stats, tts_budget,
+)
+from app.services.tts_cache import TTSCache
+from app.services.tts_registry import TTSRegistry
+from app.services.tts_stream import TTSStreamer
+from app.services.json_stream import ReplyStreamParser
+from app.services.prompt_builder import PromptBuilder, build_reply_schema
+from app.services.gpt_client import ask_gpt_async, ask_gpt_stream, close_gpt_client, llm_stats, llm_budget
+from app.services.llm_gateway import APOLOGY_REPLY, LLMUnavailable
+from app.services.llm_cache import LLMResponseCache, data_version
+from app.services.session_manager import SessionManager, SESSION_KEY
+from app.services.session_store import create_session_store
+from app.services.menu_index import MenuIndex
+from app.services.intent_engine import IntentEngine
+from app.services.promotions import PromotionEngine
+from app.services.admission import AdmissionController, Overloaded
+from app.services.asr import create_recognizer
 from app.utils.logger import get_logger
-
-app = FastAPI()
+from app.utils.tokenizer import load_encoding
+from app.utils.metrics import metrics, STAGE_SECONDS, ASK_SECONDS, INTENTS
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # ไฟล์เสียงที่ค้างจาก process ก่อน: ลบที่หมดอายุ ที่เหลือเข้า expiry index (สแกนครั้งเดียวตอนเริ่ม)
+    TEMP_TTS_STORE.reconcile(TTS_PATH)
+    # ไฟล์ BPE ของ tiktoken โหลด/ดาวน์โหลดใน thread ก่อนรับ request แรก ไม่ใช่ตอน count_tokens บน event loop
+    await load_encoding()
+    yield
+    await TEMP_TTS_STORE.close()
+    # ปิด connection pool ของ LLM/TTS ตอน shutdown
+    await close_gpt_client()
+    await close_tts_clients()
+    await session_store.close()
+
+app = FastAPI(lifespan=lifespan)
 logger = get_logger(__name__)
-session_manager = SessionManager()
-
-# Start background TTS cleaner
-cleanup_old_tts_files(ttl_minutes=15, interval_seconds=300)
+# sessions + /speak ids อยู่ใน store ร่วม จึงรันหลาย uvicorn worker และ restart ได้โดย session ไม่หาย
+session_store = create_session_store(SESSION_BACKEND, SESSION_DB_PATH, REDIS_URL)
+session_manager = SessionManager(
+    max_sessions=SESSION_MAX,
+    idle_ttl_seconds=SESSION_IDLE_TTL_SECONDS,
+    history_soft_tokens=HISTORY_SOFT_TOKENS,
+    history_max_tokens=HISTORY_MAX_TOKENS,
+    history_keep_tokens=HISTORY_KEEP_TOKENS,
+    store=session_store,
+)
 
 # Load mock data
 with open("app/data/menu.json", "r", encoding="utf-8") as f:
@@ -31,147 +73,549 @@ with open("app/data/menu.json", "r", encoding="utf-8") as f:
 with open("app/data/promotions.json", "r", encoding="utf-8") as f:
     PROMOTIONS = json.load(f)
 
-# Store session replies temporarily
-TEMP_TTS_STORE = {}
+# Normalized names, aliases, prefix trie and fuzzy keys built once
+menu_index = MenuIndex(MENU_DATA)
+
+# Structured-output schema (item ids constrained to the menu) when enabled
+REPLY_FORMAT = build_reply_schema(MENU_DATA) if LLM_JSON_SCHEMA else None
+
+# Reply parse outcomes for LLM turns (compare MENU_PROTOCOL / LLM_JSON_SCHEMA settings)
+REPLY_PARSE_STATS = {"llm_replies": 0, "json_failures": 0, "items": 0, "unresolved_items": 0}
+
+# Values read at scrape time, nothing is recorded on the request path
+metrics.callback("vera_reply_parse_total", "LLM reply parse outcomes", lambda: REPLY_PARSE_STATS, kind="counter", labelname="kind")
+metrics.callback("vera_active_sessions", "Sessions cached in this worker", lambda: len(session_manager.sessions))
+metrics.callback("vera_session_bytes", "Approximate bytes held by this worker's session cache", lambda: session_manager.bytes_held)
+metrics.callback("vera_tts_registry_entries", "/speak registry entries cached in this worker", lambda: len(TEMP_TTS_STORE))
+
+# Replies to identical conversations (greeting, cancel) reused; keys change with the menu/promotions
+llm_cache = LLMResponseCache(
+    LLM_CACHE_INTENTS,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    namespace=data_version(MENU_DATA, PROMOTIONS),
+) if LLM_CACHE_ENABLED else None
+
+if llm_cache is not None:
+    metrics.callback(
+        "vera_llm_cache_lookups_total", "LLM response cache lookups by result",
+        lambda: {"hit": llm_cache.hits, "miss": llm_cache.misses}, kind="counter", labelname="result",
+    )
+    metrics.callback(
+        "vera_llm_tokens_saved_total", "LLM tokens not spent thanks to the response cache",
+        lambda: llm_cache.tokens_saved, kind="counter", labelname="kind",
+    )
+
+# Totals, discounts and points are computed locally, the LLM never does the arithmetic
+promotion_engine = PromotionEngine(PROMOTIONS)
+
+# Unambiguous orders/commands are answered locally without a GPT round-trip
+intent_engine = IntentEngine(MENU_DATA, threshold=INTENT_FASTPATH_THRESHOLD, pricing=promotion_engine)
+
+# Store session replies temporarily; an expiry heap deletes the entry and its MP3 together, on time
+TEMP_TTS_STORE = TTSRegistry(ttl_seconds=TTS_TTL_MINUTES * 60, max_entries=TTS_REGISTRY_MAX, store=session_store)
+
+# Identical SSML (greeting, cancel, common orders) is synthesized once and reused
+tts_cache = TTSCache(
+    TTS_CACHE_PATH,
+    max_disk_bytes=TTS_CACHE_MAX_BYTES,
+    max_memory_bytes=TTS_CACHE_MEMORY_BYTES,
+    voice_config=voice_config_key(),
+) if TTS_CACHE_ENABLED else None
+
+if tts_cache is not None:
+    metrics.callback(
+        "vera_tts_cache_lookups_total", "TTS cache lookups by result",
+        lambda: {"hit": tts_cache.hits, "miss": tts_cache.misses}, kind="counter", labelname="result",
+    )
+
+async def synthesize_chunk(text: str) -> bytes:
+    if tts_cache is not None:
+        return await tts_cache.get_or_create_audio(text, synthesize_async)
+    return await synthesize_async(text)
+
+# Sentence-chunked streaming TTS (ask with stream_tts=true); chunks go through the shared store
+# so /speak-stream can be served by any worker
+tts_streamer = TTSStreamer(synthesize_chunk, store=session_store if session_store.name != "memory" else None)
+
+INLINE_REPLY_MEDIA_TYPE = "application/x-vera-reply"
+
+# Bounded concurrency + queue, one turn per session, shed when the upstream budgets are exhausted
+admission = AdmissionController(
+    max_active=ADMISSION_MAX_ACTIVE,
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_wait_s=ADMISSION_MAX_WAIT_MS / 1000,
+    # ตัวเดียวกับที่ gateway/TTS provider ตัดงบตอนเรียกจริง admission แค่อ่านดูว่าติดลบเกินไปหรือยัง
+    buckets={name: bucket for name, bucket in (("llm", llm_budget), ("tts", tts_budget)) if bucket is not None},
+    coalesce=ADMISSION_DUPLICATES == "coalesce",
+)
+metrics.callback("vera_admission_queue_depth", "Turns waiting for an admission slot", lambda: admission.depth)
+metrics.callback("vera_admission_active", "Turns running past admission", lambda: admission.active)
+metrics.callback("vera_admission_shed_total", "Turns answered with please_wait", lambda: admission.shed, kind="counter", labelname="reason")
+
+PLEASE_WAIT_SSML = "<speak>ขออภัยค่ะ ตอนนี้ลูกค้าเยอะ รอสักครู่นะคะ</speak>"
+
+# Streaming recognizer behind /ws/asr (frames arrive while the customer is still speaking)
+recognizer = create_recognizer()
 
 class AskRequest(BaseModel):
     text: str
     session_id: Optional[str] = "default-session"
+    stream_tts: bool = False
+    inline_audio: bool = False  # ตอบ JSON header + เสียงใน response เดียว ไม่ต้องเรียก /speak ต่อ
+    member_id: Optional[str] = None  # เบอร์โทร/รหัสสมาชิก ไม่มี = ไม่ให้สิทธิ์ลูกค้าใหม่
 
 class ResetRequest(BaseModel):
     session_id: str
 
-def normalize_text(text: str) -> str:
-    return unicodedata.normalize("NFKC", text.strip().lower())
-
-def lookup_price(item_name: str) -> Optional[float]:
-    norm_input = normalize_text(item_name)
-    for item in MENU_DATA:
-        if normalize_text(item["name"]) == norm_input or norm_input in normalize_text(item["name"]):
-            return item["price"]
-    return None
-
-def validate_item(item_name: str) -> bool:
-    norm_input = normalize_text(item_name)
-    for item in MENU_DATA:
-        norm_menu_name = normalize_text(item["name"])
-        if norm_input == norm_menu_name:
-            return True
-        if norm_input in norm_menu_name:
-            return True
-        if re.search(rf"^{re.escape(norm_input)}", norm_menu_name):
-            return True
-    return False
+def encode_inline_reply(header: dict, audio: bytes) -> bytes:
+    # 4-byte big-endian ความยาว header + JSON header (utf-8) + เสียง MP3 ที่เหลือทั้งหมด
+    body = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return struct.pack(">I", len(body)) + body + audio
+
+# intent ที่แก้ตะกร้า: add_order บวกจำนวน, modify_order ตั้งจำนวนใหม่ (0 = เอาออก), remove_item เอาบรรทัดออก
+CART_INTENTS = ("add_order", "modify_order", "remove_item")
+
+# LLM อ้างถึงเมนู/จำนวนที่ใช้ไม่ได้: ไม่แตะตะกร้า ถามลูกค้าใหม่
+CLARIFY_SSML = "<speak>ขอโทษค่ะ ไม่แน่ใจว่าเป็นรายการไหนหรือกี่แก้ว รบกวนบอกอีกครั้งได้ไหมคะ</speak>"
 
 def safe_parse_json(text: str) -> Optional[dict]:
+    body = text.strip()
+    if body.startswith("```"):
+        # ```json ... ``` : ตัด fence ออกแล้ว parse ตัว JSON ตามปกติ (ตะกร้าต้องถูกแก้เหมือนไม่มี fence)
+        body = body.split("\n", 1)[1] if "\n" in body else ""
+        body = body.rsplit("```", 1)[0]
     try:
-        return json.loads(text)
+        return json.loads(body)
     except Exception:
         return None
 
-@app.post("/ask")
-async def ask_user(req: AskRequest):
-    logger.info(f"/ask received from {req.session_id}: {req.text}")
-    prompt_builder = PromptBuilder(MENU_DATA, PROMOTIONS)
-
-    if not session_manager.has_session(req.session_id):
-        init_prompt = prompt_builder.build_init_prompt()
-        session_manager.init_session(req.session_id, system_prompt=init_prompt)
-
-    text = req.text.strip()
-    order_list = session_manager.get_order_list(req.session_id)
-
-    if text in ["แค่นี้", "ยืนยัน", "สรุป"]:
-        prompt = prompt_builder.build_order_summary_prompt(order_list)
-    elif text in ["ยกเลิก", "ยกเลิกรายการ"]:
-        session_manager.clear_order(req.session_id)
-        prompt = prompt_builder.build_cancel_prompt()
-    elif text in ["สวัสดี", "เริ่มใหม่"]:
-        prompt = prompt_builder.build_greeting_prompt()
-    else:
-        prompt = prompt_builder.build_user_prompt(text)
-
-    session_manager.add_user_message(req.session_id, prompt)
-    messages = session_manager.get_history(req.session_id)
-
-    reply_text = ask_gpt(messages)
-    session_manager.add_assistant_reply(req.session_id, reply_text)
-    logger.debug(f"GPT reply: {reply_text}")
-
-    gpt_result = safe_parse_json(reply_text)
+def validate_cart_items(session_id: str, intent: str, item_data: list) -> list:
+    changes = []
+    cart = session_manager.get_cart(session_id)
+    for item in item_data:
+        REPLY_PARSE_STATS["items"] += 1
+        match = menu_index.resolve(item.get("id"), item.get("name")) if isinstance(item, dict) else None
+        if match is None:
+            REPLY_PARSE_STATS["unresolved_items"] += 1
+            raise ValueError("Invalid menu item")
+        if intent == "remove_item" and match.id not in cart:
+            raise ValueError(f"{match.name} is not in the cart")
+        qty = item.get("qty", 1)
+        if not isinstance(qty, int) or isinstance(qty, bool) or qty < (1 if intent == "add_order" else 0):
+            raise ValueError(f"Invalid quantity {qty!r} for {match.name}")
+        changes.append((match, qty))
+    return changes
+
+def process_gpt_reply(session_id: str, reply_text: str, parser: Optional[ReplyStreamParser] = None):
+    with STAGE_SECONDS.time("json_parse"):
+        gpt_result = safe_parse_json(reply_text)
     if gpt_result:
         intent = gpt_result.get("intent")
 
-        if intent == "add_order" and "item" in gpt_result:
-            item_data = gpt_result["item"]
+        if intent in CART_INTENTS and ("items" in gpt_result or "item" in gpt_result):
+            # compact protocol ส่ง "items" เป็น id, แบบเดิมส่ง "item" เป็นชื่อเมนู
+            item_data = gpt_result.get("items") or gpt_result.get("item") or []
 
             # 🧠 รองรับทั้ง dict หรือ list
             if isinstance(item_data, dict):
                 item_data = [item_data]
 
-            for item in item_data:
-                name = item.get("name")
-                qty = item.get("qty", 1)
-
-                if not validate_item(name):
-                    raise ValueError("Invalid menu item")
-
-                price = lookup_price(name)
-                if price is None:
-                    raise ValueError("Price not found")
-
-                order_item = OrderItem(name=name, qty=qty, price=price)
-                session_manager.add_order_item(req.session_id, order_item)
-                logger.info(f"✅ Order added: {order_item}")
-                
-            if not validate_item(name):
-                raise ValueError("Invalid menu item")
-
-            price = lookup_price(name)
-            if price is None:
-                raise ValueError("Price not found")
-
-            order_item = OrderItem(name=name, qty=qty, price=price)
-            session_manager.add_order_item(req.session_id, order_item)
-            logger.info(f"✅ Order added: {order_item}")
+            with STAGE_SECONDS.time("order_validation"):
+                # ตรวจทุกรายการก่อน แล้วค่อยแก้ตะกร้า (ไม่แก้ไปครึ่งเดียวถ้ามีรายการที่ผิด)
+                try:
+                    changes = validate_cart_items(session_id, intent, item_data)
+                except ValueError as e:
+                    logger.warning(f"⚠️ GPT {intent} rejected ({e}), asking the customer again")
+                    return CLARIFY_SSML, "clarify"
+
+                for match, qty in changes:
+                    if intent == "add_order":
+                        line = session_manager.add_to_cart(session_id, match.id, match.name, qty, match.price)
+                        logger.info(f"✅ Order added: {match.name} +{qty} -> {line.qty}")
+                    elif intent == "modify_order":
+                        session_manager.set_cart_qty(session_id, match.id, match.name, qty, match.price)
+                        logger.info(f"✏️ Order changed: {match.name} -> {qty}")
+                    else:
+                        session_manager.remove_from_cart(session_id, match.id)
+                        logger.info(f"🗑️ Order removed: {match.name}")
 
         reply_ssml = gpt_result.get("response", reply_text)
         intent = gpt_result.get("intent", "")
+    elif parser is not None and parser.streamed:
+        # JSON เสียตอนท้าย แต่ฟิลด์ response ถูกพูดไปแล้ว ใช้ส่วนนั้นต่อ
+        REPLY_PARSE_STATS["json_failures"] += 1
+        logger.warning("⚠️ GPT ตอบ JSON ไม่สมบูรณ์ ใช้ response ที่ stream มาแล้ว")
+        reply_ssml = parser.streamed
+        intent = parser.intent or "unknown"
     else:
         logger.warning("⚠️ GPT ตอบไม่ใช่ JSON ใช้ข้อความดิบแทน")
+        REPLY_PARSE_STATS["json_failures"] += 1
         reply_ssml = reply_text
         intent = "unknown"
 
-    tts_id = str(uuid.uuid4())
-    tts_path = os.path.join(TTS_PATH, f"{tts_id}.mp3")
-    generate_tts(reply_ssml, tts_path)
-    TEMP_TTS_STORE[tts_id] = tts_path
+    return reply_ssml, intent
+
+async def stream_reply_to_tts(messages: list, stream_id: str, deadline: Optional[float]) -> ReplyStreamParser:
+    # ส่งประโยคที่ครบแล้วใน "response" ไป TTS ทันที ระหว่างที่ LLM ยังตอบไม่จบ
+    parser = ReplyStreamParser()
+    deltas = ask_gpt_stream(messages, REPLY_FORMAT, deadline)
+    try:
+        async for delta in deltas:
+            speech = parser.feed(delta)
+            if speech:
+                tts_streamer.feed(stream_id, speech)
+    finally:
+        await deltas.aclose()  # คืน connection/slot ทันทีแม้ TTS feed ล้มเหลวกลางทาง
+    return parser
+
+@app.post("/ask")
+async def ask_user(req: AskRequest):
+    reply, audio = await run_ask(req, time.monotonic())
+    if audio is not None:
+        return Response(encode_inline_reply(reply, audio), media_type=INLINE_REPLY_MEDIA_TYPE)
+    return JSONResponse(reply)
+
+async def run_ask(req: AskRequest, started_at: float) -> Tuple[dict, Optional[bytes]]:
+    # ใช้ร่วมกันระหว่าง /ask และ /ws/asr คืน (reply JSON, เสียง inline หรือ None)
+    logger.info(f"/ask received from {req.session_id}: {req.text}")
+    fingerprint = (req.text.strip(), req.stream_tts, req.inline_audio)
+    try:
+        # stream id ของ /speak-stream อ่านได้ครั้งเดียว turn แบบ stream จึงแชร์ผลให้คำขอซ้ำไม่ได้
+        return await admission.run(req.session_id, fingerprint, lambda: _run_session_turn(req, started_at),
+                                   replayable=not req.stream_tts)
+    except Overloaded as e:
+        # ตอบทันทีโดยไม่แตะ session/LLM/TTS ให้ตู้รอแล้วส่งข้อความเดิมซ้ำ
+        INTENTS.inc("please_wait", "admission")
+        ASK_SECONDS.observe(time.monotonic() - started_at, "shed")
+        return {
+            "reply_text": PLEASE_WAIT_SSML,
+            "tts_url": None,
+            "intent": "please_wait",
+            "reason": e.reason,
+            "retry_after_ms": int(e.retry_after_s * 1000),
+        }, None
+
+async def _run_session_turn(req: AskRequest, started_at: float) -> Tuple[dict, Optional[bytes]]:
+    prompt_builder = PromptBuilder(MENU_DATA, PROMOTIONS, compact=MENU_PROTOCOL == "compact", pricing=promotion_engine)
+
+    if not await session_manager.load(req.session_id):
+        with STAGE_SECONDS.time("session_init"):
+            init_prompt = prompt_builder.build_init_prompt()
+            session_manager.init_session(req.session_id, system_prompt=init_prompt)
+
+    try:
+        return await _run_turn(req, started_at, prompt_builder)
+    finally:
+        # บันทึกแม้ turn ล้มเหลว (ข้อความลูกค้า/ออเดอร์ที่เพิ่มไปแล้วไม่หาย) ให้ worker อื่นรับ turn ถัดไปได้
+        await session_manager.save(req.session_id)
+
+async def _run_turn(req: AskRequest, started_at: float, prompt_builder: PromptBuilder) -> Tuple[dict, Optional[bytes]]:
+    text = req.text.strip()
+    cart = session_manager.get_cart(req.session_id)
+    if req.member_id:
+        session_manager.set_member(req.session_id, req.member_id)
+    first_order = await session_manager.is_first_order(req.session_id)
+
+    stream_id = None
+    parser = None
+    cached_reply = None
+    with STAGE_SECONDS.time("fast_path"):
+        fast = intent_engine.match(text, cart, first_order) if INTENT_FASTPATH_ENABLED else None
+    if fast is not None:
+        path = "fast_path"
+        if fast["intent"] == "cancel_order":
+            session_manager.clear_order(req.session_id)
+            await session_manager.withdraw_order(req.session_id)
+        session_manager.add_user_message(req.session_id, text)
+        reply_text = json.dumps(fast, ensure_ascii=False)
+    else:
+        with STAGE_SECONDS.time("prompt_build"):
+            if text in ["แค่นี้", "ยืนยัน", "สรุป"]:
+                prompt = prompt_builder.build_order_summary_prompt(cart, first_order)
+            elif text in ["ยกเลิก", "ยกเลิกรายการ"]:
+                session_manager.clear_order(req.session_id)
+                await session_manager.withdraw_order(req.session_id)
+                prompt = prompt_builder.build_cancel_prompt()
+            elif text in ["สวัสดี", "เริ่มใหม่"]:
+                prompt = prompt_builder.build_greeting_prompt()
+            else:
+                prompt = prompt_builder.build_user_prompt(text, cart)
+
+            session_manager.add_user_message(req.session_id, prompt)
+            messages = session_manager.build_prompt(req.session_id)
+
+        # งบเวลาของ turn นับจากตอนรับคำขอ เกินแล้วตอบขออภัยแทนการให้ลูกค้ายืนรอ
+        deadline = started_at + LLM_TURN_BUDGET_MS / 1000 if LLM_TURN_BUDGET_MS > 0 else None
+        if llm_cache is not None:
+            with STAGE_SECONDS.time("llm_cache"):
+                cache_key = llm_cache.make_key(OPENAI_MODEL, messages, REPLY_FORMAT)
+                cached_reply = llm_cache.get(cache_key)
+        try:
+            if cached_reply is not None:
+                # บทสนทนาเดิมเป๊ะ (ทักทาย/ยกเลิก) ใช้คำตอบเดิม ไม่เรียก LLM
+                path = "llm_cache"
+                reply_text = cached_reply
+            elif req.stream_tts and LLM_STREAMING:
+                path = "llm_stream"
+                stream_id = tts_streamer.open(started_at)
+                try:
+                    # รวมเวลาที่ป้อนประโยคเข้า TTS ระหว่าง stream
+                    with STAGE_SECONDS.time("llm_stream"):
+                        parser = await stream_reply_to_tts(messages, stream_id, deadline)
+                except LLMUnavailable:
+                    parser = ReplyStreamParser()  # ยังไม่มี token ใดถูกพูด คำขออภัยเข้า stream เดิม
+                    raise
+                except Exception:
+                    tts_streamer.abort(stream_id)
+                    raise
+                reply_text = parser.text.strip()
+            else:
+                path = "llm"
+                with STAGE_SECONDS.time("llm"):
+                    reply_text = await ask_gpt_async(messages, REPLY_FORMAT, deadline)
+            if cached_reply is None:
+                REPLY_PARSE_STATS["llm_replies"] += 1
+        except LLMUnavailable as e:
+            logger.warning(f"⚠️ LLM unavailable for {req.session_id} ({e.reason}), answering with apology")
+            path = "llm_unavailable"
+            reply_text = APOLOGY_REPLY
+    session_manager.add_assistant_reply(req.session_id, reply_text)
+    logger.debug(f"GPT reply: {reply_text}")
+
+    try:
+        reply_ssml, intent = process_gpt_reply(req.session_id, reply_text, parser)
+    except Exception:
+        if stream_id is not None:
+            tts_streamer.abort(stream_id)
+        raise
+    if intent == "confirm_order":
+        await session_manager.place_order(req.session_id)
+    elif intent == "greeting":
+        session_manager.close_order(req.session_id)
+    if llm_cache is not None and path in ("llm", "llm_stream"):
+        llm_cache.put(cache_key, messages, reply_text, intent)
+    INTENTS.inc(intent or "none", path if path in ("fast_path", "llm_cache") else "llm")
+
+    if stream_id is not None:
+        if not parser.streamed or intent == "clarify":  # คำยืนยันที่พูดไปแล้วต้องตามด้วยคำถามซ้ำ
+            tts_streamer.feed(stream_id, reply_ssml)
+        tts_streamer.close(stream_id)
+    elif req.stream_tts:
+        stream_id = tts_streamer.start(reply_ssml, started_at=started_at)
+
+    if stream_id is not None:
+        ASK_SECONDS.observe(time.monotonic() - started_at, path)
+        return {
+            "reply_text": reply_ssml,
+            "tts_url": None,
+            "tts_stream_url": f"/speak-stream/{stream_id}",
+            "intent": intent
+        }, None
+
+    if req.inline_audio:
+        # ไม่ต้องเขียนไฟล์/ลง registry เพื่อให้ /speak อ่านกลับ (cache ยังใช้ร่วมได้)
+        with STAGE_SECONDS.time("tts"):
+            audio = await synthesize_chunk(reply_ssml)
+        ASK_SECONDS.observe(time.monotonic() - started_at, path)
+        return {"reply_text": reply_ssml, "intent": intent, "audio_type": "audio/mpeg", "audio_bytes": len(audio)}, audio
+
+    with STAGE_SECONDS.time("tts"):
+        if tts_cache is not None:
+            tts_id, tts_path = await tts_cache.get_or_create(reply_ssml, synthesize_async)
+        else:
+            tts_id = str(uuid.uuid4())
+            tts_path = os.path.join(TTS_PATH, f"{tts_id}.mp3")
+            await generate_tts_async(reply_ssml, tts_path)
+    # ไฟล์ใน TTS cache เป็นของ cache (LRU ตามขนาด) registry ลบเฉพาะไฟล์ที่สร้างเองใน TTS_PATH
+    await TEMP_TTS_STORE.put(tts_id, tts_path, owned=tts_cache is None)
     logger.info(f"Generated TTS file: {tts_path}")
+    ASK_SECONDS.observe(time.monotonic() - started_at, path)
 
-    return JSONResponse({
+    return {
         "reply_text": reply_ssml,
         "tts_url": f"/speak/{tts_id}",
         "intent": intent
-    })
+    }, None
+
+@app.websocket("/ws/asr")
+async def ws_asr(ws: WebSocket):
+    # ต่อค้างไว้ทั้ง session: {"type":"start",...} -> PCM int16 (binary) -> {"type":"end"}
+    # server ตอบ partial ระหว่างพูด, final หลัง end แล้วเข้า pipeline เดียวกับ /ask ทันที
+    await ws.accept()
+    stream = None
+    utterance = {}
+    partial = {"latest": "", "sent": ""}
+
+    def on_partial(text: str):
+        partial["latest"] = text
+
+    try:
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                if stream is None:
+                    continue
+                await stream.feed(message["bytes"])
+                if partial["latest"] != partial["sent"]:
+                    partial["sent"] = partial["latest"]
+                    await ws.send_json({"type": "partial", "text": partial["sent"]})
+                continue
+
+            data = json.loads(message.get("text") or "{}")
+            kind = data.get("type")
+            if kind == "start":
+                if stream is not None:
+                    await stream.cancel()
+                utterance = data
+                partial.update(latest="", sent="")
+                try:
+                    stream = recognizer.open(int(data.get("sample_rate", 16000)), data.get("language", ASR_LANGUAGE),
+                                             on_partial, hint=data.get("hint", ""))
+                except Exception as e:
+                    logger.error(f"❌ ASR stream open failed: {e}")
+                    await ws.send_json({"type": "error", "stage": "asr", "message": str(e)})
+            elif kind == "cancel":
+                if stream is not None:
+                    await stream.cancel()
+                stream = None
+            elif kind == "end" and stream is not None:
+                speech_ended_at = time.monotonic()
+                current, stream = stream, None
+                try:
+                    with STAGE_SECONDS.time("asr_final"):
+                        text = (await current.finish()).strip()
+                except Exception as e:
+                    logger.error(f"❌ ASR failed: {e}")
+                    await ws.send_json({"type": "error", "stage": "asr", "message": str(e)})
+                    continue
+                await ws.send_json({"type": "final", "text": text})
+                logger.info(f"🎙️ ASR final from {utterance.get('session_id')}: {text}")
+                if not text or not utterance.get("ask", True):
+                    continue
+
+                req = AskRequest(
+                    text=text,
+                    session_id=utterance.get("session_id") or "default-session",
+                    stream_tts=bool(utterance.get("stream_tts", False)),
+                    inline_audio=bool(utterance.get("inline_audio", False)),
+                    member_id=utterance.get("member_id"),
+                )
+                try:
+                    reply, audio = await run_ask(req, speech_ended_at)
+                except Exception as e:
+                    logger.error(f"❌ Ask pipeline failed after ASR: {e}")
+                    await ws.send_json({"type": "error", "stage": "ask", "message": str(e)})
+                    continue
+                await ws.send_json({"type": "reply", **reply})
+                if audio is not None:
+                    await ws.send_bytes(audio)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if stream is not None:
+            await stream.cancel()
 
 @app.post("/reset-session")
 async def reset_session(req: ResetRequest):
     logger.info(f"Resetting session: {req.session_id}")
-    session_manager.reset_session(req.session_id)
+    await session_manager.reset_session(req.session_id)
     return JSONResponse({"message": "Session reset successfully"})
 
 @app.get("/speak/{tts_id}")
 async def speak(tts_id: str):
     logger.info(f"/speak requested: {tts_id}")
-    path = TEMP_TTS_STORE.get(tts_id)
+    if tts_cache is not None:
+        audio = tts_cache.get_bytes(tts_id)
+        if audio is not None:
+            return Response(audio, media_type="audio/mpeg")
+    path = await TEMP_TTS_STORE.get(tts_id)
+    if path is None and tts_cache is not None and tts_cache.contains(tts_id):
+        path = tts_cache.path_for(tts_id)
     if path and os.path.exists(path):
         logger.info(f"Serving TTS file: {path}")
         return FileResponse(path, media_type="audio/mpeg")
     logger.warning(f"TTS file not found for ID: {tts_id}")
     return JSONResponse({"error": "TTS not found"}, status_code=404)
 
+@app.get("/speak-stream/{stream_id}")
+async def speak_stream(stream_id: str, framed: bool = False):
+    logger.info(f"/speak-stream requested: {stream_id}")
+    if not await tts_streamer.has_stream(stream_id):
+        return JSONResponse({"error": "TTS stream not found"}, status_code=404)
+    media_type = "application/x-vera-audio-frames" if framed else "audio/mpeg"
+    return StreamingResponse(tts_streamer.iter_audio(stream_id, framed=framed), media_type=media_type)
+
 @app.get("/debug-session-history/{session_id}")
 async def debug_session_history(session_id: str):
-    if not session_manager.has_session(session_id):
+    if not await session_manager.load(session_id):
         return JSONResponse({"error": "Session not found"}, status_code=404)
-    return JSONResponse(session_manager.get_history(session_id))
\ No newline at end of file
+    return JSONResponse(session_manager.get_history(session_id))
+
+@app.get("/debug-session-tokens/{session_id}")
+async def debug_session_tokens(session_id: str):
+    if not await session_manager.load(session_id):
+        return JSONResponse({"error": "Session not found"}, status_code=404)
+    return JSONResponse(session_manager.token_stats(session_id))
+
+@app.get("/debug-tts-cache")
+async def debug_tts_cache():
+    if tts_cache is None:
+        return JSONResponse({"enabled": False})
+    return JSONResponse({"enabled": True, **tts_cache.stats()})
+
+@app.get("/debug-admission")
+async def debug_admission():
+    return JSONResponse(admission.stats())
+
+@app.get("/debug-llm")
+async def debug_llm():
+    return JSONResponse(llm_stats())
+
+@app.get("/debug-llm-cache")
+async def debug_llm_cache():
+    if llm_cache is None:
+        return JSONResponse({"enabled": False})
+    return JSONResponse({"enabled": True, **llm_cache.stats()})
+
+@app.post("/debug-llm-cache/invalidate")
+async def debug_llm_cache_invalidate():
+    # หลังแก้เมนู/โปรโมชั่นนอกรอบ deploy (ไฟล์ข้อมูลโหลดตอนเริ่ม process เท่านั้น)
+    if llm_cache is None:
+        return JSONResponse({"enabled": False})
+    llm_cache.invalidate("manual")
+    return JSONResponse({"enabled": True, **llm_cache.stats()})
+
+@app.get("/debug-tts-providers")
+async def debug_tts_providers():
+    return JSONResponse(tts_stats())
+
+@app.get("/debug-tts-stream")
+async def debug_tts_stream():
+    return JSONResponse(tts_streamer.stats())
+
+@app.get("/metrics")
+async def get_metrics(format: str = "prometheus"):
+    # ต่อ worker: แต่ละ uvicorn worker มี registry ของตัวเอง (รวมกันที่ฝั่ง scraper)
+    if format == "json":
+        return JSONResponse(metrics.to_dict())
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug-sessions")
+async def debug_sessions():
+    session_manager.sweep()
+    return JSONResponse({
+        "sessions": session_manager.stats(),
+        "tts_registry": TEMP_TTS_STORE.stats(),
+        "store": {"backend": session_store.name, "sessions": await session_store.count(SESSION_KEY)},
+    })
+
+@app.get("/debug-reply-parse")
+async def debug_reply_parse():
+    return JSONResponse({"menu_protocol": MENU_PROTOCOL, "json_schema": LLM_JSON_SCHEMA, **REPLY_PARSE_STATS})
+
+@app.get("/debug-intent-engine")
+async def debug_intent_engine():
+    return JSONResponse(intent_engine.stats())
@@ -0,0 +1,228 @@
+import asyncio
+import collections
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+from app.utils.stats import RollingStats
+
+logger = get_logger(__name__)
+
+ADMISSION_WAIT_SECONDS = metrics.histogram(
+    "vera_admission_wait_seconds", "Time an admitted turn waited for a slot and upstream budget")
+
+
+class Overloaded(Exception):
+    """The turn was not admitted; ``reason`` is busy, rate_limited, queue_full or wait_timeout."""
+
+    def __init__(self, reason: str, retry_after_s: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class TokenBucket:
+    """Refills ``rate`` tokens per second up to ``burst``; a reservation may borrow against the future.
+
+    Upstream clients call ``take`` (or ``try_take`` for optional calls such as hedges) right before
+    each request they send, so the budget is spent on calls actually made.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, max_wait_s: float) -> Optional[float]:
+        # คืนเวลาที่ต้องรอก่อนใช้ token ได้ (0 = ใช้ได้เลย) หรือ None ถ้าต้องรอนานกว่า max_wait_s
+        self._refill()
+        wait = max(0.0, (amount - self.tokens) / self.rate)
+        if wait > max_wait_s:
+            return None
+        self.tokens -= amount
+        return wait
+
+    async def take(self, max_wait_s: float) -> bool:
+        # รอจนถึงคิวของตัวเอง (ไม่เกิน max_wait_s) False = งบหมด ไม่ควรเรียก upstream
+        wait = self.reserve(1, max_wait_s)
+        if wait is None:
+            return False
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.tokens += 1  # ไม่ได้เรียกจริง คืน token
+                raise
+        return True
+
+    def try_take(self) -> bool:
+        return self.reserve(1, 0.0) is not None
+
+    def wait_time(self, amount: float = 1) -> float:
+        self._refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+
+def budget_from_rpm(rpm: float, burst_seconds: float) -> Optional[TokenBucket]:
+    # งบต่อ worker จาก rate limit ต่อนาที (0 = ไม่จำกัด)
+    if rpm <= 0:
+        return None
+    return TokenBucket(rpm / 60, max(1.0, rpm / 60 * burst_seconds))
+
+
+class AdmissionController:
+    """Admission in front of ``/ask``: per-session exclusion, upstream budgets and a bounded queue.
+
+    A session has at most one turn in flight. A repeat of that turn (same fingerprint, e.g. a
+    client retry after a timeout) shares its result when ``coalesce`` is on and the result can be
+    handed out twice (``replayable``); anything else is rejected as ``busy``, and a joined turn
+    that gets cancelled is shed as ``turn_cancelled`` so the repeat can be sent again. Each turn then takes one of ``max_active`` slots, waiting in a FIFO
+    queue of at most ``max_queue`` turns. The token ``buckets`` are the upstream budgets the LLM
+    gateway and TTS providers charge per call; admission only reads them, and a turn is shed
+    when a bucket is so far in debt that its next call would wait past the admission deadline.
+    A turn that cannot be admitted within ``max_wait_s`` raises ``Overloaded`` at once instead
+    of piling onto the upstream APIs. ``max_active=0`` means no concurrency limit.
+    """
+
+    def __init__(self, max_active: int = 16, max_queue: int = 32, max_wait_s: float = 3.0,
+                 buckets: Optional[Dict[str, TokenBucket]] = None, coalesce: bool = True,
+                 retry_after_s: float = 2.0):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.buckets = buckets or {}
+        self.coalesce = coalesce
+        self.retry_after_s = retry_after_s
+        self.active = 0
+        self._waiters: collections.deque = collections.deque()
+        self._inflight: Dict[str, tuple] = {}  # session_id -> (fingerprint, future)
+        self.wait = RollingStats()
+        self.admitted = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        self.shed = collections.Counter()
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    async def run(self, session_id: str, fingerprint: Hashable, turn: Callable[[], Awaitable],
+                  replayable: bool = True):
+        # replayable=False: ผลของ turn ใช้ได้ครั้งเดียว (เช่น TTS stream id) คำขอซ้ำจึง join ไม่ได้ ตอบ busy แทน
+        current = self._inflight.get(session_id)
+        if current is not None:
+            if self.coalesce and replayable and current[0] == fingerprint:
+                self.coalesced += 1
+                logger.info(f"🔁 Duplicate turn from {session_id} joined the one in flight")
+                try:
+                    return await asyncio.shield(current[1])
+                except asyncio.CancelledError:
+                    if not current[1].cancelled():
+                        raise  # คำขอนี้เองถูก cancel
+                    # turn ต้นทางถูก cancel (เช่น client ตัดการเชื่อมต่อ) ให้ตัวที่ join ส่งใหม่ได้
+                    self._shed("turn_cancelled", self.retry_after_s)
+            self._shed("busy", 1.0)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[session_id] = (fingerprint, future)
+        try:
+            await self._admit()
+            try:
+                result = await turn()
+            finally:
+                self._release()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # คนที่ join มาจะ re-raise เอง ไม่ต้องเตือน "never retrieved"
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[session_id]
+
+    async def _admit(self):
+        started = time.monotonic()
+        deadline = started + self.max_wait_s
+        await self._acquire(deadline)
+        try:
+            self._check_budget(deadline)
+        except BaseException:
+            self._release()
+            raise
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.wait.add(waited)
+        ADMISSION_WAIT_SECONDS.observe(waited)
+
+    def _check_budget(self, deadline: float):
+        # ไม่จองล่วงหน้า (turn ที่ตอบจาก fast path/cache ไม่เรียก upstream) แค่ดูว่างบติดลบเกินรอไหวหรือยัง
+        for name, bucket in self.buckets.items():
+            wait = bucket.wait_time()
+            if wait > max(0.0, deadline - time.monotonic()):
+                self._shed("rate_limited", max(self.retry_after_s, wait), name)
+
+    async def _acquire(self, deadline: float):
+        if self.max_active <= 0 or (self.active < self.max_active and not self._waiters):
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._shed("queue_full", self.retry_after_s)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.max_depth = max(self.max_depth, len(self._waiters))
+        try:
+            await asyncio.wait_for(waiter, max(0.0, deadline - time.monotonic()))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # ได้ slot พร้อมกับที่หมดเวลา ส่งต่อให้คิวถัดไป
+            elif waiter in self._waiters:  # _release อาจ pop waiter ที่ cancel แล้วออกไปก่อน
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self._shed("wait_timeout", self.retry_after_s)
+            raise
+
+    def _release(self):
+        # ส่ง slot ให้ตัวแรกในคิวโดยตรง (active ไม่ลด) ไม่มีคิวค่อยคืน slot
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _shed(self, reason: str, retry_after_s: float, detail: str = ""):
+        self.shed[reason] += 1
+        logger.warning(f"🚦 Turn shed ({reason}{' ' + detail if detail else ''}), "
+                       f"active={self.active} queued={len(self._waiters)}")
+        raise Overloaded(reason, retry_after_s)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "max_active": self.max_active,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "max_depth_seen": self.max_depth,
+            "max_wait_ms": self.max_wait_s * 1000,
+            "in_flight_sessions": len(self._inflight),
+            "admitted": self.admitted,
+            "coalesced": self.coalesced,
+            "shed": dict(self.shed),
+            "wait_ms": self.wait.summary(),
+            "buckets": {name: round(bucket.available(), 2) for name, bucket in self.buckets.items()},
+        }
@@ -0,0 +1,177 @@
+import asyncio
+import os
+import queue
+import threading
+from typing import Callable, Optional
+
+from app.config import ASR_ENGINE, ASR_FINAL_TIMEOUT_SECONDS, GOOGLE_CLOUD_TTS_CREDENTIALS_PATH
+
+PartialCallback = Callable[[str], None]
+
+
+class RecognitionStream:
+    """One utterance: PCM frames go in while the customer speaks, ``finish`` returns the final text."""
+
+    async def feed(self, pcm: bytes):
+        raise NotImplementedError
+
+    async def finish(self) -> str:
+        raise NotImplementedError
+
+    async def cancel(self):
+        pass
+
+
+class Recognizer:
+    name = "base"
+
+    def open(self, sample_rate: int, language: str, on_partial: PartialCallback, hint: str = "") -> RecognitionStream:
+        raise NotImplementedError
+
+
+class StandinStream(RecognitionStream):
+    def __init__(self, recognizer: "StandinRecognizer", sample_rate: int, on_partial: PartialCallback, transcript: str):
+        self.recognizer = recognizer
+        self.sample_rate = sample_rate
+        self.on_partial = on_partial
+        self.transcript = transcript
+        self.seconds = 0.0
+        self.revealed = 0
+
+    async def feed(self, pcm: bytes):
+        seconds = len(pcm) / 2 / self.sample_rate
+        self.seconds += seconds
+        # จำลองเวลาถอดเสียงที่แปรตามความยาวเสียง (real-time factor)
+        await asyncio.sleep(seconds * self.recognizer.decode_rtf)
+        revealed = min(int(self.seconds * self.recognizer.chars_per_second), len(self.transcript) - 1)
+        if revealed > self.revealed:
+            self.revealed = revealed
+            self.on_partial(self.transcript[:revealed])
+
+    async def finish(self) -> str:
+        await asyncio.sleep(self.recognizer.finalize_ms / 1000)
+        return self.transcript
+
+
+class StandinRecognizer(Recognizer):
+    """Offline engine for tests and benchmarks: returns the transcript the client names in ``hint``.
+
+    Decoding costs ``decode_rtf`` seconds per second of audio as it is fed and ``finalize_ms`` at
+    the end, so buffering the whole utterance before recognizing pays the full decode after speech.
+    """
+
+    name = "standin"
+
+    def __init__(self, decode_rtf: float = 0.15, finalize_ms: float = 80, chars_per_second: float = 12):
+        self.decode_rtf = decode_rtf
+        self.finalize_ms = finalize_ms
+        self.chars_per_second = chars_per_second
+
+    def open(self, sample_rate, language, on_partial, hint=""):
+        return StandinStream(self, sample_rate, on_partial, hint)
+
+
+_END = object()
+
+
+class GoogleStream(RecognitionStream):
+    # gRPC streaming_recognize เป็น API แบบ blocking จึงรันใน thread แล้วส่งผลกลับเข้า event loop
+    def __init__(self, client, sample_rate: int, language: str, on_partial: PartialCallback,
+                 final_timeout: float = ASR_FINAL_TIMEOUT_SECONDS):
+        from google.cloud import speech
+
+        self.loop = asyncio.get_running_loop()
+        self.on_partial = on_partial
+        self.final_timeout = final_timeout
+        self.responses = None
+        self.cancelled = False
+        self.chunks = queue.Queue()
+        self.final = self.loop.create_future()
+        self.finals = []
+        self.config = speech.StreamingRecognitionConfig(
+            config=speech.RecognitionConfig(
+                encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+                sample_rate_hertz=sample_rate,
+                language_code=language,
+            ),
+            interim_results=True,
+        )
+        self.speech = speech
+        self.client = client
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _requests(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is _END:
+                return
+            yield self.speech.StreamingRecognizeRequest(audio_content=chunk)
+
+    def _run(self):
+        try:
+            self.responses = self.client.streaming_recognize(config=self.config, requests=self._requests())
+            if self.cancelled:
+                self.responses.cancel()
+            for response in self.responses:
+                for result in response.results:
+                    if not result.alternatives:
+                        continue
+                    text = result.alternatives[0].transcript
+                    if result.is_final:
+                        self.finals.append(text)
+                    else:
+                        self.loop.call_soon_threadsafe(self.on_partial, "".join(self.finals) + text)
+            self.loop.call_soon_threadsafe(self._resolve, "".join(self.finals).strip(), None)
+        except Exception as e:
+            self.loop.call_soon_threadsafe(self._resolve, None, e)
+
+    def _resolve(self, text, error):
+        if self.final.done() or self.cancelled:
+            return
+        if error is not None:
+            self.final.set_exception(error)
+        else:
+            self.final.set_result(text)
+
+    async def feed(self, pcm: bytes):
+        self.chunks.put(pcm)
+
+    async def finish(self) -> str:
+        self.chunks.put(_END)
+        try:
+            return await asyncio.wait_for(self.final, self.final_timeout)
+        except asyncio.TimeoutError:
+            # ไม่ได้ผลลัพธ์สุดท้ายตามเวลา ยกเลิก gRPC call ไม่ให้ thread/stream ค้างอยู่ฝั่ง Google
+            await self.cancel()
+            raise asyncio.TimeoutError(f"no final transcript within {self.final_timeout:g}s") from None
+
+    async def cancel(self):
+        self.cancelled = True
+        self.chunks.put(_END)
+        if self.responses is not None:
+            self.responses.cancel()
+
+
+class GoogleStreamingRecognizer(Recognizer):
+    name = "google"
+
+    def __init__(self):
+        self._client = None
+
+    def open(self, sample_rate, language, on_partial, hint=""):
+        if self._client is None:
+            from google.cloud import speech
+
+            os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", GOOGLE_CLOUD_TTS_CREDENTIALS_PATH)
+            self._client = speech.SpeechClient()
+        return GoogleStream(self._client, sample_rate, language, on_partial)
+
+
+def create_recognizer(engine: Optional[str] = None) -> Recognizer:
+    engine = engine or ASR_ENGINE
+    if engine == "google":
+        return GoogleStreamingRecognizer()
+    if engine == "standin":
+        return StandinRecognizer()
+    raise NotImplementedError(f"ASR engine '{engine}' is not supported.")
+
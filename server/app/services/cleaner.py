@@ -1,29 +1,104 @@
-import os
+import asyncio
+import heapq
+import itertools
 import time
-import threading
-from datetime import datetime, timedelta
-from app.config import TTS_PATH
+from typing import Callable, Dict, List, Optional
+
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-def cleanup_old_tts_files(ttl_minutes=15, interval_seconds=300):
-    def task():
+
+class ExpiryScheduler:
+    """Min-heap of (expires_at, key) drained by one asyncio task that sleeps until the next deadline.
+
+    Entries are added when the thing they expire is created, so nothing is ever scanned. Re-scheduling
+    or cancelling a key leaves its old heap item in place; it is skipped when popped (and the heap
+    is rebuilt once stale items outnumber live ones).
+    """
+
+    def __init__(self, on_expire: Callable[[str], None]):
+        self.on_expire = on_expire
+        self._heap: List[tuple] = []
+        self._deadlines: Dict[str, float] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.fired = 0
+        self.max_lag_ms = 0.0
+
+    def schedule(self, key: str, expires_at: float):
+        # expires_at เป็นเวลา time.monotonic()
+        self._deadlines[key] = expires_at
+        heapq.heappush(self._heap, (expires_at, next(self._seq), key))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._compact()
+        if self._task is None or self._task.done() or self._heap[0][2] == key:
+            self._wake()
+
+    def cancel(self, key: str):
+        self._deadlines.pop(key, None)
+
+    def pop_due(self, now: float) -> List[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, _, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) != expires_at:
+                continue  # ถูกเลื่อน/ยกเลิกไปแล้ว
+            del self._deadlines[key]
+            self.max_lag_ms = max(self.max_lag_ms, (now - expires_at) * 1000)
+            due.append(key)
+        return due
+
+    def next_deadline(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def _compact(self):
+        self._heap = [(t, next(self._seq), k) for k, t in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def _wake(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # ยังไม่มี event loop (ตอน import) task จะเริ่มเมื่อ start()
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        else:
+            self._wakeup.set()
+
+    def start(self):
+        self._wake()
+
+    async def _run(self):
         while True:
-            now = datetime.now()
-            threshold = now - timedelta(minutes=ttl_minutes)
-
-            for filename in os.listdir(TTS_PATH):
-                path = os.path.join(TTS_PATH, filename)
-                if os.path.isfile(path) and path.endswith(".mp3"):
-                    try:
-                        created_time = datetime.fromtimestamp(os.path.getctime(path))
-                        if created_time < threshold:
-                            os.remove(path)
-                            logger.info(f"🧹 Removed old TTS file: {filename}")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Failed to delete {filename}: {e}")
-
-            time.sleep(interval_seconds)
-
-    threading.Thread(target=task, daemon=True).start()
\ No newline at end of file
+            self._wakeup.clear()
+            for key in self.pop_due(time.monotonic()):
+                self.fired += 1
+                try:
+                    self.on_expire(key)
+                except Exception as e:
+                    logger.warning(f"⚠️ Expiry handler failed for {key}: {e}")
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def stats(self) -> dict:
+        return {"scheduled": len(self._deadlines), "heap_items": len(self._heap),
+                "fired": self.fired, "max_lag_ms": round(self.max_lag_ms, 1)}
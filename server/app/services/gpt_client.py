@@ -1,17 +1,69 @@
-from openai import OpenAI
-from app.config import OPENAI_API_KEY, OPENAI_MODEL
+import httpx
+from typing import AsyncIterator, Optional
+from openai import AsyncOpenAI
+from app.config import (
+    OPENAI_API_KEY, OPENAI_MODEL, OPENAI_BASE_URL,
+    LLM_MAX_CONCURRENCY, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_TIMEOUT_SECONDS,
+    LLM_HEDGE_AFTER_MS, LLM_FALLBACK_MODEL, LLM_RATE_LIMIT_RPM, RATE_LIMIT_BURST_SECONDS,
+)
+from app.services.admission import budget_from_rpm
+from app.services.llm_gateway import LLMGateway
 from app.utils.logger import get_logger
+from app.utils.metrics import LLM_TOKENS
 
 logger = get_logger(__name__)
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-def ask_gpt(messages: list) -> str:
-    logger.info("Sending conversation history to OpenAI")
-    response = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=messages
-    )
-    reply = response.choices[0].message.content.strip()
-    usage = response.usage
+
+# Shared pooled client for the async request path (one per worker)
+async_client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    base_url=OPENAI_BASE_URL,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        ),
+        timeout=HTTP_TIMEOUT_SECONDS,
+    ),
+)
+
+
+def _log_usage(usage):
+    if usage is None:
+        return
+    LLM_TOKENS.inc("prompt", amount=usage.prompt_tokens)
+    LLM_TOKENS.inc("completion", amount=usage.completion_tokens)
     logger.info(f"🔢 Token usage: input={usage.prompt_tokens}, output={usage.completion_tokens}, total={usage.total_tokens}")
-    return reply
+
+
+# Upstream request budget (per worker), charged per attempt actually sent (hedges and summaries included)
+llm_budget = budget_from_rpm(LLM_RATE_LIMIT_RPM, RATE_LIMIT_BURST_SECONDS)
+
+# Deadline, hedged second attempt (optionally on a faster model) and per-model stats
+gateway = LLMGateway(
+    async_client,
+    OPENAI_MODEL,
+    hedge_model=LLM_FALLBACK_MODEL or OPENAI_MODEL,
+    hedging=LLM_HEDGE_AFTER_MS != "off",
+    hedge_after_s=None if LLM_HEDGE_AFTER_MS in ("auto", "off") else float(LLM_HEDGE_AFTER_MS) / 1000,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    on_usage=_log_usage,
+    budget=llm_budget,
+)
+
+
+async def ask_gpt_async(messages: list, response_format: dict = None, deadline: Optional[float] = None) -> str:
+    logger.info("Sending conversation history to OpenAI (async)")
+    return await gateway.complete(messages, response_format, deadline)
+
+
+def ask_gpt_stream(messages: list, response_format: dict = None, deadline: Optional[float] = None) -> AsyncIterator[str]:
+    logger.info("Streaming conversation history to OpenAI")
+    return gateway.stream(messages, response_format, deadline)
+
+
+def llm_stats() -> dict:
+    return gateway.stats()
+
+
+async def close_gpt_client():
+    await async_client.close()
@@ -0,0 +1,218 @@
+import re
+from collections import defaultdict
+from typing import List, Optional
+
+from app.services.menu_index import toneless_key
+from app.services.promotions import PromotionEngine, describe_total
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_THAI_DIGITS = str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789")
+
+NUMBER_WORDS = {
+    "หนึ่ง": 1, "นึง": 1, "เดียว": 1, "สอง": 2, "สาม": 3, "สี่": 4, "ห้า": 5,
+    "หก": 6, "เจ็ด": 7, "แปด": 8, "เก้า": 9, "สิบ": 10, "ยี่สิบ": 20, "เอ็ด": 1,
+}
+UNITS = ["แก้ว", "ที่", "อัน", "ถ้วย", "ขวด", "ชิ้น"]
+SEPARATORS = ["แล้วก็", "และ", "กับ", ","]
+FILLERS = ["ขอ", "เอา", "สั่ง", "รับ", "ค่ะ", "คะ", "ครับ", "นะ", "จ้า", "จ้ะ", "หน่อย", "ด้วย", "เพิ่ม", "อีก"]
+# คำที่ทำให้ประโยคกำกวม (แก้/ลด/ปฏิเสธ) ให้ LLM จัดการ
+NEGATIONS = ["ไม่", "เปลี่ยน", "แทน", "ลบ", "ออก", "ยกเว้น", "หรือ"]
+COMMANDS = {
+    "confirm_order": ["แค่นี้", "ยืนยัน", "สรุป", "พอแล้ว"],
+    "cancel_order": ["ยกเลิกรายการ", "ยกเลิก"],
+    "greeting": ["สวัสดี", "เริ่มใหม่"],
+}
+
+GREETING_SSML = "<speak>สวัสดีค่ะ ยินดีต้อนรับสู่ร้านเวร่านะคะ รับอะไรดีคะ?</speak>"
+CANCEL_SSML = "<speak>ไม่เป็นไรค่ะ ยกเลิกรายการให้แล้วนะคะ</speak>"
+
+
+def _alternation(words) -> str:
+    keys = sorted({toneless_key(w) for w in words if w.strip()}, key=len, reverse=True)
+    return "|".join(re.escape(k) for k in keys)
+
+
+def parse_thai_number(words: List[str]) -> Optional[int]:
+    """Thai/Arabic number words (toneless keys) to an int, None when the sequence is not one number.
+
+    Two unit numbers in a row with no สิบ between them ("สามสี่", "หนึ่งสอง") are ambiguous and
+    rejected so the turn goes to the LLM:
+
+    >>> parse_thai_number(["สาม"]), parse_thai_number(["สอง", "สิบ", "หา"]), parse_thai_number(["สิบ", "เอด"])
+    (3, 25, 11)
+    >>> parse_thai_number(["สาม", "สี"]), parse_thai_number(["สอง", "สาม"]), parse_thai_number(["หนึง", "สอง"])
+    (None, None, None)
+    >>> parse_thai_number(["2", "3"])
+    """
+    value = 0
+    current = None
+    for word in words:
+        n = int(word) if word.isdigit() else _NUMBER_KEYS.get(word)
+        if n is None:
+            return None
+        if n == 10 and not word.isdigit():
+            value += (current or 1) * 10
+            current = None
+        elif n == 20 and not word.isdigit():
+            if current is not None:
+                return None
+            value += 20
+            current = None
+        elif current is not None:
+            # ตัวเลขหลักหน่วยสองตัวติดกัน ("สามสี่") ไม่รู้ว่าลูกค้าหมายถึงเท่าไหร่
+            return None
+        else:
+            current = n
+    return value + (current or 0)
+
+
+_NUMBER_KEYS = {toneless_key(w): n for w, n in NUMBER_WORDS.items()}
+
+
+def _join_items(parts: List[str]) -> str:
+    if len(parts) == 1:
+        return parts[0]
+    return " ".join(parts[:-1]) + f" และ{parts[-1]}"
+
+
+class IntentEngine:
+    """Local fast path that resolves unambiguous utterances without calling the LLM.
+
+    The utterance is scanned left to right with one compiled token regex (menu names,
+    Thai/Arabic numbers, units, separators, fillers, commands). Confidence is the share
+    of characters covered by known tokens; below ``threshold`` the turn goes to the LLM.
+    """
+
+    def __init__(self, menu_data: List[dict], threshold: float = 0.9, max_qty: int = 20,
+                 pricing: Optional[PromotionEngine] = None):
+        self.threshold = threshold
+        self.max_qty = max_qty
+        self.pricing = pricing or PromotionEngine([])
+        self._menu_names = {}
+        for item in menu_data:
+            for name in [item["name"], *item.get("aliases", [])]:
+                self._menu_names.setdefault(toneless_key(name), (item["id"], item["name"]))
+        self._commands = {toneless_key(w): intent for intent, words in COMMANDS.items() for w in words}
+
+        self._token = re.compile("|".join([
+            f"(?P<cmd>{_alternation(self._commands)})",
+            f"(?P<menu>{_alternation(self._menu_names)})",
+            rf"(?P<num>\d+|{_alternation(NUMBER_WORDS)})",
+            f"(?P<unit>{_alternation(UNITS)})",
+            f"(?P<sep>{_alternation(SEPARATORS)})",
+            f"(?P<neg>{_alternation(NEGATIONS)})",
+            f"(?P<filler>{_alternation(FILLERS)})",
+        ]))
+
+        self.turns = 0
+        self.hits = 0
+        self.hits_by_intent = defaultdict(int)
+
+    def match(self, text: str, order_list: list, first_order: bool = False) -> Optional[dict]:
+        self.turns += 1
+        result = self._match(text, order_list, first_order)
+        if result is not None:
+            self.hits += 1
+            self.hits_by_intent[result["intent"]] += 1
+            logger.info(f"⚡ Fast-path intent: {result['intent']} ({text})")
+        return result
+
+    def _scan(self, key: str):
+        pos = 0
+        covered = 0
+        tokens = []
+        while pos < len(key):
+            m = self._token.match(key, pos)
+            if m is None:
+                pos += 1
+                continue
+            tokens.append((m.lastgroup, m.group()))
+            covered += m.end() - pos
+            pos = m.end()
+        return tokens, covered / len(key)
+
+    def _match(self, text: str, order_list: list, first_order: bool) -> Optional[dict]:
+        key = toneless_key(text.translate(_THAI_DIGITS))
+        if not key:
+            return None
+        tokens, confidence = self._scan(key)
+        if confidence < self.threshold:
+            return None
+        kinds = {kind for kind, _ in tokens}
+        if "neg" in kinds:
+            return None
+
+        if "cmd" in kinds:
+            intents = {self._commands[word] for kind, word in tokens if kind == "cmd"}
+            if "menu" in kinds or "num" in kinds or len(intents) != 1:
+                return None
+            return self._command(intents.pop(), order_list, first_order)
+
+        items = self._items(tokens)
+        if not items:
+            return None
+        parts = [f"{name} {qty} แก้ว" for (_, name), qty in items]
+        return {
+            "intent": "add_order",
+            "items": [{"id": item_id, "qty": qty} for (item_id, _), qty in items],
+            "response": f"<speak>รับ{_join_items(parts)}นะคะ</speak>",
+        }
+
+    def _items(self, tokens) -> Optional[list]:
+        items = []
+        number = []
+        pending_qty = None
+
+        def close_number():
+            nonlocal number, pending_qty
+            if not number:
+                return True
+            qty = parse_thai_number(number)
+            number = []
+            if qty is None or not 1 <= qty <= self.max_qty:
+                return False
+            if items and items[-1][1] is None:
+                items[-1][1] = qty
+            elif pending_qty is None:
+                pending_qty = qty  # "สองแก้ว ลาเต้เย็น"
+            else:
+                return False
+            return True
+
+        for kind, word in tokens:
+            if kind == "num":
+                number.append(word)
+                continue
+            if not close_number():
+                return None
+            if kind == "menu":
+                items.append([self._menu_names[word], pending_qty])
+                pending_qty = None
+        if not close_number() or pending_qty is not None:
+            return None
+        return [(menu, qty or 1) for menu, qty in items]
+
+    def _command(self, intent: str, order_list: list, first_order: bool) -> Optional[dict]:
+        if intent == "greeting":
+            return {"intent": "greeting", "response": GREETING_SSML}
+        if intent == "cancel_order":
+            return {"intent": "cancel_order", "response": CANCEL_SSML}
+        if not order_list:
+            return None  # ไม่มีรายการให้สรุป ให้ LLM ตอบ
+        parts = [f"{item.name} {item.qty} แก้ว" for item in order_list]
+        priced = self.pricing.evaluate(order_list, first_order=first_order)
+        return {
+            "intent": "confirm_order",
+            "response": f"<speak>คุณลูกค้าสั่ง{_join_items(parts)} {describe_total(priced)} ถูกต้องไหมคะ?</speak>",
+        }
+
+    def stats(self) -> dict:
+        return {
+            "turns": self.turns,
+            "fast_path_hits": self.hits,
+            "hit_rate": round(self.hits / self.turns, 4) if self.turns else 0.0,
+            "hits_by_intent": dict(self.hits_by_intent),
+            "threshold": self.threshold,
+        }
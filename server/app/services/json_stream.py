@@ -0,0 +1,121 @@
+from typing import Dict, Optional
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class ReplyStreamParser:
+    """Incremental parser for the model's JSON reply.
+
+    ``feed()`` takes raw completion deltas and returns the newly decoded characters of the
+    top-level ``stream_field`` string (the SSML ``response``) while tokens are still arriving.
+    Other top-level string fields (e.g. ``intent``) become available in ``fields`` as soon as
+    they are closed. Output that does not start with ``{`` (optionally inside a ```json fence)
+    switches to ``raw`` mode and nothing is streamed; callers fall back to the full text.
+    """
+
+    def __init__(self, stream_field: str = "response"):
+        self.stream_field = stream_field
+        self.text = ""
+        self.mode: Optional[str] = None  # None | "fence" | "json" | "raw"
+        self.fields: Dict[str, str] = {}
+        self.streamed = ""
+
+        self._depth = 0
+        self._in_string = False
+        self._string_is_key = False
+        self._expect_key = False
+        self._escape = False
+        self._unicode: Optional[str] = None
+        self._high_surrogate: Optional[int] = None
+        self._key: Optional[str] = None
+        self._buf = []
+
+    @property
+    def intent(self) -> Optional[str]:
+        return self.fields.get("intent")
+
+    def feed(self, delta: str) -> str:
+        self.text += delta
+        out = []
+        for c in delta:
+            if self.mode is None:
+                if c.isspace():
+                    continue
+                if c == "{":
+                    self.mode = "json"
+                elif c == "`":
+                    self.mode = "fence"
+                    continue
+                else:
+                    self.mode = "raw"
+                    continue
+            elif self.mode == "fence":
+                # ข้าม ```json จนถึงขึ้นบรรทัดใหม่ แล้วค่อยตัดสินใจใหม่
+                if c == "\n":
+                    self.mode = None
+                continue
+            elif self.mode == "raw":
+                continue
+            self._step(c, out)
+        emitted = "".join(out)
+        self.streamed += emitted
+        return emitted
+
+    def _streaming_value(self) -> bool:
+        return self._depth == 1 and not self._string_is_key and self._key == self.stream_field
+
+    def _append(self, ch: str, out: list):
+        self._buf.append(ch)
+        if self._streaming_value():
+            out.append(ch)
+
+    def _step(self, c: str, out: list):
+        if self._in_string:
+            if self._unicode is not None:
+                self._unicode += c
+                if len(self._unicode) == 4:
+                    code = int(self._unicode, 16)
+                    self._unicode = None
+                    if 0xD800 <= code < 0xDC00:
+                        self._high_surrogate = code
+                    elif 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+                        code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+                        self._high_surrogate = None
+                        self._append(chr(code), out)
+                    else:
+                        self._append(chr(code), out)
+            elif self._escape:
+                self._escape = False
+                if c == "u":
+                    self._unicode = ""
+                else:
+                    self._append(_ESCAPES.get(c, c), out)
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                value = "".join(self._buf)
+                if self._depth == 1:
+                    if self._string_is_key:
+                        self._key = value
+                    elif self._key is not None:
+                        self.fields[self._key] = value
+            else:
+                self._append(c, out)
+            return
+
+        if c == '"':
+            self._in_string = True
+            self._string_is_key = self._depth == 1 and self._expect_key
+            self._buf = []
+        elif c in "{[":
+            self._depth += 1
+            self._expect_key = c == "{" and self._depth == 1
+        elif c in "}]":
+            self._depth -= 1
+        elif self._depth == 1:
+            if c == ":":
+                self._expect_key = False
+            elif c == ",":
+                self._expect_key = True
+                self._key = None
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from app.utils.logger import get_logger
+from app.utils.tokenizer import count_message_tokens, count_tokens
+
+logger = get_logger(__name__)
+
+
+def canonical_messages(messages: list) -> str:
+    # role + content เท่านั้น ตัดช่องว่างหัวท้าย ลำดับ key คงที่
+    return json.dumps(
+        [[m.get("role", ""), (m.get("content") or "").strip()] for m in messages],
+        ensure_ascii=False, separators=(",", ":"),
+    )
+
+
+def data_version(*sources) -> str:
+    # digest ของเมนู/โปรโมชั่น: เปลี่ยนเมื่อไหร่ key ทั้งหมดเปลี่ยนตาม
+    raw = json.dumps(sources, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class LLMResponseCache:
+    """Exact-match memo of LLM replies, keyed on the model, the data version and the whole message list.
+
+    Only replies whose intent is in ``intents`` are stored (greetings and cancels by default). Entries
+    expire after ``ttl_seconds`` and the least recently used one is evicted above
+    ``max_entries``. ``invalidate`` drops everything. The namespace is the menu/promotions
+    ``data_version`` the process started with, so keys from other data never match. Each hit is credited with the prompt and completion tokens it did not spend.
+    """
+
+    def __init__(self, intents: Iterable[str], max_entries: int = 1000, ttl_seconds: float = 3600,
+                 namespace: str = ""):
+        self.intents = frozenset(intents)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (reply, prompt tokens, completion tokens, expires_at)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+        self.tokens_saved = {"prompt": 0, "completion": 0}
+
+    def make_key(self, model: str, messages: list, response_format: Optional[dict] = None) -> str:
+        raw = "\x00".join((
+            self.namespace, model, json.dumps(response_format, sort_keys=True), canonical_messages(messages),
+        ))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[3] <= time.monotonic():
+            del self._entries[key]
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.tokens_saved["prompt"] += entry[1]
+        self.tokens_saved["completion"] += entry[2]
+        return entry[0]
+
+    def put(self, key: str, messages: list, reply: str, intent: str) -> bool:
+        if intent not in self.intents:
+            return False
+        prompt_tokens = sum(count_message_tokens(m.get("content") or "") for m in messages)
+        self._entries[key] = (reply, prompt_tokens, count_tokens(reply), time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        self.stores += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def invalidate(self, reason: str = "manual"):
+        dropped = len(self._entries)
+        self._entries.clear()
+        self.invalidations += 1
+        logger.info(f"🧹 LLM response cache invalidated ({reason}), {dropped} entries dropped")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "intents": sorted(self.intents),
+            "namespace": self.namespace,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "invalidations": self.invalidations,
+            "tokens_saved": dict(self.tokens_saved),
+        }
@@ -0,0 +1,270 @@
+import asyncio
+import collections
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from app.services.admission import TokenBucket
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+from app.utils.stats import RollingStats
+
+logger = get_logger(__name__)
+
+LLM_SECONDS = metrics.histogram(
+    "vera_llm_seconds", "LLM attempt latency per model (to first token when streaming)", ["model", "outcome"])
+LLM_HEDGES = metrics.counter("vera_llm_hedges_total", "LLM calls by winning attempt", ["winner"])
+LLM_UNAVAILABLE = metrics.counter("vera_llm_unavailable_total", "LLM calls answered with the canned apology", ["reason"])
+
+# คำตอบสำรองเมื่อ LLM ไม่ตอบภายในงบเวลาของ turn (ไม่แตะตะกร้า ลูกค้าพูดซ้ำได้เลย)
+APOLOGY_REPLY = json.dumps({
+    "intent": "apology",
+    "response": "<speak>ขออภัยค่ะ ระบบตอบช้าไปนิด รบกวนพูดอีกครั้งได้ไหมคะ?</speak>",
+}, ensure_ascii=False)
+
+
+class LLMUnavailable(Exception):
+    """No answer before the deadline (``reason="deadline"``), every attempt failed (``"error"``) or the
+    upstream request budget ran out (``"rate_limited"``)."""
+
+    def __init__(self, reason: str, message: str = ""):
+        super().__init__(message or reason)
+        self.reason = reason
+
+
+def _format_kwargs(response_format) -> dict:
+    return {"response_format": response_format} if response_format else {}
+
+
+class _ModelStats:
+    def __init__(self):
+        self.complete = RollingStats(window=512)  # เวลาจนได้คำตอบครบ
+        self.first_token = RollingStats(window=512)  # เวลาจนได้ token แรก (stream)
+        self.attempts = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.wins = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "wins": self.wins,
+            "win_rate": round(self.wins / self.attempts, 3) if self.attempts else None,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "complete_ms": self.complete.summary(),
+            "first_token_ms": self.first_token.summary(),
+        }
+
+
+class _OpenStream:
+    # stream ที่ได้ token แรกแล้ว ถือ slot ของ semaphore ไว้จนกว่าจะ close
+    def __init__(self, slots: asyncio.Semaphore):
+        self.slots = slots
+        self.stream = None
+        self.chunks = None
+        self.first = ""
+        self.finished = False
+        self._closed = False
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self.stream is not None:
+                await self.stream.close()
+        finally:
+            self.slots.release()
+
+
+class LLMGateway:
+    """Chat completions with a deadline, a hedged second attempt and per-model latency stats.
+
+    Every call starts one attempt on ``model``. If it has not answered after the hedge delay
+    (fixed, or with ``hedge_after_s=None`` the model's recent p95 clamped to
+    [min_hedge_s, max_hedge_s]) a second attempt goes to ``hedge_model`` and the first answer
+    wins; the other attempt is cancelled. A failed attempt starts the hedge at once. When the
+    ``deadline`` (``time.monotonic()`` value) passes first, or every attempt failed,
+    ``LLMUnavailable`` is raised. For streams "answer" means the first content token; after
+    that the winning stream is read to the end. With a ``budget`` token bucket every attempt is
+    charged when it is sent: the primary waits for budget (up to the deadline, or
+    ``budget_wait_s`` without one), a hedge is only sent if budget is available right away.
+    """
+
+    def __init__(self, client, model: str, hedge_model: Optional[str] = None, hedging: bool = True,
+                 hedge_after_s: Optional[float] = 3.0, min_hedge_s: float = 0.5, max_hedge_s: float = 6.0,
+                 min_samples: int = 20, max_concurrency: int = 32,
+                 on_usage: Optional[Callable[[object], None]] = None,
+                 budget: Optional[TokenBucket] = None, budget_wait_s: float = 10.0):
+        self.client = client
+        self.model = model
+        self.hedge_model = hedge_model or model
+        self.hedging = hedging
+        self.hedge_after_s = hedge_after_s
+        self.min_hedge_s = min_hedge_s
+        self.max_hedge_s = max_hedge_s
+        self.min_samples = min_samples
+        self.on_usage = on_usage or (lambda usage: None)
+        self.budget = budget
+        self.budget_wait_s = budget_wait_s
+        self.hedges_skipped = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.models = collections.defaultdict(_ModelStats)
+        self.calls = 0
+        self.hedged = 0
+        self.wins = collections.Counter()
+        self.unavailable = collections.Counter()
+
+    def hedge_delay(self, kind: str = "complete") -> float:
+        if self.hedge_after_s is not None:
+            return self.hedge_after_s
+        window = getattr(self.models[self.model], kind)
+        if len(window.samples) < self.min_samples:
+            return self.max_hedge_s
+        return min(self.max_hedge_s, max(self.min_hedge_s, window.percentile(95)))
+
+    async def complete(self, messages: list, response_format: dict = None, deadline: Optional[float] = None) -> str:
+        async def attempt(model: str) -> str:
+            async with self._slots:
+                response = await self.client.chat.completions.create(
+                    model=model, messages=messages, **_format_kwargs(response_format))
+            self.on_usage(response.usage)
+            return response.choices[0].message.content.strip()
+
+        return await self._race(attempt, "complete", deadline)
+
+    async def stream(self, messages: list, response_format: dict = None,
+                     deadline: Optional[float] = None) -> AsyncIterator[str]:
+        async def attempt(model: str) -> _OpenStream:
+            await self._slots.acquire()
+            opened = _OpenStream(self._slots)
+            try:
+                opened.stream = await self.client.chat.completions.create(
+                    model=model, messages=messages, stream=True, stream_options={"include_usage": True},
+                    **_format_kwargs(response_format))
+                opened.chunks = opened.stream.__aiter__()
+                while not opened.first:
+                    try:
+                        chunk = await opened.chunks.__anext__()
+                    except StopAsyncIteration:
+                        opened.finished = True
+                        break
+                    if chunk.usage is not None:
+                        self.on_usage(chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        opened.first = chunk.choices[0].delta.content
+                return opened
+            except BaseException:
+                await opened.close()
+                raise
+
+        opened = await self._race(attempt, "first_token", deadline, discard=lambda o: o.close())
+        try:
+            if opened.first:
+                yield opened.first
+            if not opened.finished:
+                async for chunk in opened.chunks:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    if chunk.usage is not None:
+                        self.on_usage(chunk.usage)
+        finally:
+            await opened.close()
+
+    async def _timed(self, attempt: Callable[[str], Awaitable], model: str, kind: str):
+        stats = self.models[model]
+        stats.attempts += 1
+        started = time.monotonic()
+        try:
+            result = await attempt(model)
+        except asyncio.CancelledError:
+            stats.cancelled += 1
+            LLM_SECONDS.observe(time.monotonic() - started, model, "cancelled")
+            raise
+        except Exception:
+            stats.errors += 1
+            LLM_SECONDS.observe(time.monotonic() - started, model, "error")
+            raise
+        elapsed = time.monotonic() - started
+        getattr(stats, kind).add(elapsed)
+        LLM_SECONDS.observe(elapsed, model, "ok")
+        return result
+
+    async def _race(self, attempt: Callable[[str], Awaitable], kind: str, deadline: Optional[float],
+                    discard: Optional[Callable[[object], Awaitable]] = None):
+        self.calls += 1
+        tasks = {}
+
+        def launch(role: str, model: str):
+            tasks[asyncio.ensure_future(self._timed(attempt, model, kind))] = (role, model)
+
+        if self.budget is not None:
+            max_wait = deadline - time.monotonic() if deadline is not None else self.budget_wait_s
+            if not await self.budget.take(max(0.0, max_wait)):
+                self.unavailable["rate_limited"] += 1
+                LLM_UNAVAILABLE.inc("rate_limited")
+                logger.warning("🚦 LLM request budget exhausted, answering with apology")
+                raise LLMUnavailable("rate_limited")
+        launch("primary", self.model)
+        hedge_at = time.monotonic() + self.hedge_delay(kind) if self.hedging else None
+        winner = None
+        error: Optional[BaseException] = None
+        try:
+            while True:
+                pending = [task for task in tasks if not task.done()]
+                now = time.monotonic()
+                if hedge_at is not None and (not pending or now >= hedge_at):
+                    hedge_at = None
+                    if self.budget is not None and not self.budget.try_take():
+                        self.hedges_skipped += 1  # ไม่มีงบเหลือสำหรับ call ที่สอง รอ primary ต่อ
+                        continue
+                    if not pending:
+                        logger.warning(f"⚠️ LLM {self.model} failed ({error}), retrying on {self.hedge_model}")
+                    self.hedged += 1
+                    launch("hedge", self.hedge_model)
+                    continue
+                if not pending:
+                    self.unavailable["error"] += 1
+                    LLM_UNAVAILABLE.inc("error")
+                    raise LLMUnavailable("error", f"all LLM attempts failed: {error}") from error
+                if deadline is not None and now >= deadline:
+                    self.unavailable["deadline"] += 1
+                    LLM_UNAVAILABLE.inc("deadline")
+                    logger.warning(f"⏰ LLM deadline passed after {len(tasks)} attempt(s), answering with apology")
+                    raise LLMUnavailable("deadline")
+
+                wake = [t for t in (deadline, hedge_at) if t is not None]
+                timeout = max(0.0, min(wake) - now) if wake else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    winner = task
+                    role, model = tasks[task]
+                    self.wins[role] += 1
+                    self.models[model].wins += 1
+                    if len(tasks) > 1:
+                        LLM_HEDGES.inc(role)
+                    return task.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif task is not winner and discard is not None and not task.cancelled() \
+                        and task.exception() is None:
+                    await discard(task.result())  # ได้คำตอบพร้อมกันแต่แพ้ ปิดทิ้ง
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "hedge_model": self.hedge_model if self.hedging else None,
+            "hedge_after_ms": round(self.hedge_delay() * 1000, 1) if self.hedging else None,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedges_skipped": self.hedges_skipped,
+            "wins": dict(self.wins),
+            "unavailable": dict(self.unavailable),
+            "models": {model: stats.as_dict() for model, stats in self.models.items()},
+        }
@@ -0,0 +1,192 @@
+import re
+import unicodedata
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+_SPACES = re.compile(r"[\s\-_.]+")
+# วรรณยุกต์ ไม้ไต่คู้ การันต์ ไม้ยมก — ASR มักใส่ผิด/ตกหล่น
+_THAI_MARKS = re.compile("[\u0E46\u0E47-\u0E4C]")
+# พยัญชนะที่ออกเสียงเหมือนกัน และสระสั้น/ยาว ยุบให้เป็นตัวเดียว
+_PHONETIC_MAP = str.maketrans({
+    "ข": "ค", "ฃ": "ค", "ฅ": "ค", "ฆ": "ค",
+    "ฉ": "ช", "ฌ": "ช",
+    "ซ": "ส", "ศ": "ส", "ษ": "ส",
+    "ญ": "ย",
+    "ฎ": "ด", "ฏ": "ต",
+    "ฐ": "ท", "ฑ": "ท", "ฒ": "ท", "ถ": "ท", "ธ": "ท",
+    "ณ": "น", "ฬ": "ล",
+    "ผ": "พ", "ภ": "พ", "ฝ": "ฟ",
+    "ใ": "ไ",
+    "ี": "ิ", "ื": "ึ", "ู": "ุ",
+    "ะ": None,
+})
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFKC", text.strip().lower())
+
+
+def compact_key(text: str) -> str:
+    return _SPACES.sub("", normalize_text(text))
+
+
+def toneless_key(text: str) -> str:
+    return _THAI_MARKS.sub("", compact_key(text))
+
+
+def phonetic_key(text: str) -> str:
+    return toneless_key(text).translate(_PHONETIC_MAP)
+
+
+def _bigrams(key: str) -> set:
+    if len(key) < 2:
+        return {key}
+    return {key[i:i + 2] for i in range(len(key) - 1)}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    # Levenshtein แบบหยุดเร็วเมื่อเกิน limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            row_min = min(row_min, cur[j])
+        if row_min > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+@dataclass(frozen=True)
+class MenuMatch:
+    id: str
+    name: str
+    price: float
+    score: float = 1.0
+    method: str = "exact"
+
+
+class MenuIndex:
+    """Menu lookup structures built once at load time.
+
+    Resolution order: exact name/alias -> prefix (trie) -> substring -> fuzzy
+    (edit distance on a Thai phonetic key, candidates pre-filtered by shared bigrams).
+    """
+
+    def __init__(self, menu_data: List[dict], fuzzy_ratio: float = 0.25, cache_size: int = 2048):
+        self.items = menu_data
+        self.fuzzy_ratio = fuzzy_ratio
+        self.cache_size = cache_size
+        self.by_id: Dict[str, dict] = {}
+        self._exact: Dict[str, int] = {}
+        self._phonetic: Dict[str, int] = {}
+        self._keys: List[tuple] = []  # (compact_key, item index) for substring scan
+        self._trie: dict = {}
+        self._bigram_index = defaultdict(set)
+        self._phonetic_keys: List[tuple] = []
+        self._cache: "OrderedDict[str, Optional[MenuMatch]]" = OrderedDict()
+
+        for idx, item in enumerate(menu_data):
+            self.by_id[item["id"]] = item
+            for name in [item["name"], *item.get("aliases", [])]:
+                self._add_name(name, idx)
+
+    def _add_name(self, name: str, idx: int):
+        key = compact_key(name)
+        self._exact.setdefault(key, idx)
+        self._keys.append((key, idx))
+
+        node = self._trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+            # None เก็บเมนูลำดับแรกสุดที่มี prefix นี้
+            node[None] = min(node.get(None, idx), idx)
+
+        pkey = phonetic_key(name)
+        self._phonetic.setdefault(pkey, idx)
+        slot = len(self._phonetic_keys)
+        self._phonetic_keys.append((pkey, idx))
+        for bg in _bigrams(pkey):
+            self._bigram_index[bg].add(slot)
+
+    def get(self, item_id: str) -> Optional[dict]:
+        return self.by_id.get(item_id)
+
+    def resolve(self, item_id: Optional[str] = None, name: Optional[str] = None) -> Optional[MenuMatch]:
+        # โปรโตคอลแบบ id ไม่ต้อง fuzzy match เลย ชื่อใช้เป็นทางสำรองเท่านั้น
+        item = self.by_id.get(item_id) if item_id else None
+        if item is not None:
+            return MenuMatch(id=item["id"], name=item["name"], price=item["price"], method="id")
+        return self.lookup(name)
+
+    def lookup(self, name: Optional[str]) -> Optional[MenuMatch]:
+        if not name:
+            return None
+        key = compact_key(name)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        match = self._resolve(key, name)
+        self._cache[key] = match
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return match
+
+    def _match(self, idx: int, score: float, method: str) -> MenuMatch:
+        item = self.items[idx]
+        return MenuMatch(id=item["id"], name=item["name"], price=item["price"], score=score, method=method)
+
+    def _resolve(self, key: str, raw: str) -> Optional[MenuMatch]:
+        if not key:
+            return None
+        idx = self._exact.get(key)
+        if idx is not None:
+            return self._match(idx, 1.0, "exact")
+
+        node = self._trie
+        for ch in key:
+            node = node.get(ch)
+            if node is None:
+                break
+        else:
+            return self._match(node[None], 0.95, "prefix")
+
+        for menu_key, idx in self._keys:
+            if key in menu_key:
+                return self._match(idx, 0.9, "substring")
+
+        return self._fuzzy(phonetic_key(raw))
+
+    def _fuzzy(self, pkey: str) -> Optional[MenuMatch]:
+        if not pkey:
+            return None
+        idx = self._phonetic.get(pkey)
+        if idx is not None:
+            return self._match(idx, 0.9, "phonetic")
+
+        overlap = defaultdict(int)
+        for bg in _bigrams(pkey):
+            for slot in self._bigram_index.get(bg, ()):
+                overlap[slot] += 1
+        if not overlap:
+            return None
+
+        limit = max(1, int(len(pkey) * self.fuzzy_ratio))
+        best = None
+        candidates = sorted(overlap, key=lambda s: (-overlap[s], self._phonetic_keys[s][1]))[:16]
+        for slot in candidates:
+            menu_key, idx = self._phonetic_keys[slot]
+            dist = _edit_distance(pkey, menu_key, limit)
+            if dist <= limit and (best is None or (dist, idx) < best[:2]):
+                best = (dist, idx, menu_key)
+        if best is None:
+            return None
+        dist, idx, menu_key = best
+        score = 1 - dist / max(len(pkey), len(menu_key))
+        return self._match(idx, round(score, 3), "fuzzy")
@@ -1,12 +1,87 @@
-from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, Iterator, Optional
+
 
-@dataclass
 class OrderItem:
-    name: str
-    qty: int = 1
-    price: Optional[float] = None
-    note: Optional[str] = None
+    # หนึ่งบรรทัดในตะกร้า (__slots__ ไม่มี __dict__ ต่อ object)
+    __slots__ = ("name", "qty", "price", "note", "item_id")
+
+    def __init__(self, name: str, qty: int = 1, price: Optional[float] = None, note: Optional[str] = None,
+                 item_id: Optional[str] = None):
+        self.name = name
+        self.qty = qty
+        self.price = price
+        self.note = note
+        self.item_id = item_id or name
 
     def total(self) -> float:
-        return (self.price or 0) * self.qty
\ No newline at end of file
+        return (self.price or 0) * self.qty
+
+    def __eq__(self, other):
+        if not isinstance(other, OrderItem):
+            return NotImplemented
+        return (self.item_id, self.name, self.qty, self.price, self.note) == \
+            (other.item_id, other.name, other.qty, other.price, other.note)
+
+    def __repr__(self):
+        return f"OrderItem(name={self.name!r}, qty={self.qty}, price={self.price}, note={self.note!r}, item_id={self.item_id!r})"
+
+
+class Cart:
+    """Order lines keyed by menu id: adding an item again merges the quantity into its line.
+
+    ``total`` and ``quantity`` are kept up to date on every change, so reading them is O(1).
+    Iterating yields ``OrderItem`` lines in the order they were first added.
+    """
+
+    __slots__ = ("lines", "total", "quantity")
+
+    def __init__(self):
+        self.lines: Dict[str, OrderItem] = {}
+        self.total = 0.0
+        self.quantity = 0
+
+    def add(self, item_id: str, name: str, qty: int, price: Optional[float], note: Optional[str] = None) -> OrderItem:
+        line = self.lines.get(item_id)
+        if line is None:
+            line = self.lines[item_id] = OrderItem(name, 0, price, note, item_id)
+        elif note:
+            line.note = note
+        self._change(line, qty)
+        return line
+
+    def set_qty(self, item_id: str, name: str, qty: int, price: Optional[float]) -> Optional[OrderItem]:
+        # qty เป็นจำนวนใหม่ทั้งหมดของบรรทัดนั้น, 0 = เอาออก
+        if qty <= 0:
+            self.remove(item_id)
+            return None
+        line = self.lines.get(item_id)
+        if line is None:
+            return self.add(item_id, name, qty, price)
+        self._change(line, qty - line.qty)
+        return line
+
+    def remove(self, item_id: str) -> Optional[OrderItem]:
+        line = self.lines.pop(item_id, None)
+        if line is not None:
+            self.total -= line.total()
+            self.quantity -= line.qty
+        return line
+
+    def clear(self):
+        self.lines.clear()
+        self.total = 0.0
+        self.quantity = 0
+
+    def _change(self, line: OrderItem, delta: int):
+        line.qty += delta
+        self.quantity += delta
+        self.total += (line.price or 0) * delta
+
+    def __iter__(self) -> Iterator[OrderItem]:
+        return iter(self.lines.values())
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __contains__(self, item_id: str):
+        return item_id in self.lines
@@ -0,0 +1,169 @@
+import bisect
+import datetime
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from app.services.order import Cart
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class PricedOrder:
+    lines: List[Tuple[str, int, float, float]]  # (name, qty, unit price, line total)
+    quantity: int
+    subtotal: float
+    discounts: List[Tuple[str, str, float]] = field(default_factory=list)  # (promo id, title, amount)
+    total: float = 0.0
+    points: int = 0
+    points_multiplier: float = 1.0
+    perks: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            "lines": [{"name": n, "qty": q, "price": p, "total": t} for n, q, p, t in self.lines],
+            "quantity": self.quantity,
+            "subtotal": self.subtotal,
+            "discounts": [{"id": i, "title": title, "amount": a} for i, title, a in self.discounts],
+            "total": self.total,
+            "points": self.points,
+            "points_multiplier": self.points_multiplier,
+            "perks": self.perks,
+        }
+
+
+class _ThresholdTable:
+    # threshold เรียงจากน้อยไปมาก คู่กับรางวัลที่ดีที่สุดของทุกกฎที่ threshold <= ค่านั้น (prefix max)
+    # ตะกร้าหนึ่งใบจึงใช้ bisect ครั้งเดียวต่อประเภท ไม่ว่าจะมีกี่กฎ
+    def __init__(self, rules: List[Tuple[float, float, dict]]):
+        rules = sorted(rules, key=lambda r: r[0])
+        self.thresholds = [threshold for threshold, _, _ in rules]
+        self.best: List[Tuple[float, dict]] = []
+        for _, reward, rule in rules:
+            if not self.best or reward > self.best[-1][0]:
+                self.best.append((reward, rule))
+            else:
+                self.best.append(self.best[-1])
+
+    def lookup(self, value: float) -> Optional[Tuple[float, dict]]:
+        i = bisect.bisect_right(self.thresholds, value)
+        return self.best[i - 1] if i else None
+
+
+class PromotionEngine:
+    """Evaluates every active promotion in ``promotions.json`` against a cart in one pass.
+
+    Rules are compiled into threshold tables once per day (``active``, ``valid_from`` and
+    ``valid_until`` decide what is live). Rules of the same type do not stack: the best
+    applicable discount and the best points multiplier win. ``min_spend`` is checked against
+    the amount paid after discounts. A met ``point_campaign`` always sets ``points_multiplier``;
+    a points count is added only when an active campaign sets ``baht_per_point`` (the base
+    earning rate). ``new_customer_offer`` perks apply when the caller says it is the customer's
+    first order.
+    """
+
+    def __init__(self, promotions: List[dict]):
+        self.promotions = promotions
+        self.baht_per_point: Optional[float] = None
+        self._compiled_for: Optional[datetime.date] = None
+        self.evaluations = 0
+
+    def _compile(self, today: datetime.date):
+        bulk, points, perks = [], [], []
+        rates = set()
+        for promo in self.promotions:
+            if not _is_active(promo, today):
+                continue
+            kind = promo.get("type")
+            cond = promo.get("condition", {})
+            if kind == "bulk_discount":
+                bulk.append((cond.get("min_quantity", 1), float(cond.get("discount_amount", 0)), promo))
+            elif kind == "point_campaign":
+                points.append((cond.get("min_spend", 0), float(cond.get("bonus_points_multiplier", 1)), promo))
+                if cond.get("baht_per_point"):
+                    rates.add(float(cond["baht_per_point"]))
+            elif kind == "new_customer_offer":
+                perks.append(promo)
+            else:
+                logger.warning(f"⚠️ Unknown promotion type {kind} ({promo.get('id')}), ignored")
+        self._bulk = _ThresholdTable(bulk)
+        self._points = _ThresholdTable(points)
+        self._new_customer = perks
+        # อัตราแต้มต้องมาจากข้อมูลโปรโมชัน ไม่มีก็บอกแค่ตัวคูณแต้ม ไม่เดาจำนวนแต้ม ถ้ากำหนดไว้หลายค่าใช้ค่าที่ให้แต้มน้อยที่สุด
+        self.baht_per_point = max(rates) if rates else None
+        if len(rates) > 1:
+            logger.warning(f"⚠️ Conflicting baht_per_point in promotions {sorted(rates)}, using {self.baht_per_point:g}")
+        self._compiled_for = today
+        logger.info(f"🏷️ Promotions compiled for {today}: {len(bulk)} discount, {len(points)} points, {len(perks)} perk rules"
+                    f", {f'{self.baht_per_point:g} baht/point' if self.baht_per_point else 'multiplier only (no baht_per_point)'}")
+
+    def evaluate(self, order_list: list, first_order: bool = False, today: Optional[datetime.date] = None) -> PricedOrder:
+        today = today or datetime.date.today()
+        if today != self._compiled_for:
+            self._compile(today)
+        self.evaluations += 1
+
+        lines = [(item.name, item.qty, item.price or 0, item.total()) for item in order_list]
+        if isinstance(order_list, Cart):
+            quantity, subtotal = order_list.quantity, order_list.total  # ยอดที่ตะกร้าคำนวณสะสมไว้แล้ว
+        else:
+            quantity = sum(item.qty for item in order_list)
+            subtotal = float(sum(line[3] for line in lines))
+        priced = PricedOrder(lines=lines, quantity=quantity, subtotal=subtotal)
+        if not lines:
+            return priced
+
+        discount = 0.0
+        best = self._bulk.lookup(quantity)
+        if best is not None and best[0] > 0:
+            discount = min(best[0], subtotal)
+            priced.discounts.append((best[1]["id"], best[1]["title"], discount))
+        priced.total = subtotal - discount
+
+        best = self._points.lookup(priced.total)
+        if best is not None and best[0] > 1:
+            priced.points_multiplier = best[0]
+        if self.baht_per_point:
+            priced.points = int(priced.total // self.baht_per_point * priced.points_multiplier)
+
+        if first_order:
+            priced.perks = [promo["title"] for promo in self._new_customer]
+        return priced
+
+    def stats(self) -> dict:
+        return {"rules": len(self.promotions), "compiled_for": str(self._compiled_for),
+                "baht_per_point": self.baht_per_point, "evaluations": self.evaluations}
+
+
+def _is_active(promo: dict, today: datetime.date) -> bool:
+    if not promo.get("active", True):
+        return False
+    valid_from = promo.get("valid_from")
+    valid_until = promo.get("valid_until")
+    if valid_from and today < datetime.date.fromisoformat(valid_from):
+        return False
+    if valid_until and today > datetime.date.fromisoformat(valid_until):
+        return False
+    return True
+
+
+def format_baht(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:.2f}"
+
+
+def describe_total(priced: PricedOrder) -> str:
+    # ข้อความยอดเงินที่คำนวณแล้ว ใช้ทั้งคำตอบ fast path และ prompt สรุปรายการ
+    text = f"รวม {format_baht(priced.subtotal)} บาท"
+    for _, _, amount in priced.discounts:
+        text += f" ลด {format_baht(amount)} บาท"
+    if priced.discounts:
+        text += f" เหลือ {format_baht(priced.total)} บาท"
+    if priced.points:
+        bonus = f" (แต้ม {format_baht(priced.points_multiplier)} เท่า)" if priced.points_multiplier > 1 else ""
+        text += f" ได้รับ {priced.points} แต้ม{bonus}"
+    elif priced.points_multiplier > 1:
+        text += f" ได้รับแต้ม {format_baht(priced.points_multiplier)} เท่า"
+    for perk in priced.perks:
+        text += f" พร้อมสิทธิ์{perk}"
+    return text
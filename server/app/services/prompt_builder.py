@@ -1,9 +1,51 @@
+from app.services.promotions import PromotionEngine, describe_total, format_baht
+
+REPLY_INTENTS = ["add_order", "modify_order", "remove_item", "show_promotion", "confirm_order", "cancel_order", "greeting", "unknown"]
+
+
+def build_reply_schema(menu_data):
+    # response_format สำหรับ structured outputs: บังคับ id ให้อยู่ในเมนูเท่านั้น
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "kiosk_reply",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "intent": {"type": "string", "enum": REPLY_INTENTS},
+                    "items": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "id": {"type": "string", "enum": [item["id"] for item in menu_data]},
+                                "qty": {"type": "integer"},
+                            },
+                            "required": ["id", "qty"],
+                            "additionalProperties": False,
+                        },
+                    },
+                    "response": {"type": "string"},
+                },
+                "required": ["intent", "items", "response"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
 class PromptBuilder:
-    def __init__(self, menu_data, promotions):
+    def __init__(self, menu_data, promotions, compact=False, pricing=None):
         self.menu_data = menu_data
         self.promotions = promotions
+        self.compact = compact
+        self.pricing = pricing or PromotionEngine(promotions)
 
     def build_init_prompt(self):
+        if self.compact:
+            return self.build_compact_init_prompt()
+
         menu_text = "\n".join([
             f"- {item['name']} ({item['price']} บาท)"
             for item in self.menu_data
@@ -33,6 +75,15 @@ class PromptBuilder:
   "response": "<speak>รับโกโก้เย็น 1 แก้วนะคะ</speak>"
 }}
 
+หากผู้ใช้ขอเปลี่ยนจำนวนของที่สั่งไปแล้ว ให้ใช้ intent "modify_order" และ qty คือจำนวนใหม่ทั้งหมด (0 = เอาออก)
+หากผู้ใช้ขอยกเลิกเฉพาะบางรายการ ให้ใช้ intent "remove_item" เช่น
+
+{{
+  "intent": "remove_item",
+  "item": {{ "name": "โกโก้เย็น" }},
+  "response": "<speak>เอาโกโก้เย็นออกให้แล้วค่ะ</speak>"
+}}
+
 หากผู้ใช้ถามถึงโปรโมชั่น ให้ตอบดังนี้:
 
 {{
@@ -44,27 +95,46 @@ class PromptBuilder:
 """
         return prompt.strip()
 
-    def build_user_prompt(self, user_text):
-        return user_text.strip()
+    def build_compact_init_prompt(self):
+        # ตาราง id|ชื่อ|ราคา แทนรายการบรรยาย และให้ตอบกลับเป็น id แทนชื่อเมนูภาษาไทย
+        menu_text = "\n".join(f"{item['id']}|{item['name']}|{item['price']}" for item in self.menu_data)
+        promo_text = "\n".join(f"- {promo['title']}" for promo in self.promotions)
 
-    def build_order_summary_prompt(self, order_list):
-        summary_lines = []
-        total = 0
-        for item in order_list:
-            name = item.name
-            qty = item.qty
-            price = item.price or 0
-            subtotal = qty * price
-            total += subtotal
-            summary_lines.append(f"- {name} {qty} แก้ว (รวม {subtotal} บาท)")
+        prompt = f"""
+คุณคือผู้ช่วย AI ของร้านกาแฟ พูดสุภาพ ตอบเป็น JSON เท่านั้น
+เมนู (id|ชื่อ|ราคา):
+{menu_text}
+โปรโมชั่น:
+{promo_text}
+รูปแบบ: {{"intent":"add_order","items":[{{"id":"M002","qty":1}}],"response":"<speak>รับลาเต้เย็น 1 แก้วนะคะ</speak>"}}
+intent: {"|".join(REPLY_INTENTS)}
+items ใช้ id จากตารางเมนูเท่านั้น (ไม่สั่งให้เป็น []) response คือ SSML ที่พูดกับลูกค้า
+add_order = เพิ่มจำนวน, modify_order = qty คือจำนวนใหม่ทั้งหมด (0 = เอาออก), remove_item = เอารายการออก
+"""
+        return prompt.strip()
 
-        summary_text = "\n".join(summary_lines)
+    def build_user_prompt(self, user_text, cart=None):
+        # แนบตะกร้าปัจจุบันสั้นๆ ให้ LLM แก้/ลบรายการได้ถูกบรรทัด
+        if not cart:
+            return user_text.strip()
+        if self.compact:
+            lines = ",".join(f"{item.item_id}x{item.qty}" for item in cart)
+        else:
+            lines = ", ".join(f"{item.name} {item.qty}" for item in cart)
+        return f"[ตะกร้า: {lines}]\n{user_text.strip()}"
+
+    def build_order_summary_prompt(self, order_list, first_order=False):
+        # ยอดเงิน ส่วนลด แต้ม และสิทธิ์ลูกค้าใหม่คำนวณที่นี่ทั้งหมด LLM แค่เรียบเรียงคำพูด ไม่ต้องคิดเลขเอง
+        priced = self.pricing.evaluate(order_list, first_order=first_order)
+        summary_text = "\n".join(
+            f"- {name} {qty} แก้ว (รวม {format_baht(line_total)} บาท)" for name, qty, _, line_total in priced.lines
+        )
 
         prompt = f"""
 ลูกค้าสั่ง:
 {summary_text}
 
-รวมทั้งหมด {total} บาท
+ยอดที่คำนวณแล้ว (ใช้ตัวเลขนี้ตามเดิม ห้ามคำนวณใหม่): {describe_total(priced)}
 
 กรุณาช่วยสรุปรายการทั้งหมดอย่างสุภาพในรูปแบบ SSML และสอบถามเพื่อยืนยันก่อนดำเนินการต่อ
 ตอบเป็น JSON ดังตัวอย่าง:
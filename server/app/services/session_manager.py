@@ -1,58 +1,518 @@
-from collections import defaultdict
+import asyncio
+import hashlib
+import json
+import struct
+import sys
+import time
+import zlib
+from collections import OrderedDict
 from app.utils.logger import get_logger
-from app.services.order import OrderItem
-from typing import List, Dict, Optional
-from app.services.gpt_client import ask_gpt
+from app.utils.tokenizer import count_message_tokens
+from app.utils.metrics import STAGE_SECONDS
+from app.services.order import Cart, OrderItem
+from typing import List, Dict, Optional, Tuple
+from app.services.gpt_client import ask_gpt_async
+from app.services.session_store import MemoryStore, SessionStore
 
 logger = get_logger(__name__)
 
+# ขนาดโดยประมาณของบรรทัดในตะกร้าหนึ่งบรรทัด (OrderItem แบบ __slots__ + key)
+_ORDER_ITEM_BYTES = 120
+
+SUMMARY_INSTRUCTION = "กรุณาสรุปสาระสำคัญของบทสนทนาให้กระชับในรูปแบบที่ GPT สามารถเข้าใจและตอบต่อได้ โดยไม่ต้องอธิบายบริบทเพิ่มเติม"
+SUMMARY_PREFIX = "สรุปบทสนทนาก่อนหน้า: "
+
+SESSION_KEY = "session:"
+MEMBER_KEY = "member:"
+PROMPT_KEY = "prompt:"
+SESSION_FORMAT = 4  # 1 = order lines ไม่มี menu id, 2-3 = ไม่มี member id
+_ROLE_CODES = {"user": "u", "assistant": "a", "system": "s"}
+_ROLES = {code: role for role, code in _ROLE_CODES.items()}
+_COMPRESS_ABOVE = 1024
+# 1 byte ("j" = JSON, "z" = zlib JSON) + version: ตรวจว่า cache ยังใหม่อยู่ได้โดยไม่ต้อง decode ทั้งก้อน
+_HEADER = struct.Struct(">cI")
+
+
+class Session:
+    # ข้อความเก็บเป็น tuple (role, content, tokens) แทน dict เพื่อลด overhead ต่อ message
+    __slots__ = (
+        "pinned", "summary", "summary_tokens", "messages", "base_seq", "history_tokens", "summarizer",
+        "cart", "created_at", "last_active", "nbytes", "version", "prompt_digest",
+        "turns", "raw_tokens", "prompt_tokens_sent", "prompt_tokens_baseline", "summary_tokens_spent",
+        "member_id", "order_counted",
+    )
+
+    def __init__(self, system_prompt: str, pinned_tokens: Optional[int] = None):
+        now = time.monotonic()
+        if pinned_tokens is None:
+            pinned_tokens = count_message_tokens(system_prompt)
+        # system/menu prompt ถูก pin ไว้เสมอ ไม่ถูกสรุปทับ
+        self.pinned: Tuple[str, str, int] = ("system", system_prompt, pinned_tokens)
+        self.summary: Optional[str] = None
+        self.summary_tokens = 0
+        self.messages: List[Tuple[str, str, int]] = []
+        self.base_seq = 0  # sequence number of messages[0]
+        self.history_tokens = 0
+        self.summarizer: Optional[asyncio.Task] = None
+        self.cart = Cart()
+        self.created_at = now
+        self.last_active = now
+        self.nbytes = sys.getsizeof(system_prompt)
+        self.version = 0  # เพิ่มทุกครั้งที่บันทึกลง store ใช้ตรวจว่า worker อื่นเขียนทับไปแล้วหรือยัง
+        self.prompt_digest = hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:16]
+        self.turns = 0
+        self.raw_tokens = 0  # every message ever added, i.e. the prompt without any summarization
+        self.prompt_tokens_sent = 0
+        self.prompt_tokens_baseline = 0
+        self.summary_tokens_spent = 0
+        # สมาชิกที่ระบุตัวได้ (เบอร์โทร/รหัสสมาชิก) และออเดอร์ของ session นี้ถูกนับในประวัติสมาชิกแล้วหรือยัง
+        self.member_id: Optional[str] = None
+        self.order_counted = False
+
+    def as_messages(self) -> List[Dict[str, str]]:
+        messages = [{"role": "system", "content": self.pinned[1]}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"{SUMMARY_PREFIX}{self.summary}"})
+        messages.extend({"role": role, "content": content} for role, content, _ in self.messages)
+        return messages
+
+    def prompt_tokens(self) -> int:
+        return self.pinned[2] + self.summary_tokens + self.history_tokens
+
+    def token_stats(self) -> dict:
+        saved = self.prompt_tokens_baseline - self.prompt_tokens_sent
+        return {
+            "turns": self.turns,
+            "history_tokens": self.history_tokens,
+            "summary_tokens": self.summary_tokens,
+            "prompt_tokens_sent": self.prompt_tokens_sent,
+            "prompt_tokens_baseline": self.prompt_tokens_baseline,
+            "prompt_tokens_saved": saved,
+            "summary_tokens_spent": self.summary_tokens_spent,
+            "net_tokens_saved": saved - self.summary_tokens_spent,
+        }
+
+
+def encode_session(session: Session) -> bytes:
+    # JSON แบบ list ตามตำแหน่ง (ไม่มีชื่อ field) role เป็นตัวอักษรเดียว, บรรทัดในตะกร้าเป็น [id, name, qty, price(, note)]
+    # system prompt ไม่ถูกเก็บซ้ำทุก session แต่อ้างด้วย digest (PROMPT_KEY)
+    body = [
+        SESSION_FORMAT, session.prompt_digest, session.pinned[2],
+        session.summary, session.summary_tokens, session.base_seq,
+        [[_ROLE_CODES[role], content, tokens] for role, content, tokens in session.messages],
+        [_encode_item(item) for item in session.cart],
+        session.turns, session.raw_tokens, session.prompt_tokens_sent, session.prompt_tokens_baseline,
+        session.summary_tokens_spent, session.member_id, session.order_counted,
+    ]
+    data = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(data) > _COMPRESS_ABOVE:
+        return _HEADER.pack(b"z", session.version) + zlib.compress(data, 1)
+    return _HEADER.pack(b"j", session.version) + data
+
+
+def stored_version(data: bytes) -> int:
+    return _HEADER.unpack_from(data)[1]
+
+
+def decode_fields(data: bytes) -> list:
+    kind = data[:1]
+    body = data[_HEADER.size:]
+    fields = json.loads(zlib.decompress(body) if kind == b"z" else body)
+    if fields[0] not in (1, 2, 3, SESSION_FORMAT):
+        raise ValueError(f"unsupported session format {fields[0]}")
+    return fields
+
+
+def session_from_fields(fields: list, version: int, system_prompt: str) -> Session:
+    (session_format, digest, pinned_tokens, summary, summary_tokens, base_seq, messages, orders,
+     turns, raw_tokens, sent, baseline, spent, *member) = fields
+    session = Session(system_prompt, pinned_tokens=pinned_tokens)
+    session.version = version
+    session.prompt_digest = digest
+    session.summary = summary
+    session.summary_tokens = summary_tokens
+    session.base_seq = base_seq
+    session.messages = [(_ROLES[role], content, tokens) for role, content, tokens in messages]
+    session.history_tokens = sum(tokens for _, _, tokens in session.messages)
+    for item in orders:
+        if session_format == 1:
+            item = [item[0], *item]  # ไม่มี id: ใช้ชื่อเมนูเป็น key
+        session.cart.add(item[0], item[1], item[2], item[3], item[4] if len(item) > 4 else None)
+    session.turns, session.raw_tokens = turns, raw_tokens
+    session.prompt_tokens_sent, session.prompt_tokens_baseline, session.summary_tokens_spent = sent, baseline, spent
+    if session_format >= 4:
+        session.member_id, session.order_counted = member
+    session.nbytes += (sum(sys.getsizeof(content) for _, content, _ in session.messages)
+                       + (sys.getsizeof(summary) if summary else 0) + _ORDER_ITEM_BYTES * len(session.cart))
+    return session
+
+
+def _encode_item(item: OrderItem) -> list:
+    fields = [item.item_id, item.name, item.qty, item.price]
+    if item.note:
+        fields.append(item.note)
+    return fields
+
+
 class SessionManager:
-    def __init__(self, max_history=30):
-        self.sessions: Dict[str, Dict] = {}
-        self.max_history = max_history
+    def __init__(self, max_sessions=1000, idle_ttl_seconds=900,
+                 history_soft_tokens=1500, history_max_tokens=3000, history_keep_tokens=600,
+                 store: Optional[SessionStore] = None):
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()  # LRU: เก่าสุดอยู่หน้า
+        # store ที่ทุก worker ใช้ร่วมกัน (None = เก็บใน process นี้อย่างเดียว)
+        # self.sessions จึงเป็นแค่ cache ของ worker นี้ ตรวจความใหม่ด้วย version ก่อนใช้ทุก turn
+        self.store = store
+        self._members = store if store is not None else MemoryStore()  # ประวัติออเดอร์ต่อสมาชิก ไม่มีวันหมดอายุ
+        self._prompts: Dict[str, str] = {}  # digest -> system prompt (ไม่เปลี่ยน cache ได้ตลอด)
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        # งบ token ของประวัติสนทนา (ไม่รวม system prompt ที่ pin ไว้)
+        self.history_soft_tokens = history_soft_tokens
+        self.history_max_tokens = history_max_tokens
+        self.history_keep_tokens = history_keep_tokens
+        self.bytes_held = 0
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+        self.summaries = 0
+        self.tokens_saved_total = 0
+        self.summary_tokens_spent_total = 0
+        self.store_loads = 0
+        self.store_saves = 0
+        self.store_conflicts = 0
+        self.store_bytes_written = 0
+
+    def _touch(self, session_id: str) -> Session:
+        session = self.sessions[session_id]
+        session.last_active = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        return session
+
+    def _drop(self, session_id: str):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.bytes_held -= session.nbytes
+            if session.summarizer is not None:
+                session.summarizer.cancel()
+            stats = session.token_stats()
+            self.tokens_saved_total += stats["prompt_tokens_saved"]
+            self.summary_tokens_spent_total += stats["summary_tokens_spent"]
+            if session.turns:
+                logger.info(f"📉 Session {session_id} saved {stats['net_tokens_saved']} prompt tokens over {session.turns} turns")
+
+    def _forget(self, session_id: str):
+        # เอาสำเนาเก่าออกจาก cache ของ worker นี้ (ข้อมูลจริงยังอยู่ใน store)
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.bytes_held -= session.nbytes
+
+    def _add_bytes(self, session: Session, nbytes: int):
+        session.nbytes += nbytes
+        self.bytes_held += nbytes
+
+    def sweep(self):
+        # session ที่ idle นานสุดอยู่หน้าสุดเสมอ จึงหยุดได้ทันทีเมื่อเจอตัวที่ยังไม่หมดอายุ
+        deadline = time.monotonic() - self.idle_ttl_seconds
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_active > deadline:
+                break
+            self._drop(session_id)
+            self.evicted_idle += 1
+            logger.info(f"⌛ Session expired: {session_id}")
 
     def init_session(self, session_id: str, system_prompt: str):
-        self.sessions[session_id] = {
-            "messages": [{"role": "system", "content": system_prompt}],
-            "order_list": []
-        }
+        self._insert(session_id, Session(system_prompt))
         logger.info(f"🆕 Session initialized: {session_id}")
 
+    def _insert(self, session_id: str, session: Session):
+        self.sweep()
+        self._drop(session_id)
+        while len(self.sessions) >= self.max_sessions:
+            old_id, _ = next(iter(self.sessions.items()))
+            self._drop(old_id)
+            self.evicted_lru += 1
+            logger.warning(f"🧹 Session evicted (max {self.max_sessions}): {old_id}")
+        self.sessions[session_id] = session
+        self.bytes_held += session.nbytes
+
+    async def load(self, session_id: str) -> bool:
+        """Make this worker's copy of the session current; False if the session does not exist."""
+        if self.store is None:
+            return self.has_session(session_id)
+        with STAGE_SECONDS.time("session_load"):
+            data = await self.store.get(SESSION_KEY + session_id)
+            if data is None:
+                # reset หรือหมดอายุที่ worker อื่น
+                self._forget(session_id)
+                return False
+            cached = self.sessions.get(session_id)
+            if cached is not None and cached.version == stored_version(data):
+                self._touch(session_id)
+                return True
+            fields = decode_fields(data)
+            system_prompt = await self._load_prompt(fields[1])
+            if system_prompt is None:
+                logger.warning(f"⚠️ Prompt {fields[1]} missing from store, starting {session_id} over")
+                await self.store.delete(SESSION_KEY + session_id)  # ให้ session ใหม่ (version 0) บันทึกได้
+                return False
+            session = session_from_fields(fields, stored_version(data), system_prompt)
+            self._forget(session_id)
+            self._insert(session_id, session)
+            self.store_loads += 1
+        return True
+
+    async def save(self, session_id: str) -> bool:
+        """Write the session back to the shared store (no-op without a store).
+
+        The write only lands if the stored version is still the one this copy was loaded at. On
+        conflict another worker wrote first: this copy is dropped (the next ``load`` reads theirs)
+        and False is returned.
+        """
+        session = self.sessions.get(session_id)
+        if self.store is None or session is None:
+            return True
+        with STAGE_SECONDS.time("session_save"):
+            if session.prompt_digest not in self._prompts:
+                await self.store.set(PROMPT_KEY + session.prompt_digest, session.pinned[1].encode("utf-8"))
+                self._prompts[session.prompt_digest] = session.pinned[1]
+            expected = session.version
+            session.version += 1
+            data = encode_session(session)
+            saved = await self.store.set_if(
+                SESSION_KEY + session_id, data, self.idle_ttl_seconds,
+                # session ใหม่ (version 0) ต้องยังไม่มีใน store, ที่เหลือต้องตรง version ที่โหลดมา
+                lambda current: stored_version(current) == expected if current is not None else expected == 0,
+            )
+        if not saved:
+            self.store_conflicts += 1
+            if self.sessions.get(session_id) is session:
+                self._forget(session_id)
+            logger.warning(f"⚠️ Session {session_id} was written by another worker first, this write dropped")
+            return False
+        self.store_saves += 1
+        self.store_bytes_written += len(data)
+        return True
+
+    async def _load_prompt(self, digest: str) -> Optional[str]:
+        prompt = self._prompts.get(digest)
+        if prompt is None:
+            data = await self.store.get(PROMPT_KEY + digest)
+            if data is None:
+                return None
+            prompt = self._prompts[digest] = data.decode("utf-8")
+        return prompt
+
     def get_history(self, session_id: str):
-        messages = self.sessions[session_id]["messages"]
-        if len(messages) > self.max_history:
-            logger.info(f"🧠 Summarizing session: {session_id} ({len(messages)} messages)")
-            summary_prompt = [
-                {"role": "system", "content": "กรุณาสรุปสาระสำคัญของบทสนทนาให้กระชับในรูปแบบที่ GPT สามารถเข้าใจและตอบต่อได้ โดยไม่ต้องอธิบายบริบทเพิ่มเติม"},
-                *messages
-            ]
-            summary_text = ask_gpt(summary_prompt)
-            logger.info(f"📝 Summary: {summary_text[:60]}...")
-            # Replace all history with 1 summarized message
-            self.sessions[session_id]["messages"] = [
-                {"role": "system", "content": summary_text}
-            ]
-        return self.sessions[session_id]["messages"]
+        return self._touch(session_id).as_messages()
+
+    def build_prompt(self, session_id: str) -> List[Dict[str, str]]:
+        session = self._touch(session_id)
+        if session.history_tokens > self.history_max_tokens:
+            self._trim(session_id, session)
+        if session.history_tokens > self.history_soft_tokens and session.summarizer is None:
+            self._start_summary(session_id, session)
+
+        session.turns += 1
+        session.prompt_tokens_sent += session.prompt_tokens()
+        session.prompt_tokens_baseline += session.pinned[2] + session.raw_tokens
+        return session.as_messages()
+
+    def _drop_front(self, session: Session, count: int):
+        dropped = session.messages[:count]
+        del session.messages[:count]
+        session.base_seq += count
+        session.history_tokens -= sum(tokens for _, _, tokens in dropped)
+        self._add_bytes(session, -sum(sys.getsizeof(content) for _, content, _ in dropped))
+
+    def _trim(self, session_id: str, session: Session):
+        # สรุปยังไม่เสร็จแต่เกินงบแล้ว: ตัดข้อความเก่าสุดทิ้งแทนการรอ LLM
+        count = 0
+        tokens = session.history_tokens
+        while tokens > self.history_max_tokens and count < len(session.messages) - 1:
+            tokens -= session.messages[count][2]
+            count += 1
+        if count:
+            self._drop_front(session, count)
+            logger.warning(f"✂️ Trimmed {count} old messages from {session_id} (summary not ready)")
+
+    def _start_summary(self, session_id: str, session: Session):
+        # เก็บข้อความล่าสุดไว้ตามงบ keep ที่เหลือนำไปสรุป
+        kept = 0
+        keep_from = len(session.messages)
+        while keep_from > 0 and kept + session.messages[keep_from - 1][2] <= self.history_keep_tokens:
+            keep_from -= 1
+            kept += session.messages[keep_from][2]
+        keep_from = min(keep_from, len(session.messages) - 1)
+        # ให้ส่วนที่เก็บไว้เริ่มที่ข้อความของลูกค้า ไม่ใช่คำตอบที่ขาดคำถาม
+        while keep_from < len(session.messages) - 1 and session.messages[keep_from][0] != "user":
+            keep_from += 1
+        if keep_from <= 0:
+            return
+
+        to_fold = session.messages[:keep_from]
+        last_seq = session.base_seq + keep_from - 1
+        logger.info(f"🧠 Summarizing session in background: {session_id} ({len(to_fold)} messages)")
+        session.summarizer = asyncio.create_task(
+            self._summarize(session_id, session, session.summary, to_fold, last_seq)
+        )
+
+    async def _summarize(self, session_id: str, session: Session, previous: Optional[str], to_fold: list, last_seq: int):
+        prompt = [{"role": "system", "content": SUMMARY_INSTRUCTION}]
+        if previous:
+            prompt.append({"role": "system", "content": f"{SUMMARY_PREFIX}{previous}"})
+        prompt.extend({"role": role, "content": content} for role, content, _ in to_fold)
+        try:
+            with STAGE_SECONDS.time("summarize"):
+                summary_text = await ask_gpt_async(prompt)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Background summary failed for {session_id}: {e}")
+            return
+        finally:
+            session.summarizer = None
+
+        if self.sessions.get(session_id) is not session:
+            return  # session ถูก reset/evict ระหว่างสรุป
+
+        # ข้อความที่ถูกสรุปแล้วอาจถูก trim ไปบางส่วนระหว่างรอ
+        self._drop_front(session, max(0, last_seq + 1 - session.base_seq))
+        old_summary = session.summary or ""
+        session.summary = summary_text
+        session.summary_tokens = count_message_tokens(f"{SUMMARY_PREFIX}{summary_text}")
+        session.summary_tokens_spent += sum(count_message_tokens(m["content"]) for m in prompt)
+        self._add_bytes(session, sys.getsizeof(summary_text) - sys.getsizeof(old_summary))
+        self.summaries += 1
+        logger.info(f"📝 Summary for {session_id} ({session.summary_tokens} tokens): {summary_text[:60]}...")
+        # worker อื่นเขียน turn ใหม่ไปแล้ว: save ไม่ทับ ทิ้งสรุปนี้ (รอบหน้าสรุปใหม่จากข้อมูลล่าสุด)
+        if not await self.save(session_id):
+            logger.info(f"📝 Session {session_id} moved on in another worker, summary discarded")
+
+    def _append(self, session_id: str, role: str, text: str):
+        session = self._touch(session_id)
+        tokens = count_message_tokens(text)
+        session.messages.append((role, text, tokens))
+        session.history_tokens += tokens
+        session.raw_tokens += tokens
+        self._add_bytes(session, sys.getsizeof(text))
 
     def add_user_message(self, session_id: str, text: str):
-        self.sessions[session_id]["messages"].append({"role": "user", "content": text})
+        self._append(session_id, "user", text)
 
     def add_assistant_reply(self, session_id: str, text: str):
-        self.sessions[session_id]["messages"].append({"role": "assistant", "content": text})
+        self._append(session_id, "assistant", text)
 
-    def reset_session(self, session_id: str):
+    async def reset_session(self, session_id: str):
         logger.info(f"🔄 Resetting session: {session_id}")
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        self._drop(session_id)
+        if self.store is not None:
+            await self.store.delete(SESSION_KEY + session_id)
 
     def has_session(self, session_id: str) -> bool:
+        self.sweep()
         return session_id in self.sessions
 
-    def get_order_list(self, session_id: str) -> List[OrderItem]:
-        return self.sessions[session_id].get("order_list", [])
+    def get_cart(self, session_id: str) -> Cart:
+        return self._touch(session_id).cart
+
+    def add_to_cart(self, session_id: str, item_id: str, name: str, qty: int, price: Optional[float]) -> OrderItem:
+        session = self._touch(session_id)
+        lines = len(session.cart)
+        line = session.cart.add(item_id, name, qty, price)
+        self._add_bytes(session, _ORDER_ITEM_BYTES * (len(session.cart) - lines))
+        return line
 
-    def add_order_item(self, session_id: str, item: OrderItem):
-        self.sessions[session_id]["order_list"].append(item)
+    def set_cart_qty(self, session_id: str, item_id: str, name: str, qty: int,
+                     price: Optional[float]) -> Optional[OrderItem]:
+        session = self._touch(session_id)
+        lines = len(session.cart)
+        line = session.cart.set_qty(item_id, name, qty, price)
+        self._add_bytes(session, _ORDER_ITEM_BYTES * (len(session.cart) - lines))
+        return line
+
+    def remove_from_cart(self, session_id: str, item_id: str) -> Optional[OrderItem]:
+        session = self._touch(session_id)
+        line = session.cart.remove(item_id)
+        if line is not None:
+            self._add_bytes(session, -_ORDER_ITEM_BYTES)
+        return line
 
     def clear_order(self, session_id: str):
-        self.sessions[session_id]["order_list"] = []
\ No newline at end of file
+        session = self._touch(session_id)
+        self._add_bytes(session, -_ORDER_ITEM_BYTES * len(session.cart))
+        session.cart.clear()
+
+    # --- ประวัติออเดอร์ของสมาชิก (สิทธิ์ลูกค้าใหม่) ---
+    # session ใหม่ไม่ได้แปลว่าลูกค้าใหม่ (ตู้ reset ทุกคน) จึงนับตามสมาชิกที่ระบุตัวได้เท่านั้น
+
+    def set_member(self, session_id: str, member_id: str):
+        session = self._touch(session_id)
+        if session.member_id != member_id:
+            session.member_id = member_id
+            session.order_counted = False
+
+    async def is_first_order(self, session_id: str) -> bool:
+        session = self._touch(session_id)
+        if not session.member_id:
+            return False  # ไม่รู้ว่าเป็นใคร ไม่ให้สิทธิ์ลูกค้าใหม่
+        try:
+            placed = int(await self._members.get(MEMBER_KEY + session.member_id) or 0)
+        except Exception as e:
+            logger.warning(f"⚠️ Member history unavailable for {session.member_id} ({e}), no new-customer offer")
+            return False
+        # ออเดอร์ของ session นี้ที่นับไปแล้ว (สรุปซ้ำ/แก้ต่อ) ยังเป็นออเดอร์แรกอยู่
+        return placed - session.order_counted == 0
+
+    async def place_order(self, session_id: str):
+        # ลูกค้าสมาชิกได้ยินยอดสรุป (confirm_order) = หนึ่งออเดอร์ในประวัติ นับครั้งเดียวต่อออเดอร์
+        session = self._touch(session_id)
+        if session.member_id and len(session.cart) and not session.order_counted:
+            if await self._add_member_order(session.member_id, 1):
+                session.order_counted = True
+
+    async def withdraw_order(self, session_id: str):
+        # ยกเลิกหลังสรุปยอดแล้ว ไม่นับเป็นออเดอร์ที่เคยสั่ง
+        session = self._touch(session_id)
+        if session.order_counted and await self._add_member_order(session.member_id, -1):
+            session.order_counted = False
+
+    def close_order(self, session_id: str):
+        # เริ่มบทสนทนาใหม่ (ทักทาย): ออเดอร์ที่สรุปไปแล้วอยู่ในประวัติ ออเดอร์ถัดไปนับแยก
+        self._touch(session_id).order_counted = False
+
+    async def _add_member_order(self, member_id: str, delta: int) -> bool:
+        key = MEMBER_KEY + member_id
+        try:
+            for _ in range(5):
+                current = await self._members.get(key)
+                placed = max(int(current or 0) + delta, 0)
+                if await self._members.set_if(key, str(placed).encode(), None, lambda value: value == current):
+                    return True
+        except Exception as e:
+            logger.warning(f"⚠️ Member history not updated for {member_id} ({e})")
+            return False
+        logger.warning(f"⚠️ Member history for {member_id} kept changing, not updated")
+        return False
+
+    def token_stats(self, session_id: str) -> dict:
+        return self.sessions[session_id].token_stats()
+
+    def stats(self) -> dict:
+        live_saved = sum(s.prompt_tokens_baseline - s.prompt_tokens_sent for s in self.sessions.values())
+        live_spent = sum(s.summary_tokens_spent for s in self.sessions.values())
+        return {
+            "live_sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "bytes_held": self.bytes_held,
+            "evicted_idle": self.evicted_idle,
+            "evicted_lru": self.evicted_lru,
+            "summaries": self.summaries,
+            "prompt_tokens_saved": self.tokens_saved_total + live_saved,
+            "summary_tokens_spent": self.summary_tokens_spent_total + live_spent,
+            "store": self.store.name if self.store is not None else None,
+            "store_loads": self.store_loads,
+            "store_saves": self.store_saves,
+            "store_conflicts": self.store_conflicts,
+            "store_bytes_written": self.store_bytes_written,
+        }
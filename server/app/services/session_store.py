@@ -0,0 +1,339 @@
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SessionStore:
+    """Byte-valued key/value store with per-key TTL, shared by every uvicorn worker.
+
+    Sessions live under ``session:<id>`` and /speak ids under ``tts:<id>``. Expiry uses wall-clock
+    time so entries survive a restart with their remaining lifetime.
+    """
+
+    name = "base"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        raise NotImplementedError
+
+    async def set_if(self, key: str, value: bytes, ttl_seconds: Optional[float],
+                     check: Callable[[Optional[bytes]], bool]) -> bool:
+        """Write only if ``check(current value)`` holds, atomically against other workers; False on conflict."""
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def count(self, prefix: str) -> int:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryStore(SessionStore):
+    # ภายใน process เดียว (พฤติกรรมเดิม) ใช้ได้กับ uvicorn worker เดียวเท่านั้น
+    name = "memory"
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+
+    async def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key, value, ttl_seconds=None):
+        self._data[key] = (value, time.time() + ttl_seconds if ttl_seconds else None)
+
+    async def set_if(self, key, value, ttl_seconds, check):
+        if not check(await self.get(key)):
+            return False
+        await self.set(key, value, ttl_seconds)
+        return True
+
+    async def delete(self, key):
+        self._data.pop(key, None)
+
+    async def count(self, prefix):
+        now = time.time()
+        return sum(1 for k, (_, exp) in self._data.items() if k.startswith(prefix) and (exp is None or exp > now))
+
+
+class SQLiteStore(SessionStore):
+    """One SQLite file in WAL mode: readers never block the writer, workers on one host share it.
+
+    Queries run on a single dedicated thread per worker, off the event loop: a write waiting on
+    another worker's lock (up to the 5 s busy timeout) stalls only the store, not every request.
+    Expired rows are filtered on read and purged every ``purge_every`` writes.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, purge_every: int = 500):
+        self.path = path
+        self.purge_every = purge_every
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._writes = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # เรียกจาก thread ของ store เท่านั้น connection เปิดใน worker เอง (หลัง fork) ไม่แชร์ข้าม process
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at)")
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, fn, *args):
+        if self._executor is None or self._pid != os.getpid():
+            self._conn = None
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-store")
+            self._pid = os.getpid()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _get(self, key):
+        row = self._db().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key, value, ttl_seconds):
+        db = self._db()
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        db.execute("INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            purged = db.execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),)).rowcount
+            if purged:
+                logger.info(f"🧹 Purged {purged} expired rows from {self.path}")
+
+    def _set_if(self, key, value, ttl_seconds, check):
+        # BEGIN IMMEDIATE ถือ write lock ตั้งแต่อ่าน worker อื่นเขียนแทรกระหว่างตรวจกับเขียนไม่ได้
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if not check(self._get(key)):
+                db.execute("ROLLBACK")
+                return False
+            self._set(key, value, ttl_seconds)
+            db.execute("COMMIT")
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        return True
+
+    def _delete(self, key):
+        self._db().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def _count(self, prefix):
+        row = self._db().execute(
+            "SELECT COUNT(*) FROM kv WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)",
+            (prefix, prefix + "\uffff", time.time()),
+        ).fetchone()
+        return row[0]
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def get(self, key):
+        return await self._run(self._get, key)
+
+    async def set(self, key, value, ttl_seconds=None):
+        await self._run(self._set, key, value, ttl_seconds)
+
+    async def set_if(self, key, value, ttl_seconds, check):
+        return await self._run(self._set_if, key, value, ttl_seconds, check)
+
+    async def delete(self, key):
+        await self._run(self._delete, key)
+
+    async def count(self, prefix):
+        return await self._run(self._count, prefix)
+
+    async def close(self):
+        if self._executor is not None and self._pid == os.getpid():
+            await self._run(self._close)
+            self._executor.shutdown(wait=False)
+        self._executor = None
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisStore(SessionStore):
+    """Minimal RESP2 client over asyncio streams (GET/SET PX/DEL/SCAN, WATCH/MULTI/EXEC) with a small connection pool."""
+
+    name = "redis"
+
+    def __init__(self, url: str, pool_size: int = 8, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self._pool_size = pool_size
+        self._slots: Optional[asyncio.Semaphore] = None  # ใบอนุญาตต่อ connection ที่ใช้อยู่/เปิดได้
+        self._idle: list = []  # connection ว่าง (LIFO)
+
+    async def _connect(self):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        conn = (reader, writer)
+        if self.password:
+            await self._call(conn, "AUTH", self.password)
+        if self.db:
+            await self._call(conn, "SELECT", str(self.db))
+        return conn
+
+    async def execute(self, *args: str):
+        return await self._using(lambda conn: self._call(conn, *args))
+
+    async def _using(self, work):
+        # งานหลายคำสั่งบน connection เดียว (WATCH/MULTI ต้องอยู่ connection เดียวกัน)
+        # ใบอนุญาตคืนทุกทาง (สำเร็จ/ล้มเหลว/cancel) งานที่รออยู่จึงได้ connection ใหม่เสมอ ไม่ค้างรอ connection ที่ถูกทิ้ง
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._pool_size)
+        await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        try:
+            conn = self._idle.pop() if self._idle else await self._connect()
+            try:
+                result = await asyncio.wait_for(work(conn), self.timeout)
+            except RedisError:
+                # Redis ตอบ -ERR ครบทั้งคำตอบแล้ว connection ยังใช้ต่อได้
+                self._idle.append(conn)
+                raise
+            except BaseException:
+                # I/O error, timeout หรือ cancel: อาจค้างกลางคำตอบ ทิ้งไปแล้วเปิดใหม่ครั้งหน้า
+                conn[1].close()
+                raise
+            self._idle.append(conn)
+            return result
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    async def _call(conn, *args):
+        reader, writer = conn
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        writer.write(b"".join(parts))
+        await writer.drain()
+        return await _read_reply(reader)
+
+    async def get(self, key):
+        return await self.execute("GET", key)
+
+    async def set(self, key, value, ttl_seconds=None):
+        if ttl_seconds:
+            await self.execute("SET", key, value, "PX", str(int(ttl_seconds * 1000)))
+        else:
+            await self.execute("SET", key, value)
+
+    async def set_if(self, key, value, ttl_seconds, check):
+        async def transaction(conn):
+            in_multi = False
+            try:
+                await self._call(conn, "WATCH", key)
+                if not check(await self._call(conn, "GET", key)):
+                    await self._call(conn, "UNWATCH")
+                    return False
+                await self._call(conn, "MULTI")
+                in_multi = True
+                if ttl_seconds:
+                    await self._call(conn, "SET", key, value, "PX", str(int(ttl_seconds * 1000)))
+                else:
+                    await self._call(conn, "SET", key, value)
+                in_multi = False
+                replies = await self._call(conn, "EXEC")
+            except RedisError:
+                # -ERR: ล้าง WATCH/MULTI ที่ค้าง ให้ connection กลับเข้า pool ได้สะอาด
+                await self._call(conn, "DISCARD" if in_multi else "UNWATCH")
+                raise
+            if replies is None:
+                return False  # nil = key ถูกเขียนหลัง WATCH
+            for reply in replies:
+                if isinstance(reply, RedisError):
+                    raise reply
+            return True
+
+        return await self._using(transaction)
+
+    async def delete(self, key):
+        await self.execute("DEL", key)
+
+    async def count(self, prefix):
+        cursor, total = b"0", 0
+        while True:
+            cursor, keys = await self.execute("SCAN", cursor, "MATCH", f"{prefix}*", "COUNT", "1000")
+            total += len(keys)
+            if cursor == b"0":
+                return total
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+async def _read_reply(reader: asyncio.StreamReader, nested: bool = False):
+    # error ที่อยู่ใน array (เช่นผลของ EXEC) คืนเป็นค่า ไม่ raise กลางทาง ไม่งั้นสมาชิกที่เหลือค้างใน socket
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("redis connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest
+    if kind == b"-":
+        if nested:
+            return RedisError(rest.decode())
+        raise RedisError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        size = int(rest)
+        if size < 0:
+            return None
+        data = await reader.readexactly(size + 2)
+        return data[:-2]
+    if kind == b"*":
+        size = int(rest)
+        if size < 0:
+            return None
+        return [await _read_reply(reader, nested=True) for _ in range(size)]
+    raise RedisError(f"unexpected reply {line!r}")
+
+
+def create_session_store(backend: str, db_path: str = "", redis_url: str = "") -> SessionStore:
+    if backend == "sqlite":
+        return SQLiteStore(db_path)
+    if backend == "redis":
+        return RedisStore(redis_url)
+    if backend == "memory":
+        return MemoryStore()
+    raise NotImplementedError(f"Session backend '{backend}' is not supported.")
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+from app.utils.logger import get_logger
+from app.utils.metrics import STAGE_SECONDS
+
+logger = get_logger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_TAG_SPACE = re.compile(r">\s+<")
+
+
+def normalize_ssml(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text.strip())
+    text = _WHITESPACE.sub(" ", text)
+    return _TAG_SPACE.sub("><", text)
+
+
+class TTSCache:
+    """Content-addressed TTS audio cache (memory + disk) with byte-budget LRU eviction.
+
+    The cache key doubles as the ``tts_id`` so identical replies reuse the same file.
+    Every uvicorn worker keeps its own index of one shared ``cache_dir``, so the directory is the
+    source of truth: a hit is only served if the file is still there, a file written by another
+    worker is adopted instead of re-synthesized, and use refreshes the file's mtime. Eviction
+    skips files any worker used within ``min_age_seconds``, so a reply another worker just
+    handed out is not deleted before its ``/speak``.
+    """
+
+    def __init__(self, cache_dir: str, max_disk_bytes: int, max_memory_bytes: int, voice_config: str,
+                 min_age_seconds: float = 120):
+        self.cache_dir = cache_dir
+        self.min_age_seconds = min_age_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.voice_config = voice_config
+
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # key -> size, LRU order
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._disk_bytes = 0
+        self._memory_bytes = 0
+        self._inflight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        files = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(".mp3"):
+                path = os.path.join(self.cache_dir, filename)
+                st = os.stat(path)
+                files.append((st.st_mtime, filename[:-4], st.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+        if files:
+            logger.info(f"🗂️ TTS cache loaded {len(self._disk)} files ({self._disk_bytes} bytes)")
+
+    def make_key(self, text: str, voice: Optional[str] = None) -> str:
+        raw = f"{voice or self.voice_config}\x00{normalize_ssml(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+        return audio
+
+    def contains(self, key: str) -> bool:
+        return key in self._disk or os.path.exists(self.path_for(key))
+
+    def _lookup(self, key: str, path: str) -> bool:
+        # แตะ mtime = บอก worker อื่นว่าเพิ่งใช้ (LRU ร่วมกันผ่าน filesystem) และเช็กว่าไฟล์ยังอยู่ในคราวเดียว
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            size = self._disk.pop(key, None)
+            if size is not None:
+                self._disk_bytes -= size  # worker อื่น evict ไปแล้ว
+                self._drop_memory(key)
+            return False
+        if key in self._disk:
+            self._disk.move_to_end(key)
+        else:
+            # worker อื่นสังเคราะห์ไว้แล้ว รับเข้า index ของ worker นี้
+            self._index(key, os.path.getsize(path))
+        return True
+
+    async def get_or_create(self, text: str, synthesize: Callable[[str], Awaitable[bytes]]) -> Tuple[str, str]:
+        key = self.make_key(text)
+        path = self.path_for(key)
+
+        if self._lookup(key, path):
+            self.hits += 1
+            logger.info(f"🎯 TTS cache hit: {key}")
+            return key, path
+
+        # อีก request กำลังสังเคราะห์ข้อความเดียวกันอยู่ -> รอผลเดียวกัน
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await pending
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        pending_key = key
+        try:
+            audio = await synthesize(text)
+            voice = getattr(audio, "voice", None)
+            if voice is not None:
+                # hedge ได้เสียงจาก provider อื่น (คนละเสียง): เก็บแยก key ครั้งหน้าจะสังเคราะห์เสียงหลักใหม่
+                key = self.make_key(text, voice)
+                path = self.path_for(key)
+            with STAGE_SECONDS.time("file_write"):
+                await asyncio.to_thread(_write_file, path, audio)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; avoid "never retrieved" warning
+            raise
+        finally:
+            del self._inflight[pending_key]
+
+        self._put(key, audio)
+        future.set_result((key, path))
+        return key, path
+
+    async def get_or_create_audio(self, text: str, synthesize: Callable[[str], Awaitable[bytes]]) -> bytes:
+        key, path = await self.get_or_create(text, synthesize)
+        audio = self.get_bytes(key)
+        if audio is None:
+            try:
+                audio = await asyncio.to_thread(_read_file, path)
+            except FileNotFoundError:
+                # ถูก evict ระหว่างทาง (เกินงบและเก่ากว่า min_age) สังเคราะห์ใหม่
+                audio = await synthesize(text)
+        return audio
+
+    def _put(self, key: str, audio: bytes):
+        size = len(audio)
+        self._index(key, size)
+        if size > self.max_disk_bytes:
+            logger.warning(f"⚠️ TTS audio {key} ({size} bytes) is larger than the whole cache budget")
+
+        if size <= self.max_memory_bytes:
+            self._memory[key] = audio
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, old = self._memory.popitem(last=False)
+                self._memory_bytes -= len(old)
+
+    def _index(self, key: str, size: int):
+        # evict รายการที่เก่ากว่าก่อนแล้วค่อยใส่ ไฟล์ที่เพิ่งเขียนไม่ถูกลบทิ้งทันทีแม้ใหญ่เกินงบทั้งก้อน
+        # (path ที่คืนไปให้ /speak ต้องยังอยู่) มันจะถูก evict ตอนใส่รายการถัด ๆ ไป
+        old_size = self._disk.pop(key, None)
+        if old_size is not None:
+            self._disk_bytes -= old_size
+        self._evict_disk(incoming=size)
+        self._disk[key] = size
+        self._disk_bytes += size
+
+    def _drop_memory(self, key: str):
+        audio = self._memory.pop(key, None)
+        if audio is not None:
+            self._memory_bytes -= len(audio)
+
+    def _evict_disk(self, incoming: int = 0):
+        recent_cutoff = time.time() - self.min_age_seconds
+        spared = 0
+        while self._disk_bytes + incoming > self.max_disk_bytes and len(self._disk) > spared:
+            key, size = self._disk.popitem(last=False)
+            path = self.path_for(key)
+            try:
+                if os.path.getmtime(path) > recent_cutoff:
+                    # worker อื่น (หรือ worker นี้) เพิ่งใช้ ไฟล์อาจรอ /speak อยู่ ย้ายไปท้าย LRU แทน
+                    self._disk[key] = size
+                    spared += 1
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._disk_bytes -= size
+            self._drop_memory(key)
+            self.evictions += 1
+            logger.debug(f"🧹 TTS cache evicted: {key}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "max_disk_bytes": self.max_disk_bytes,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+        }
+
+
+def _write_file(path: str, data: bytes):
+    # เขียนไฟล์ชั่วคราวแล้ว rename: worker อื่นไม่มีทางเห็นไฟล์ที่เขียนไม่ครบ
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as out:
+        out.write(data)
+    os.replace(tmp, path)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
@@ -1,42 +1,82 @@
-from google.cloud import texttospeech
-from app.config import TTS_PROVIDER, GOOGLE_CLOUD_TTS_CREDENTIALS_PATH
+from app.config import (
+    TTS_PROVIDER, GOOGLE_CLOUD_TTS_CREDENTIALS_PATH, GOOGLE_TTS_API_KEY, GOOGLE_TTS_ENDPOINT,
+    TTS_MAX_CONCURRENCY, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_TIMEOUT_SECONDS,
+    TTS_SECONDARY_PROVIDER, TTS_SECONDARY_ENDPOINT, TTS_HEDGE_AFTER_MS, TTS_OFFLINE_COMMAND,
+    TTS_RATE_LIMIT_RPM, RATE_LIMIT_BURST_SECONDS,
+)
+from app.services.admission import budget_from_rpm
+from app.services.tts_providers import (
+    GoogleGrpcProvider, GoogleRestProvider, HedgedTTS, OfflineProvider, TTSProvider,
+)
 from app.utils.logger import get_logger
-import os
+from app.utils.metrics import STAGE_SECONDS
+import asyncio
+import httpx
 
 logger = get_logger(__name__)
 
-def generate_tts(text: str, output_path: str):
-    if TTS_PROVIDER == "GoogleCloudTTS":
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = GOOGLE_CLOUD_TTS_CREDENTIALS_PATH
-
-        client = texttospeech.TextToSpeechClient()
-
-        # ตรวจว่าเป็น SSML หรือไม่
-        if text.strip().startswith("<speak>"):
-            synthesis_input = texttospeech.SynthesisInput(ssml=text)
-            logger.info("🔤 Using SSML input")
-        else:
-            synthesis_input = texttospeech.SynthesisInput(text=text)
-            logger.info("🔤 Using plain text input")
-
-        voice = texttospeech.VoiceSelectionParams(
-            language_code="th-TH",
-            name="th-TH-Standard-A"  # ✅ ปลอดภัย ใช้ได้ทั่วไป
-        )
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3
-        )
-
-        response = client.synthesize_speech(
-            input=synthesis_input,
-            voice=voice,
-            audio_config=audio_config
-        )
-
-        with open(output_path, "wb") as out:
-            out.write(response.audio_content)
-        logger.info(f"🔊 TTS audio saved to: {output_path}")
-
-    else:
-        raise NotImplementedError(f"TTS provider '{TTS_PROVIDER}' is not supported.")
-    
\ No newline at end of file
+VOICE_LANGUAGE_CODE = "th-TH"
+VOICE_NAME = "th-TH-Standard-A"  # ✅ ปลอดภัย ใช้ได้ทั่วไป
+AUDIO_ENCODING = "MP3"
+
+_tts_semaphore = asyncio.Semaphore(TTS_MAX_CONCURRENCY)
+
+# Cloud TTS request budget (per worker), charged by each provider call incl. hedges and stream chunks
+tts_budget = budget_from_rpm(TTS_RATE_LIMIT_RPM, RATE_LIMIT_BURST_SECONDS)
+
+
+def create_provider(provider: str, endpoint: str = GOOGLE_TTS_ENDPOINT, name: str = None) -> TTSProvider:
+    if provider == "GoogleCloudTTS":
+        return GoogleGrpcProvider(GOOGLE_CLOUD_TTS_CREDENTIALS_PATH, VOICE_LANGUAGE_CODE, VOICE_NAME, budget=tts_budget)
+    if provider == "GoogleCloudTTSRest":
+        limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+        return GoogleRestProvider(endpoint, GOOGLE_TTS_API_KEY, VOICE_LANGUAGE_CODE, VOICE_NAME,
+                                  limits=limits, timeout=HTTP_TIMEOUT_SECONDS, name=name, budget=tts_budget)
+    if provider == "Offline":
+        return OfflineProvider(TTS_OFFLINE_COMMAND)
+    raise NotImplementedError(f"TTS provider '{provider}' is not supported.")
+
+
+def create_tts() -> HedgedTTS:
+    primary = create_provider(TTS_PROVIDER)
+    secondary = None
+    if TTS_SECONDARY_PROVIDER:
+        # ชื่อไม่ซ้ำกับ primary เมื่อใช้ provider ชนิดเดียวกันคนละ endpoint (แยกสถิติ)
+        name = "google_rest_secondary" if TTS_SECONDARY_PROVIDER == TTS_PROVIDER == "GoogleCloudTTSRest" else None
+        secondary = create_provider(TTS_SECONDARY_PROVIDER, TTS_SECONDARY_ENDPOINT, name=name)
+    hedge_after = None if TTS_HEDGE_AFTER_MS == "auto" else float(TTS_HEDGE_AFTER_MS) / 1000
+    return HedgedTTS(primary, secondary, hedge_after_s=hedge_after)
+
+
+# Long-lived provider clients (gRPC channel / HTTP pool), created on first use
+tts = create_tts()
+
+
+def voice_config_key() -> str:
+    return f"{TTS_PROVIDER}|{VOICE_LANGUAGE_CODE}|{VOICE_NAME}|{AUDIO_ENCODING}"
+
+
+async def synthesize_async(text: str) -> bytes:
+    async with _tts_semaphore:
+        with STAGE_SECONDS.time("tts_synthesis"):
+            return await tts.synthesize(text)
+
+
+def _write_file(path: str, data: bytes):
+    with open(path, "wb") as out:
+        out.write(data)
+
+
+async def generate_tts_async(text: str, output_path: str):
+    audio = await synthesize_async(text)
+    with STAGE_SECONDS.time("file_write"):
+        await asyncio.to_thread(_write_file, output_path, audio)
+    logger.info(f"🔊 TTS audio saved to: {output_path}")
+
+
+async def close_tts_clients():
+    await tts.close()
+
+
+def tts_stats() -> dict:
+    return tts.stats()
@@ -0,0 +1,320 @@
+import asyncio
+import base64
+import collections
+import os
+import re
+import time
+from typing import List, Optional
+
+import httpx
+
+from app.services.admission import TokenBucket
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+TTS_PROVIDER_SECONDS = metrics.histogram(
+    "vera_tts_provider_seconds", "TTS synthesis latency per provider", ["provider", "outcome"])
+TTS_HEDGES = metrics.counter("vera_tts_hedges_total", "Hedged TTS requests by winner", ["winner"])
+
+_SSML_TAG = re.compile(r"<[^>]+>")
+
+
+def is_ssml(text: str) -> bool:
+    return text.strip().startswith("<speak>")
+
+
+class SynthesizedAudio(bytes):
+    """Audio bytes tagged with the voice that produced them (set when a hedge was won by another voice)."""
+
+    voice: Optional[str] = None
+
+
+class LatencyStats:
+    # ช่วงเวลาล่าสุด (ring) สำหรับ percentile + ตัวนับตลอดอายุ process
+    def __init__(self, window: int = 512):
+        self.recent = collections.deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+
+    def record(self, seconds: float):
+        self.calls += 1
+        self.recent.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def as_dict(self) -> dict:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "p50_ms": ms(self.percentile(50)),
+            "p95_ms": ms(self.percentile(95)),
+            "p99_ms": ms(self.percentile(99)),
+        }
+
+
+class BudgetExhausted(RuntimeError):
+    pass
+
+
+class TTSProvider:
+    """One TTS backend with a long-lived client; ``synthesize`` returns MP3 bytes.
+
+    A cloud provider given a ``budget`` token bucket charges it per request, waiting at most
+    ``budget_wait_s`` for its turn; past that ``BudgetExhausted`` is raised without calling out.
+    """
+
+    name = "base"
+
+    def __init__(self, voice: str, budget: Optional[TokenBucket] = None, budget_wait_s: float = 3.0):
+        self.voice = voice
+        self.budget = budget
+        self.budget_wait_s = budget_wait_s
+        self.stats = LatencyStats()
+
+    async def synthesize(self, text: str) -> bytes:
+        if self.budget is not None and not await self.budget.take(self.budget_wait_s):
+            self.stats.errors += 1
+            TTS_PROVIDER_SECONDS.observe(0.0, self.name, "rate_limited")
+            raise BudgetExhausted(f"TTS request budget exhausted for {self.name}")
+        started = time.perf_counter()
+        try:
+            audio = await self._synthesize(text)
+        except asyncio.CancelledError:
+            self.stats.cancelled += 1
+            TTS_PROVIDER_SECONDS.observe(time.perf_counter() - started, self.name, "cancelled")
+            raise
+        except Exception:
+            self.stats.errors += 1
+            TTS_PROVIDER_SECONDS.observe(time.perf_counter() - started, self.name, "error")
+            raise
+        elapsed = time.perf_counter() - started
+        self.stats.record(elapsed)
+        TTS_PROVIDER_SECONDS.observe(elapsed, self.name, "ok")
+        return audio
+
+    async def _synthesize(self, text: str) -> bytes:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class GoogleGrpcProvider(TTSProvider):
+    name = "google_grpc"
+
+    def __init__(self, credentials_path: str, language_code: str, voice_name: str,
+                 budget: Optional[TokenBucket] = None):
+        super().__init__(f"google|{language_code}|{voice_name}", budget)
+        self.credentials_path = credentials_path
+        self.language_code = language_code
+        self.voice_name = voice_name
+        self._client = None
+
+    def _get_client(self):
+        # channel เดียวตลอดอายุ process (เดิมสร้าง client/channel ใหม่ทุกครั้ง)
+        if self._client is None:
+            from google.cloud import texttospeech
+            os.environ.setdefault("GOOGLE_APPLICATION_CREDENTIALS", self.credentials_path)
+            self._client = texttospeech.TextToSpeechAsyncClient()
+        return self._client
+
+    async def _synthesize(self, text: str) -> bytes:
+        from google.cloud import texttospeech
+        client = self._get_client()
+        if is_ssml(text):
+            synthesis_input = texttospeech.SynthesisInput(ssml=text)
+        else:
+            synthesis_input = texttospeech.SynthesisInput(text=text)
+        response = await client.synthesize_speech(
+            input=synthesis_input,
+            voice=texttospeech.VoiceSelectionParams(language_code=self.language_code, name=self.voice_name),
+            audio_config=texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3),
+        )
+        return response.audio_content
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.transport.close()
+            self._client = None
+
+
+class GoogleRestProvider(TTSProvider):
+    name = "google_rest"
+
+    def __init__(self, endpoint: str, api_key: str, language_code: str, voice_name: str,
+                 limits: httpx.Limits, timeout: float, name: Optional[str] = None,
+                 budget: Optional[TokenBucket] = None):
+        super().__init__(f"google|{language_code}|{voice_name}", budget)
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.language_code = language_code
+        self.voice_name = voice_name
+        self.limits = limits
+        self.timeout = timeout
+        if name:
+            self.name = name
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.endpoint, limits=self.limits, timeout=self.timeout)
+        return self._client
+
+    async def _synthesize(self, text: str) -> bytes:
+        payload = {
+            "input": {"ssml": text} if is_ssml(text) else {"text": text},
+            "voice": {"languageCode": self.language_code, "name": self.voice_name},
+            "audioConfig": {"audioEncoding": "MP3"},
+        }
+        params = {"key": self.api_key} if self.api_key else None
+        res = await self._get_client().post("/v1/text:synthesize", json=payload, params=params)
+        res.raise_for_status()
+        return base64.b64decode(res.json()["audioContent"])
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class OfflineProvider(TTSProvider):
+    """Local synthesizer run as a shell pipeline: plain text on stdin, MP3 on stdout.
+
+    The default pipeline is espeak-ng (Thai voice) into ffmpeg. No network, so it keeps
+    answering when the cloud stalls, in a different (robotic) voice.
+    """
+
+    name = "offline"
+
+    def __init__(self, command: str, max_concurrency: int = 2, timeout: float = 10.0):
+        super().__init__(f"offline|{command}")
+        self.command = command
+        self.timeout = timeout
+        # สังเคราะห์ด้วย CPU ของเครื่องเอง จำกัดจำนวนพร้อมกัน
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def _synthesize(self, text: str) -> bytes:
+        plain = _SSML_TAG.sub(" ", text).strip() if is_ssml(text) else text
+        async with self._slots:
+            process = await asyncio.create_subprocess_shell(
+                self.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                audio, err = await asyncio.wait_for(process.communicate(plain.encode("utf-8")), self.timeout)
+            except BaseException:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                raise
+        if process.returncode != 0 or not audio:
+            raise RuntimeError(f"offline TTS exited with {process.returncode}: {err.decode(errors='replace')[:200]}")
+        return audio
+
+
+class HedgedTTS:
+    """Primary provider, plus a secondary that is also asked if the primary is slow.
+
+    When the primary has not answered after the hedge delay, the same text is sent to the
+    secondary and the first successful answer wins (the other call is cancelled). A primary
+    error goes to the secondary at once. The delay is either fixed or, with
+    ``hedge_after_s=None``, the primary's recent p95 clamped to [min_hedge_s, max_hedge_s].
+    Audio from a secondary with another voice comes back as ``SynthesizedAudio`` tagged with
+    that voice so the TTS cache does not store it under the primary voice.
+    """
+
+    def __init__(self, primary: TTSProvider, secondary: Optional[TTSProvider] = None,
+                 hedge_after_s: Optional[float] = 0.8, min_hedge_s: float = 0.2, max_hedge_s: float = 3.0,
+                 min_samples: int = 20):
+        self.primary = primary
+        self.secondary = secondary
+        self.hedge_after_s = hedge_after_s
+        self.min_hedge_s = min_hedge_s
+        self.max_hedge_s = max_hedge_s
+        self.min_samples = min_samples
+        self.hedged = 0
+        self.hedges_skipped = 0
+        self.wins = collections.Counter()
+
+    @property
+    def voice(self) -> str:
+        return self.primary.voice
+
+    def hedge_delay(self) -> float:
+        if self.hedge_after_s is not None:
+            return self.hedge_after_s
+        stats = self.primary.stats
+        if len(stats.recent) < self.min_samples:
+            return self.max_hedge_s
+        return min(self.max_hedge_s, max(self.min_hedge_s, stats.percentile(95)))
+
+    async def synthesize(self, text: str) -> bytes:
+        if self.secondary is None:
+            return await self.primary.synthesize(text)
+
+        primary = asyncio.ensure_future(self.primary.synthesize(text))
+        tasks = {primary: self.primary}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+            if done and primary.exception() is None:
+                self.wins["primary"] += 1
+                return primary.result()
+            if done:
+                logger.warning(f"⚠️ TTS {self.primary.name} failed ({primary.exception()}), using {self.secondary.name}")
+            elif self.secondary.budget is not None and self.secondary.budget.wait_time() > 0:
+                # hedge ต้องรองบ: ไม่ยิง request ที่สองที่จะแย่ง quota กับ turn อื่น รอ primary ต่อ
+                self.hedges_skipped += 1
+                return await primary
+            self.hedged += 1
+            tasks[asyncio.ensure_future(self.secondary.synthesize(text))] = self.secondary
+            return await self._first_success(tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _first_success(self, tasks: dict) -> bytes:
+        pending = {task for task in tasks if not task.done()}
+        errors: List[BaseException] = [task.exception() for task in tasks if task.done() and task.exception()]
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    errors.append(task.exception())
+                    continue
+                provider = tasks[task]
+                winner = "primary" if provider is self.primary else "secondary"
+                self.wins[winner] += 1
+                TTS_HEDGES.inc(winner)
+                audio = task.result()
+                if provider.voice != self.primary.voice:
+                    audio = SynthesizedAudio(audio)
+                    audio.voice = provider.voice
+                return audio
+        TTS_HEDGES.inc("none")
+        raise errors[-1]
+
+    async def close(self):
+        await self.primary.close()
+        if self.secondary is not None:
+            await self.secondary.close()
+
+    def stats(self) -> dict:
+        return {
+            "primary": {"name": self.primary.name, **self.primary.stats.as_dict()},
+            "secondary": {"name": self.secondary.name, **self.secondary.stats.as_dict()} if self.secondary else None,
+            "hedge_after_ms": round(self.hedge_delay() * 1000, 1),
+            "hedged": self.hedged,
+            "hedges_skipped": self.hedges_skipped,
+            "wins": dict(self.wins),
+        }
@@ -0,0 +1,123 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.services.cleaner import ExpiryScheduler
+from app.services.session_store import SessionStore
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+TTS_KEY = "tts:"
+
+
+class TTSRegistry:
+    # tts_id -> path ของไฟล์เสียง มีอายุเท่ากับไฟล์ และจำกัดจำนวน entry
+    # มี store: เขียนลง store ด้วย เพื่อให้ /speak ที่ไปตก worker อื่นหาไฟล์เจอ
+    # ไฟล์ที่ registry เป็นเจ้าของ (owned, ไม่ใช่ไฟล์ใน TTS cache) ถูกลบพร้อม entry ตอนหมดอายุ/ถูก evict
+    def __init__(self, ttl_seconds: float, max_entries: int, store: Optional[SessionStore] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.store = store
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # tts_id -> (path, owned)
+        self._expiry = ExpiryScheduler(self._expire)
+        self.expired = 0
+        self.evicted = 0
+        self.shared_hits = 0
+        self.files_removed = 0
+        self.orphans_removed = 0
+
+    async def put(self, tts_id: str, path: str, owned: bool = False):
+        self._put_local(tts_id, path, owned)
+        if self.store is not None:
+            await self.store.set(TTS_KEY + tts_id, path.encode("utf-8"), self.ttl_seconds)
+
+    async def get(self, tts_id: str) -> Optional[str]:
+        path = self._get_local(tts_id)
+        if path is None and self.store is not None:
+            data = await self.store.get(TTS_KEY + tts_id)
+            if data is not None:
+                path = data.decode("utf-8")
+                self.shared_hits += 1
+        return path
+
+    def _put_local(self, tts_id: str, path: str, owned: bool):
+        self._entries.pop(tts_id, None)
+        self._entries[tts_id] = (path, owned)
+        self._expiry.schedule(tts_id, time.monotonic() + self.ttl_seconds)
+        while len(self._entries) > self.max_entries:
+            old_id, _ = next(iter(self._entries.items()))
+            self._remove(old_id)
+            self._expiry.cancel(old_id)
+            self.evicted += 1
+
+    def _get_local(self, tts_id: str) -> Optional[str]:
+        entry = self._entries.get(tts_id)
+        return entry[0] if entry is not None else None
+
+    def _expire(self, tts_id: str):
+        if self._remove(tts_id):
+            self.expired += 1
+
+    def _remove(self, tts_id: str) -> bool:
+        entry = self._entries.pop(tts_id, None)
+        if entry is None:
+            return False
+        path, owned = entry
+        if owned:
+            self._delete_file(path)
+        return True
+
+    def _delete_file(self, path: str):
+        try:
+            os.remove(path)
+            self.files_removed += 1
+        except FileNotFoundError:
+            pass  # worker อื่นลบไปแล้ว
+        except OSError as e:
+            logger.warning(f"⚠️ Failed to delete {path}: {e}")
+
+    def reconcile(self, directory: str):
+        """Startup pass over ``directory``: delete expired MP3s, schedule the rest by their mtime."""
+        # ไฟล์ที่เหลือจาก process ก่อน (restart/crash) ไม่มีใน index: ลบที่หมดอายุ ที่เหลือตั้งเวลาลบตามอายุจริง
+        if not os.path.isdir(directory):
+            return
+        now_wall, now = time.time(), time.monotonic()
+        scheduled = 0
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".mp3") or not entry.is_file():
+                    continue
+                tts_id = entry.name[:-len(".mp3")]
+                if tts_id in self._entries:
+                    continue
+                remaining = entry.stat().st_mtime + self.ttl_seconds - now_wall
+                if remaining <= 0:
+                    self._delete_file(entry.path)
+                    self.orphans_removed += 1
+                else:
+                    self._entries[tts_id] = (entry.path, True)
+                    self._expiry.schedule(tts_id, now + remaining)
+                    scheduled += 1
+        logger.info(f"🧹 TTS dir reconciled: {self.orphans_removed} expired files removed, {scheduled} scheduled")
+        self._expiry.start()
+
+    async def close(self):
+        await self._expiry.stop()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "shared_hits": self.shared_hits,
+            "files_removed": self.files_removed,
+            "orphans_removed": self.orphans_removed,
+            "expiry": self._expiry.stats(),
+        }
@@ -0,0 +1,297 @@
+import asyncio
+import re
+import struct
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.services.session_store import SessionStore
+from app.utils.logger import get_logger
+from app.utils.stats import RollingStats
+
+logger = get_logger(__name__)
+
+_TAG = re.compile(r"<[^>]+>")
+_TAG_NAME = re.compile(r"</?\s*([a-zA-Z:_-]+)")
+# จบประโยค: เครื่องหมายวรรคตอน หรือคำลงท้ายสุภาพ ตามด้วยช่องว่าง
+_SENTENCE_END = re.compile(r"(?:[.!?。]|ค่ะ|คะ|ครับ|จ้ะ|จ้า)[?!]*\s+")
+
+
+def _visible_len(chunk: str) -> int:
+    return len(_TAG.sub("", chunk).strip())
+
+
+class SSMLSegmenter:
+    """Incrementally cuts SSML/plain text into standalone chunks at sentence / ``<break>`` boundaries.
+
+    Only splits at the top level, so ``<prosody>``/``<emphasis>`` spans stay whole.
+    A ``<break>`` is never dropped, so the pause survives between chunks.
+    Chunks shorter than ``min_chars`` are held and merged into the next one.
+    """
+
+    def __init__(self, min_chars: int = 12):
+        self.min_chars = min_chars
+        self.ssml: Optional[bool] = None  # decided from the first non-space character
+        self._pending = ""  # unprocessed tail, may be a partial tag
+        self._current = ""
+        self._held = ""
+        self._depth = 0
+
+    def feed(self, text: str) -> List[str]:
+        out = []
+        if self.ssml is None:
+            stripped = (self._pending + text).lstrip()
+            if not stripped or (len(stripped) < 6 and "<speak".startswith(stripped)):
+                self._pending += text
+                return out
+            self.ssml = stripped.startswith("<speak")
+        self._pending += text
+
+        while self._pending:
+            if self.ssml and self._pending[0] == "<":
+                end = self._pending.find(">")
+                if end < 0:
+                    break  # รอให้แท็กมาครบก่อน
+                tag, self._pending = self._pending[:end + 1], self._pending[end + 1:]
+                self._on_tag(tag, out)
+            else:
+                nxt = self._pending.find("<") if self.ssml else -1
+                if nxt < 0:
+                    part, self._pending = self._pending, ""
+                else:
+                    part, self._pending = self._pending[:nxt], self._pending[nxt:]
+                self._on_text(part, out)
+        return out
+
+    def flush(self) -> List[str]:
+        out = []
+        self._current += self._pending
+        self._pending = ""
+        self._emit(self._current, out, final=True)
+        self._current = ""
+        return out
+
+    def _on_tag(self, tag: str, out: List[str]):
+        m = _TAG_NAME.match(tag)
+        name = m.group(1).lower() if m else ""
+        if name == "speak":
+            return
+        self._current += tag
+        if name == "break":
+            if self._depth == 0:
+                self._emit(self._current, out)
+                self._current = ""
+        elif tag.startswith("</"):
+            self._depth = max(self._depth - 1, 0)
+        elif not tag.endswith("/>"):
+            self._depth += 1
+
+    def _on_text(self, part: str, out: List[str]):
+        if self._depth > 0:
+            self._current += part
+            return
+        # คำลงท้ายอาจถูกตัดคร่อมระหว่าง delta จึงย้อนกลับไปตรวจนิดหน่อย
+        start = max(0, len(self._current) - 4)
+        self._current += part
+        while True:
+            m = _SENTENCE_END.search(self._current, start)
+            if not m:
+                break
+            self._emit(self._current[:m.end()], out)
+            self._current = self._current[m.end():]
+            start = 0
+
+    def _emit(self, chunk: str, out: List[str], final: bool = False):
+        chunk = f"{self._held} {chunk}".strip() if self._held else chunk.strip()
+        self._held = ""
+        if not chunk:
+            return
+        if _visible_len(chunk) < self.min_chars and not final:
+            self._held = chunk
+            return
+        out.append(f"<speak>{chunk}</speak>" if self.ssml else chunk)
+
+
+def split_ssml(text: str, min_chars: int = 12) -> List[str]:
+    segmenter = SSMLSegmenter(min_chars=min_chars)
+    chunks = segmenter.feed(text) + segmenter.flush()
+    return chunks or [text]
+
+
+STREAM_KEY = "ttsstream:"
+
+
+class _StreamJob:
+    def __init__(self, started_at: float):
+        self.segmenter = SSMLSegmenter()
+        self.tasks: List[asyncio.Task] = []
+        self.closed = False
+        self.changed = asyncio.Event()
+        self.started_at = started_at
+        self.created_at = time.monotonic()
+        self.published: Optional[asyncio.Task] = None  # งานเขียน store ล่าสุด (เขียนตามลำดับ)
+
+
+class TTSStreamer:
+    """Synthesizes reply chunks in parallel as they arrive and streams them back in order.
+
+    With a shared ``store`` every chunk is also published under ``ttsstream:<id>:<n>`` (and the
+    chunk count under ``ttsstream:<id>`` once the reply is complete), so ``/speak-stream`` works
+    on whichever uvicorn worker the kiosk's request lands on: a worker without the job polls the
+    store every ``poll_seconds`` instead of answering 404.
+    """
+
+    def __init__(self, synthesize: Callable[[str], Awaitable[bytes]], job_ttl_seconds: float = 300,
+                 store: Optional[SessionStore] = None, poll_seconds: float = 0.05):
+        self.synthesize = synthesize
+        self.job_ttl_seconds = job_ttl_seconds
+        self.store = store
+        self.poll_seconds = poll_seconds
+        self.jobs: Dict[str, _StreamJob] = {}
+        self.time_to_first_audio = RollingStats()
+        self.time_to_last_audio = RollingStats()
+        self.remote_streams = 0
+
+    def open(self, started_at: Optional[float] = None) -> str:
+        self._purge_expired()
+        stream_id = uuid.uuid4().hex
+        job = self.jobs[stream_id] = _StreamJob(started_at or time.monotonic())
+        self._publish(job, STREAM_KEY + stream_id, b"")
+        return stream_id
+
+    def feed(self, stream_id: str, text: str):
+        job = self.jobs[stream_id]
+        self._submit(stream_id, job, job.segmenter.feed(text))
+
+    def close(self, stream_id: str):
+        job = self.jobs[stream_id]
+        self._submit(stream_id, job, job.segmenter.flush())
+        job.closed = True
+        job.changed.set()
+        self._publish(job, STREAM_KEY + stream_id, str(len(job.tasks)).encode())
+        logger.info(f"🎼 TTS stream {stream_id}: {len(job.tasks)} chunks")
+
+    def abort(self, stream_id: str):
+        job = self.jobs.pop(stream_id, None)
+        if job is not None:
+            self._cancel(job)
+            self._publish(job, STREAM_KEY + stream_id, None)
+
+    def start(self, text: str, started_at: Optional[float] = None) -> str:
+        stream_id = self.open(started_at)
+        self.feed(stream_id, text)
+        self.close(stream_id)
+        return stream_id
+
+    def _submit(self, stream_id: str, job: _StreamJob, chunks: List[str]):
+        if not chunks:
+            return
+        for chunk in chunks:
+            task = asyncio.create_task(self.synthesize(chunk))
+            if self.store is not None:
+                key = f"{STREAM_KEY}{stream_id}:{len(job.tasks)}"
+                task.add_done_callback(lambda t, key=key: self._publish_chunk(stream_id, job, key, t))
+            job.tasks.append(task)
+        job.changed.set()
+
+    def _publish_chunk(self, stream_id: str, job: _StreamJob, key: str, task: asyncio.Task):
+        if task.cancelled() or task.exception() is not None:
+            # ท่อนนี้ไม่มีวันมา worker ที่รออยู่ต้องเลิกรอ
+            self._publish(job, STREAM_KEY + stream_id, None)
+        else:
+            self._publish(job, key, task.result())
+
+    def _publish(self, job: _StreamJob, key: str, value: Optional[bytes]):
+        # เขียนต่อกันเป็นลำดับ (ต่อ job) ให้ "กำลังพูด" -> "จบแล้ว n ท่อน" -> ลบ ไม่สลับกันข้าม connection
+        if self.store is None:
+            return
+
+        async def write(previous: Optional[asyncio.Task]):
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            try:
+                if value is None:
+                    await self.store.delete(key)
+                else:
+                    await self.store.set(key, value, self.job_ttl_seconds)
+            except Exception as e:
+                logger.warning(f"⚠️ TTS stream publish failed for {key}: {e}")
+
+        job.published = asyncio.create_task(write(job.published))
+
+    async def has_stream(self, stream_id: str) -> bool:
+        if stream_id in self.jobs:
+            return True
+        if self.store is None:
+            return False
+        # reply อาจมาถึง kiosk ก่อนที่ worker เจ้าของจะเขียน store เสร็จ รอสั้น ๆ
+        for _ in range(int(1 / self.poll_seconds)):
+            if await self.store.get(STREAM_KEY + stream_id) is not None:
+                return True
+            await asyncio.sleep(self.poll_seconds)
+        return False
+
+    async def iter_audio(self, stream_id: str, framed: bool = False) -> AsyncIterator[bytes]:
+        job = self.jobs.get(stream_id)
+        chunks = self._iter_local(stream_id, job) if job is not None else self._iter_remote(stream_id)
+        async for audio in chunks:
+            # framed: 4-byte big-endian length ก่อนแต่ละท่อน ให้ client เล่นทีละท่อนได้
+            yield struct.pack(">I", len(audio)) + audio if framed else audio
+
+    async def _iter_local(self, stream_id: str, job: _StreamJob) -> AsyncIterator[bytes]:
+        i = 0
+        try:
+            while True:
+                if i >= len(job.tasks):
+                    if job.closed:
+                        break
+                    job.changed.clear()
+                    await job.changed.wait()
+                    continue
+                audio = await job.tasks[i]
+                if i == 0:
+                    self.time_to_first_audio.add(time.monotonic() - job.started_at)
+                i += 1
+                yield audio
+            self.time_to_last_audio.add(time.monotonic() - job.started_at)
+        finally:
+            self.jobs.pop(stream_id, None)
+            self._cancel(job)
+
+    async def _iter_remote(self, stream_id: str) -> AsyncIterator[bytes]:
+        # job อยู่ที่ worker อื่น: อ่านท่อนที่ worker นั้น publish ไว้ตามลำดับ
+        self.remote_streams += 1
+        deadline = time.monotonic() + self.job_ttl_seconds
+        i = 0
+        while time.monotonic() < deadline:
+            audio = await self.store.get(f"{STREAM_KEY}{stream_id}:{i}")
+            if audio is not None:
+                i += 1
+                yield audio
+                continue
+            count = await self.store.get(STREAM_KEY + stream_id)
+            if count is None or (count and i >= int(count)):
+                return  # จบครบ หรือถูกยกเลิก/หมดอายุที่ worker เจ้าของ
+            await asyncio.sleep(self.poll_seconds)
+
+    def _cancel(self, job: _StreamJob):
+        for task in job.tasks:
+            if not task.done():
+                task.cancel()
+        job.closed = True
+        job.changed.set()
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        expired = [sid for sid, job in self.jobs.items() if now - job.created_at > self.job_ttl_seconds]
+        for sid in expired:
+            self._cancel(self.jobs.pop(sid))
+
+    def stats(self) -> dict:
+        return {
+            "pending_streams": len(self.jobs),
+            "shared": self.store is not None,
+            "remote_streams": self.remote_streams,
+            "time_to_first_audio_ms": self.time_to_first_audio.summary(),
+            "time_to_last_audio_ms": self.time_to_last_audio.summary(),
+        }
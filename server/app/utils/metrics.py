@@ -0,0 +1,197 @@
+import bisect
+import os
+import time
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# วินาที: 0.1ms .. 30s แบบ exponential พอสำหรับทั้ง parse (µs) และ LLM (วินาที)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram, one series per label tuple.
+
+    Updates happen on the event loop of a single worker, so there is no lock: an observation is
+    a bisect plus three in-place increments. Each uvicorn worker keeps (and exposes) its own.
+    """
+
+    __slots__ = ("name", "help", "labelnames", "buckets", "_series")
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts, sum, count]
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def quantile(self, q: float, *labels: str) -> float:
+        # ประมาณจาก bucket (linear interpolation ภายใน bucket)
+        series = self._series.get(labels)
+        if not series or not series[2]:
+            return 0.0
+        rank = q * series[2]
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(series[0]):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if n and seen + n >= rank:
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+            lower = upper
+        return self.buckets[-1]
+
+    def collect(self):
+        for labels, (counts, total, count) in self._series.items():
+            yield labels, counts, total, count
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Counter:
+    __slots__ = ("name", "help", "labelnames", "_values")
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def collect(self):
+        return self._values.items()
+
+
+class Callback:
+    # ค่าที่คำนวณตอน scrape (ขนาด session store, cache hit) ไม่มีต้นทุนบน hot path
+    __slots__ = ("name", "help", "kind", "labelname", "fn")
+
+    def __init__(self, name: str, help: str, fn: Callable, kind: str = "gauge", labelname: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelname = labelname
+        self.fn = fn
+
+    def collect(self):
+        value = self.fn()
+        if isinstance(value, dict):
+            return [((str(k),), v) for k, v in value.items()]
+        return [((), value)]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def callback(self, name: str, help: str, fn: Callable, kind: str = "gauge", labelname: Optional[str] = None) -> Callback:
+        # แทนที่ของเดิมได้ (เช่น reload โมดูลที่ลงทะเบียน)
+        metric = Callback(name, help, fn, kind, labelname)
+        self._metrics[name] = metric
+        return metric
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            if isinstance(metric, Histogram):
+                lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} histogram"]
+                for labels, counts, total, count in metric.collect():
+                    base = _label_pairs(metric.labelnames, labels)
+                    cumulative = 0
+                    for bound, n in zip((*metric.buckets, "+Inf"), counts):
+                        cumulative += n
+                        le = _format_labels(base + [("le", str(bound))])
+                        lines.append(f"{metric.name}_bucket{le} {cumulative}")
+                    lines.append(f"{metric.name}_sum{_format_labels(base)} {total}")
+                    lines.append(f"{metric.name}_count{_format_labels(base)} {count}")
+            elif isinstance(metric, Counter):
+                lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} counter"]
+                for labels, value in metric.collect():
+                    lines.append(f"{metric.name}{_format_labels(_label_pairs(metric.labelnames, labels))} {value}")
+            else:
+                lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"]
+                labelnames = (metric.labelname,) if metric.labelname else ()
+                for labels, value in metric.collect():
+                    lines.append(f"{metric.name}{_format_labels(_label_pairs(labelnames, labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        result = {"worker_pid": os.getpid()}
+        for metric in self._metrics.values():
+            if isinstance(metric, Histogram):
+                series = {}
+                for labels, _, total, count in metric.collect():
+                    series["/".join(labels) or "all"] = {
+                        "count": count,
+                        "mean_ms": round(total / count * 1000, 2) if count else 0.0,
+                        "p50_ms": round(metric.quantile(0.5, *labels) * 1000, 2),
+                        "p95_ms": round(metric.quantile(0.95, *labels) * 1000, 2),
+                        "p99_ms": round(metric.quantile(0.99, *labels) * 1000, 2),
+                    }
+                result[metric.name] = series
+            else:
+                result[metric.name] = {"/".join(labels) or "value": value for labels, value in metric.collect()}
+        return result
+
+
+def _label_pairs(names: Tuple[str, ...], values: tuple) -> list:
+    return list(zip(names, values))
+
+
+def _format_labels(pairs: list) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram("vera_stage_seconds", "Time spent in each stage of /ask", ["stage"])
+ASK_SECONDS = metrics.histogram("vera_ask_seconds", "End-to-end /ask latency", ["path"])
+LLM_TOKENS = metrics.counter("vera_llm_tokens_total", "Tokens reported by the LLM usage field", ["kind"])
+INTENTS = metrics.counter("vera_intents_total", "Replies by intent and source", ["intent", "source"])
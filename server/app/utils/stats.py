@@ -0,0 +1,28 @@
+from collections import deque
+
+
+class RollingStats:
+    def __init__(self, window: int = 1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        k = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[k]
+
+    def summary(self, scale: float = 1000.0) -> dict:
+        # scale=1000 -> seconds are reported as milliseconds
+        return {
+            "count": self.count,
+            "p50": round(self.percentile(50) * scale, 1),
+            "p95": round(self.percentile(95) * scale, 1),
+            "p99": round(self.percentile(99) * scale, 1),
+            "max": round(max(self.samples, default=0.0) * scale, 1),
+        }
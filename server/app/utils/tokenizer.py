@@ -0,0 +1,74 @@
+import asyncio
+
+from app.config import TOKENIZER_ENCODING, TOKENIZER_LOAD_TIMEOUT_SECONDS
+from app.utils.logger import get_logger
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+logger = get_logger(__name__)
+
+# OpenAI chat format adds a few tokens per message (role + separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+_encoding_failed = False
+
+
+def _load_encoding():
+    global _encoding, _encoding_failed
+    try:
+        encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        # ครั้งแรกต้องโหลดไฟล์ BPE ถ้าออฟไลน์ให้ใช้ค่าประมาณแทน
+        _encoding_failed = True
+        logger.warning(f"⚠️ tiktoken unavailable ({e}), using estimated token counts")
+        return
+    if not _encoding_failed:  # โหลดเสร็จหลัง timeout: ใช้ค่าประมาณต่อ ให้ตัวเลขทั้ง process นับแบบเดียวกัน
+        _encoding = encoding
+
+
+def _get_encoding():
+    if _encoding is None and tiktoken is not None and not _encoding_failed:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            _load_encoding()  # script/thread ที่ไม่มี event loop โหลดเองได้
+        # บน event loop ห้ามดาวน์โหลด (บล็อกทุก request) ใช้ค่าประมาณจนกว่า load_encoding() จะเสร็จ
+    return _encoding
+
+
+async def load_encoding() -> bool:
+    """Load the tiktoken encoding off the event loop (called once from the app lifespan).
+
+    Until it finishes, and for good if the download fails or takes longer than
+    ``TOKENIZER_LOAD_TIMEOUT_SECONDS``, token counts use the character-based estimate.
+    """
+    global _encoding_failed
+    if tiktoken is None or _encoding is not None or _encoding_failed:
+        return _encoding is not None
+    try:
+        await asyncio.wait_for(asyncio.to_thread(_load_encoding), TOKENIZER_LOAD_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        _encoding_failed = True
+        logger.warning(f"⚠️ tiktoken {TOKENIZER_ENCODING} not loaded after {TOKENIZER_LOAD_TIMEOUT_SECONDS:g}s, "
+                       f"using estimated token counts")
+    return _encoding is not None
+
+
+def _estimate_tokens(text: str) -> int:
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars + 1) // 2
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return _estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(content: str) -> int:
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
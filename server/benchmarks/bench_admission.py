@@ -0,0 +1,137 @@
+"""Lunch rush: many kiosks against an upstream LLM with a rate limit, with and without admission control.
+
+    cd server && python -m benchmarks.bench_admission --kiosks 150 --upstream-rps 20 --duration-s 30
+
+The LLM stand-in answers in ~``--llm-delay-ms`` but returns 429 above ``--upstream-rps``. Every
+kiosk sends an order turn (fast path off, so each one needs the LLM), waits ``--think-ms`` for
+the customer's next sentence and, like the real client, resends the same text after
+``retry_after_ms`` when the server says ``please_wait``. LLM hedging is off in both setups so
+every upstream call is one the budget accounted for. Each setup runs ``uvicorn app.main:app`` in its own process:
+
+  unlimited   ADMISSION_MAX_ACTIVE=0 and no rate budget (the previous behaviour)
+  admission   --max-active slots, --max-queue queue, LLM budget at --budget-fraction of the upstream limit
+
+A turn counts as ``ok`` when it took an order. ``apology`` means the LLM gateway gave up (429s
+or deadline), and ``error`` means an HTTP error or timeout. Turn latency includes the resends.
+The table also shows the peak RSS of the server process and the 429s the upstream returned.
+"""
+import argparse
+import asyncio
+import collections
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_workers import start_app
+from benchmarks.standins import LatencyModel, ServerThread, create_fake_openai_app, create_fake_tts_app, percentile
+
+ORDERS = ["ขอลาเต้เย็นแก้วนึง", "เอาโกโก้เย็น", "ชาไทยเย็นหนึ่งแก้ว", "อเมริกาโน่เย็นค่ะ", "มอคค่าเย็นแก้วนึง"]
+
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def kiosk(client, kiosk_id: int, deadline: float, outcomes: collections.Counter, latencies: list, args):
+    turn = 0
+    await asyncio.sleep(kiosk_id * args.think_ms / 1000 / args.kiosks)  # ไม่ให้ทุกตู้เริ่มพร้อมกันเป๊ะ
+    while time.monotonic() < deadline:
+        session_id = f"rush-{kiosk_id}"
+        text = ORDERS[(kiosk_id + turn) % len(ORDERS)]
+        turn += 1
+        started = time.monotonic()
+        intent = "error"
+        for _ in range(args.max_resends + 1):
+            try:
+                res = await client.post("/ask", json={"text": text, "session_id": session_id})
+                reply = res.json() if res.status_code == 200 else {}
+            except httpx.HTTPError:
+                reply = {}
+            intent = reply.get("intent", "error")
+            if intent != "please_wait":
+                break
+            outcomes["please_wait (resent)"] += 1
+            await asyncio.sleep(reply.get("retry_after_ms", 1000) / 1000)
+        latencies.append(time.monotonic() - started)
+        outcomes["ok" if intent == "add_order" else intent] += 1
+        await asyncio.sleep(args.think_ms / 1000)
+
+
+async def measure(url: str, args) -> tuple:
+    outcomes, latencies = collections.Counter(), []
+    async with httpx.AsyncClient(base_url=url, timeout=30, limits=httpx.Limits(max_connections=1000)) as client:
+        start = time.monotonic()
+        deadline = start + args.duration_s
+        await asyncio.gather(*(kiosk(client, k, deadline, outcomes, latencies, args) for k in range(args.kiosks)))
+        elapsed = time.monotonic() - start
+        admission = (await client.get("/debug-admission")).json()
+    return outcomes, latencies, elapsed, admission
+
+
+def main(args):
+    llm = ServerThread(create_fake_openai_app(
+        LatencyModel(args.llm_delay_ms, args.llm_delay_ms / 5, "normal"), rate_limit_rps=args.upstream_rps)).start()
+    tts = ServerThread(create_fake_tts_app(LatencyModel(args.tts_delay_ms, args.tts_delay_ms / 4))).start()
+    base_env = {
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{llm.url}/v1",
+        "TTS_PROVIDER": "GoogleCloudTTSRest",
+        "GOOGLE_TTS_ENDPOINT": tts.url,
+        "TTS_PATH": tempfile.mkdtemp(prefix="vera-bench-tts-"),
+        "TTS_CACHE_PATH": tempfile.mkdtemp(prefix="vera-bench-tts-cache-"),
+        "INTENT_FASTPATH_ENABLED": "false",
+        "SESSION_BACKEND": "memory",
+        "LLM_HEDGE_AFTER_MS": "off",
+    }
+    setups = [
+        ("unlimited", {"ADMISSION_MAX_ACTIVE": "0"}),
+        ("admission", {
+            "ADMISSION_MAX_ACTIVE": str(args.max_active),
+            "ADMISSION_MAX_QUEUE": str(args.max_queue),
+            "ADMISSION_MAX_WAIT_MS": str(args.max_wait_ms),
+            "LLM_RATE_LIMIT_RPM": str(args.upstream_rps * 60 * args.budget_fraction),
+            "RATE_LIMIT_BURST_SECONDS": "0.25",
+        }),
+    ]
+    print(f"{args.kiosks} kiosks for {args.duration_s:.0f}s, LLM ~{args.llm_delay_ms:.0f} ms limited to "
+          f"{args.upstream_rps:.0f} req/s upstream")
+    for label, env in setups:
+        rejected_before, requests_before = llm.app.state.rate_limited, llm.app.state.requests
+        process, url = start_app(1, {**base_env, **env})
+        try:
+            outcomes, latencies, elapsed, admission = asyncio.run(measure(url, args))
+            rss = peak_rss_mb(process.pid)
+        finally:
+            process.terminate()
+            process.wait(timeout=15)
+        print(f"\n{label}: {outcomes['ok'] / elapsed:.1f} orders/s, turn p50 {percentile(latencies, 50) * 1000:.0f} ms "
+              f"p95 {percentile(latencies, 95) * 1000:.0f} ms p99 {percentile(latencies, 99) * 1000:.0f} ms, "
+              f"peak RSS {rss:.0f} MB, upstream calls {llm.app.state.requests - requests_before} "
+              f"(429: {llm.app.state.rate_limited - rejected_before})")
+        print(f"  outcomes: {dict(outcomes)}")
+        print(f"  admission: max queue {admission['max_depth_seen']}, wait {admission['wait_ms']}, "
+              f"shed {admission['shed']}")
+
+    llm.stop()
+    tts.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kiosks", type=int, default=150)
+    parser.add_argument("--duration-s", type=float, default=30)
+    parser.add_argument("--upstream-rps", type=float, default=20)
+    parser.add_argument("--llm-delay-ms", type=float, default=1000)
+    parser.add_argument("--tts-delay-ms", type=float, default=80)
+    parser.add_argument("--max-active", type=int, default=24)
+    parser.add_argument("--max-queue", type=int, default=48)
+    parser.add_argument("--max-wait-ms", type=float, default=3000)
+    parser.add_argument("--think-ms", type=float, default=4000)
+    parser.add_argument("--budget-fraction", type=float, default=0.9, help="LLM budget as a fraction of the upstream limit")
+    parser.add_argument("--max-resends", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,59 @@
+"""Throughput / p99 of concurrent /ask turns against delayed LLM/TTS stand-ins.
+
+    cd server && python -m benchmarks.bench_async_ask --kiosks 32 --turns 4
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.standins import LatencyModel, percentile, start_stack
+
+SCRIPT = ["สวัสดี", "ขอลาเต้เย็น 1 แก้ว", "ชาไทยเย็นด้วยค่ะ", "แค่นี้"]
+
+
+async def run_kiosk(client: httpx.AsyncClient, kiosk_id: int, turns: int, latencies: list):
+    session_id = f"bench-kiosk-{kiosk_id}"
+    for i in range(turns):
+        text = SCRIPT[i % len(SCRIPT)]
+        start = time.perf_counter()
+        res = await client.post("/ask", json={"text": text, "session_id": session_id})
+        res.raise_for_status()
+        audio = await client.get(res.json()["tts_url"])
+        audio.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    await client.post("/reset-session", json={"session_id": session_id})
+
+
+async def main(args):
+    server, standins = start_stack(
+        LatencyModel(args.llm_delay_ms, args.jitter_ms),
+        LatencyModel(args.tts_delay_ms, args.jitter_ms),
+    )
+    latencies = []
+    limits = httpx.Limits(max_connections=args.kiosks)
+    async with httpx.AsyncClient(base_url=server.url, limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_kiosk(client, k, args.turns, latencies) for k in range(args.kiosks)))
+        elapsed = time.perf_counter() - start
+
+    for s in [server, *standins]:
+        s.stop()
+
+    serial_floor = (args.llm_delay_ms + args.tts_delay_ms) / 1000
+    print(f"kiosks={args.kiosks} turns/kiosk={args.turns} llm={args.llm_delay_ms}ms tts={args.tts_delay_ms}ms")
+    print(f"turns={len(latencies)} elapsed={elapsed:.2f}s throughput={len(latencies) / elapsed:.1f} turns/s")
+    print(f"latency p50={percentile(latencies, 50) * 1000:.0f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.0f}ms "
+          f"(upstream floor {serial_floor * 1000:.0f}ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kiosks", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--llm-delay-ms", type=float, default=800)
+    parser.add_argument("--tts-delay-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,103 @@
+"""Customer sessions with and without the LLM response cache.
+
+    cd server && python -m benchmarks.bench_llm_cache --sessions 200 --concurrency 8 --cancel-rate 0.3
+
+Every session resets, greets ("สวัสดี"), orders one drink and then either confirms or, with
+``--cancel-rate``, cancels straight after the greeting. The fast path is off so each turn would
+need the LLM stand-in (~``--llm-delay-ms``). Each setup runs ``uvicorn app.main:app`` in its own
+process:
+
+  no cache   LLM_CACHE_ENABLED=false (the previous behaviour)
+  cache      LLM_CACHE_ENABLED=true, greeting and cancel_order replies cached
+
+The table shows per-turn latency for greetings, cancels and orders, the LLM calls made and the
+cache's hit rate and saved tokens from ``/debug-llm-cache``.
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.bench_workers import start_app
+from benchmarks.standins import LatencyModel, ServerThread, create_fake_openai_app, create_fake_tts_app, percentile
+
+ORDERS = ["ขอลาเต้เย็นแก้วนึง", "เอาโกโก้เย็น", "ชาไทยเย็นหนึ่งแก้ว"]
+
+
+async def session(client, session_id: str, rng: random.Random, latencies: dict, args):
+    await client.post("/reset-session", json={"session_id": session_id})
+    turns = [("greeting", "สวัสดี")]
+    if rng.random() < args.cancel_rate:
+        turns.append(("cancel", "ยกเลิก"))
+    else:
+        turns += [("order", rng.choice(ORDERS)), ("confirm", "ยืนยัน")]
+    for kind, text in turns:
+        started = time.monotonic()
+        await client.post("/ask", json={"text": text, "session_id": session_id})
+        latencies.setdefault(kind, []).append(time.monotonic() - started)
+
+
+async def measure(url: str, args) -> tuple:
+    rng = random.Random(args.seed)
+    latencies = {}
+    gate = asyncio.Semaphore(args.concurrency)
+
+    async def one(i: int):
+        async with gate:
+            await session(client, f"cache-{i}", rng, latencies, args)
+
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        await asyncio.gather(*(one(i) for i in range(args.sessions)))
+        cache = (await client.get("/debug-llm-cache")).json()
+    return latencies, cache
+
+
+def main(args):
+    llm = ServerThread(create_fake_openai_app(LatencyModel(args.llm_delay_ms, args.llm_delay_ms / 5, "normal"))).start()
+    tts = ServerThread(create_fake_tts_app(LatencyModel(args.tts_delay_ms, args.tts_delay_ms / 4))).start()
+    base_env = {
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{llm.url}/v1",
+        "TTS_PROVIDER": "GoogleCloudTTSRest",
+        "GOOGLE_TTS_ENDPOINT": tts.url,
+        "TTS_PATH": tempfile.mkdtemp(prefix="vera-bench-tts-"),
+        "INTENT_FASTPATH_ENABLED": "false",
+        "SESSION_BACKEND": "memory",
+        "LLM_HEDGE_AFTER_MS": "off",
+    }
+    print(f"{args.sessions} sessions, concurrency {args.concurrency}, {args.cancel_rate:.0%} cancel after greeting, "
+          f"LLM ~{args.llm_delay_ms:.0f} ms")
+    print(f"{'setup':>9s} {'greet p50':>10s} {'greet p95':>10s} {'cancel p50':>11s} {'order p50':>10s} "
+          f"{'LLM calls':>10s} {'hit rate':>9s} {'tokens saved':>13s}")
+    for label, enabled in (("no cache", "false"), ("cache", "true")):
+        requests_before = llm.app.state.requests
+        process, url = start_app(1, {**base_env, "LLM_CACHE_ENABLED": enabled,
+                                     "TTS_CACHE_PATH": tempfile.mkdtemp(prefix="vera-bench-tts-cache-")})
+        try:
+            latencies, cache = asyncio.run(measure(url, args))
+        finally:
+            process.terminate()
+            process.wait(timeout=15)
+        saved = cache.get("tokens_saved", {})
+        print(f"{label:>9s} {percentile(latencies['greeting'], 50) * 1000:10.0f} "
+              f"{percentile(latencies['greeting'], 95) * 1000:10.0f} "
+              f"{percentile(latencies.get('cancel', [0]), 50) * 1000:11.0f} "
+              f"{percentile(latencies['order'], 50) * 1000:10.0f} {llm.app.state.requests - requests_before:10d} "
+              f"{cache.get('hit_rate', 0):9.1%} {saved.get('prompt', 0) + saved.get('completion', 0):13d}")
+
+    llm.stop()
+    tts.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cancel-rate", type=float, default=0.3)
+    parser.add_argument("--llm-delay-ms", type=float, default=900)
+    parser.add_argument("--tts-delay-ms", type=float, default=80)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
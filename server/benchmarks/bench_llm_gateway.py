@@ -0,0 +1,128 @@
+"""LLM turn latency with deadlines and hedged calls, against a stand-in that stalls now and then.
+
+    cd server && python -m benchmarks.bench_llm_gateway --requests 300 --stall-rate 0.04 --stall-ms 8000
+
+The primary model answers in ~``--base-ms`` but ``--stall-rate`` of its calls hang for an extra
+``--stall-ms``. The fallback model (``--fallback-model``) is faster and never stalls. ``--stream``
+measures time to the first content token instead of the whole completion.
+
+Rows:
+  legacy          one call, no timeout, no hedge (what ``ask_gpt_async`` used to do)
+  hedge N ms      same model hedged after a fixed delay
+  auto->fallback  hedged on the fallback model after the primary's recent p95
+  budget N ms     no hedge, only the per-turn deadline (late turns get the apology)
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.services.llm_gateway import LLMGateway, LLMUnavailable
+from benchmarks.standins import LatencyModel, ServerThread, create_fake_openai_app, percentile
+
+MESSAGES = [
+    {"role": "system", "content": "id|name|price\nM002|ลาเต้เย็น|65"},
+    {"role": "user", "content": "ลูกค้าพูดว่า: ขอลาเต้เย็นแก้วนึง"},
+]
+
+
+class Legacy:
+    def __init__(self, client, model: str):
+        self.client = client
+        self.model = model
+
+    async def complete(self, messages, response_format=None, deadline=None):
+        response = await self.client.chat.completions.create(model=self.model, messages=messages)
+        return response.choices[0].message.content
+
+    async def stream(self, messages, response_format=None, deadline=None):
+        stream = await self.client.chat.completions.create(model=self.model, messages=messages, stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+async def one_turn(llm, stream: bool, budget_s: float) -> tuple:
+    started = time.monotonic()
+    deadline = started + budget_s if budget_s else None
+    try:
+        if stream:
+            deltas = llm.stream(MESSAGES, deadline=deadline)
+            try:
+                await deltas.__anext__()
+                first = time.monotonic() - started
+                async for _ in deltas:
+                    pass
+            finally:
+                await deltas.aclose()
+            return first, False
+        await llm.complete(MESSAGES, deadline=deadline)
+        return time.monotonic() - started, False
+    except LLMUnavailable:
+        return time.monotonic() - started, True
+
+
+async def run(llm, requests: int, concurrency: int, stream: bool, budget_s: float = 0) -> tuple:
+    gate = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def one():
+        async with gate:
+            results.append(await one_turn(llm, stream, budget_s))
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return [latency for latency, _ in results], sum(apology for _, apology in results)
+
+
+async def main(args):
+    primary = LatencyModel(args.base_ms, args.jitter_ms, "normal", args.stall_rate, args.stall_ms)
+    fallback = LatencyModel(args.base_ms * 0.6, args.jitter_ms * 0.6, "normal")
+    server = ServerThread(create_fake_openai_app(primary, model_latency={args.fallback_model: fallback})).start()
+    client = AsyncOpenAI(api_key="bench", base_url=f"{server.url}/v1", http_client=httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=128, max_keepalive_connections=64), timeout=60))
+
+    setups = [
+        ("legacy", lambda: Legacy(client, args.model), 0),
+        (f"hedge {args.hedge_ms:.0f} ms", lambda: LLMGateway(client, args.model, hedge_after_s=args.hedge_ms / 1000), 0),
+        ("auto->fallback", lambda: LLMGateway(client, args.model, hedge_model=args.fallback_model, hedge_after_s=None), 0),
+        (f"budget {args.budget_ms:.0f} ms", lambda: LLMGateway(client, args.model, hedging=False), args.budget_ms / 1000),
+    ]
+    print(f"{args.requests} turns, concurrency {args.concurrency}, {args.model} ~{args.base_ms:.0f} ms with "
+          f"{args.stall_rate:.0%} stalls of +{args.stall_ms:.0f} ms, {args.fallback_model} ~{args.base_ms * 0.6:.0f} ms"
+          f"{', time to first token' if args.stream else ''}")
+    print(f"{'setup':>15s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'max ms':>8s} {'hedged':>7s} "
+          f"{'fallback won':>13s} {'apology':>8s}")
+    for label, make, budget_s in setups:
+        llm = make()
+        await run(llm, args.concurrency * 4, args.concurrency, args.stream)  # warm-up + p95 samples
+        if isinstance(llm, LLMGateway):
+            llm.hedged = 0
+            llm.wins.clear()
+            llm.models[args.fallback_model].wins = 0
+        latencies, apologies = await run(llm, args.requests, args.concurrency, args.stream, budget_s)
+        hedged = getattr(llm, "hedged", 0)
+        fallback_won = llm.models[args.fallback_model].wins if isinstance(llm, LLMGateway) else 0
+        print(f"{label:>15s} {percentile(latencies, 50) * 1000:8.0f} {percentile(latencies, 95) * 1000:8.0f} "
+              f"{percentile(latencies, 99) * 1000:8.0f} {max(latencies) * 1000:8.0f} {hedged / args.requests:6.1%} "
+              f"{fallback_won:13d} {apologies:8d}")
+
+    await client.close()
+    server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--fallback-model", default="gpt-4o-mini")
+    parser.add_argument("--base-ms", type=float, default=900)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--stall-rate", type=float, default=0.04)
+    parser.add_argument("--stall-ms", type=float, default=8000)
+    parser.add_argument("--hedge-ms", type=float, default=2000)
+    parser.add_argument("--budget-ms", type=float, default=2500)
+    parser.add_argument("--stream", action="store_true")
+    asyncio.run(main(parser.parse_args()))
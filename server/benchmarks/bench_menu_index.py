@@ -0,0 +1,116 @@
+"""MenuIndex vs. the old linear-scan lookup_price/validate_item on a large synthetic menu.
+
+    cd server && python -m benchmarks.bench_menu_index --items 400
+"""
+import argparse
+import json
+import random
+import re
+import time
+import unicodedata
+
+from app.services.menu_index import MenuIndex
+
+VARIANTS = ["", "ปั่น", "พิเศษ", "หวานน้อย", "ไม่หวาน", "เพิ่มช็อต", "นมโอ๊ต", "แก้วใหญ่",
+            "ไซส์เล็ก", "วิปครีม", "ไข่มุก", "บราวน์ชูก้าร์", "คาราเมล", "วานิลลา", "ฮันนี่", "มินต์",
+            "อัลมอนด์", "โซดา", "มะพร้าว", "ส้ม"]
+
+
+# --- legacy implementation (server/app/main.py before MenuIndex) ---
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFKC", text.strip().lower())
+
+
+def legacy_lookup_price(menu, item_name):
+    norm_input = normalize_text(item_name)
+    for item in menu:
+        if normalize_text(item["name"]) == norm_input or norm_input in normalize_text(item["name"]):
+            return item["price"]
+    return None
+
+
+def legacy_validate_item(menu, item_name):
+    norm_input = normalize_text(item_name)
+    for item in menu:
+        norm_menu_name = normalize_text(item["name"])
+        if norm_input == norm_menu_name:
+            return True
+        if norm_input in norm_menu_name:
+            return True
+        if re.search(rf"^{re.escape(norm_input)}", norm_menu_name):
+            return True
+    return False
+
+
+def build_menu(base, size):
+    menu = []
+    for variant in VARIANTS:
+        for item in base:
+            if len(menu) >= size:
+                return menu
+            menu.append({
+                "id": f"M{len(menu) + 1:04d}",
+                "name": f"{item['name']}{variant}",
+                "aliases": [f"{a}{variant}" for a in item.get("aliases", [])],
+                "price": item["price"] + 5 * VARIANTS.index(variant),
+            })
+    return menu
+
+
+def asr_noise(name):
+    # จำลอง ASR: ตัดวรรณยุกต์ / เปลี่ยนพยัญชนะเสียงเดียวกัน / ใส่ช่องว่าง
+    name = re.sub("[\u0E48-\u0E4B]", "", name) if random.random() < 0.5 else name
+    name = name.replace("ซ", "ส").replace("ค่า", "คา") if random.random() < 0.5 else name
+    return name.replace("เย็น", " เย็น") if random.random() < 0.3 else name
+
+
+def main(args):
+    random.seed(7)
+    with open("app/data/menu.json", "r", encoding="utf-8") as f:
+        menu = build_menu(json.load(f), args.items)
+
+    names = [m["name"] for m in menu]
+    queries = (
+        [random.choice(names) for _ in range(args.queries // 2)]
+        + [asr_noise(random.choice(names)) for _ in range(args.queries // 4)]
+        + [random.choice(names)[:6] for _ in range(args.queries // 8)]
+        + ["พิซซ่าฮาวายเอี้ยน"] * (args.queries // 8)
+    )
+    random.shuffle(queries)
+
+    start = time.perf_counter()
+    index = MenuIndex(menu)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # main.py เดิมเรียก validate_item + lookup_price ต่อ 1 รายการ
+    start = time.perf_counter()
+    legacy_hits = sum(
+        1 for q in queries
+        if legacy_validate_item(menu, q) and legacy_lookup_price(menu, q) is not None
+    )
+    legacy_s = time.perf_counter() - start
+
+    cold = MenuIndex(menu, cache_size=0)
+    start = time.perf_counter()
+    cold_hits = sum(1 for q in queries if cold.lookup(q) is not None)
+    cold_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    warm_hits = sum(1 for q in queries if index.lookup(q) is not None)
+    warm_s = time.perf_counter() - start
+
+    n = len(queries)
+    print(f"menu items={len(menu)} queries={n} index build={build_ms:.1f}ms")
+    print(f"legacy scan    : {legacy_s / n * 1e6:8.1f} us/item  resolved={legacy_hits}")
+    print(f"index (no cache): {cold_s / n * 1e6:8.1f} us/item  resolved={cold_hits}  "
+          f"speedup x{legacy_s / cold_s:.1f}")
+    print(f"index (cached) : {warm_s / n * 1e6:8.1f} us/item  resolved={warm_hits}  "
+          f"speedup x{legacy_s / warm_s:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=4000)
+    main(parser.parse_args())
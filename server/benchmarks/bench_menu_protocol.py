@@ -0,0 +1,118 @@
+"""Legacy (Thai names) vs. compact (id table) menu protocol: prompt/completion tokens and parse failures.
+
+    cd server && python -m benchmarks.bench_menu_protocol            # local OpenAI stand-in
+    cd server && python -m benchmarks.bench_menu_protocol --live     # real model from OPENAI_* env
+
+Token counts use ``app.utils.tokenizer`` (tiktoken when available) plus the ``usage`` the
+endpoint reports. Parse failures only mean something with ``--live``: the stand-in always
+answers valid JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from benchmarks.standins import LatencyModel, ServerThread, create_fake_openai_app
+
+UTTERANCES = [
+    "ขอลาเต้เย็นสองแก้ว",
+    "เอาโกโก้เย็นแก้วนึง แล้วก็ชาไทยเย็นหวานน้อย",
+    "มีโปรอะไรบ้างคะ",
+    "กาแฟดำเย็นหนึ่งแก้วค่ะ",
+    "ขอนมชมพูเย็นกับคาราเมลมัคคิอาโต้เย็นอย่างละแก้ว",
+    "อยากได้มอคค่าเย็นสามแก้ว",
+    "ลาเต้ร้อนหนึ่ง คาปูชิโน่เย็นหนึ่ง",
+    "เอสเปรสโซ่ไม่ใส่น้ำแข็งได้ไหม",
+]
+
+MODES = [
+    ("legacy", False, False),
+    ("compact", True, False),
+    ("compact+schema", True, True),
+]
+
+
+async def run_mode(name, compact, schema, menu, promotions, menu_index, args):
+    from app.config import OPENAI_MODEL
+    from app.services.gpt_client import async_client
+    from app.services.prompt_builder import PromptBuilder, build_reply_schema
+    from app.utils.tokenizer import count_message_tokens, count_tokens
+
+    system_prompt = PromptBuilder(menu, promotions, compact=compact).build_init_prompt()
+    extra = {"response_format": build_reply_schema(menu)} if schema else {}
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "local_completion_tokens": 0,
+              "json_failures": 0, "items": 0, "unresolved_items": 0}
+
+    for _ in range(args.rounds):
+        for text in UTTERANCES:
+            response = await async_client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": text}],
+                **extra,
+            )
+            content = response.choices[0].message.content.strip()
+            if response.usage is not None:
+                totals["prompt_tokens"] += response.usage.prompt_tokens
+                totals["completion_tokens"] += response.usage.completion_tokens
+            totals["local_completion_tokens"] += count_tokens(content)
+            try:
+                reply = json.loads(content)
+            except ValueError:
+                totals["json_failures"] += 1
+                continue
+            items = reply.get("items") or reply.get("item") or []
+            for item in [items] if isinstance(items, dict) else items:
+                totals["items"] += 1
+                if menu_index.resolve(item.get("id"), item.get("name")) is None:
+                    totals["unresolved_items"] += 1
+
+    turns = args.rounds * len(UTTERANCES)
+    return {
+        "mode": name,
+        "system_prompt_tokens": count_message_tokens(system_prompt),
+        "turns": turns,
+        "prompt_tokens_per_turn": round(totals["prompt_tokens"] / turns, 1),
+        "completion_tokens_per_turn": round(totals["completion_tokens"] / turns, 1),
+        "local_completion_tokens_per_turn": round(totals["local_completion_tokens"] / turns, 1),
+        "json_failure_rate": round(totals["json_failures"] / turns, 4),
+        "items": totals["items"],
+        "unresolved_items": totals["unresolved_items"],
+    }
+
+
+async def main(args):
+    if not args.live:
+        llm = ServerThread(create_fake_openai_app(LatencyModel())).start()
+        os.environ.update({"OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": f"{llm.url}/v1"})
+
+    from app.services.menu_index import MenuIndex
+
+    with open("app/data/menu.json", "r", encoding="utf-8") as f:
+        menu = json.load(f)
+    with open("app/data/promotions.json", "r", encoding="utf-8") as f:
+        promotions = json.load(f)
+    menu_index = MenuIndex(menu)
+
+    results = []
+    for name, compact, schema in MODES:
+        if schema and not args.live:
+            continue  # stand-in ไม่รองรับ response_format
+        results.append(await run_mode(name, compact, schema, menu, promotions, menu_index, args))
+
+    base = results[0]
+    for r in results:
+        saved = 1 - r["system_prompt_tokens"] / base["system_prompt_tokens"]
+        print(f"{r['mode']:15s} system={r['system_prompt_tokens']:5d} tok ({saved:+.0%} saved)  "
+              f"prompt/turn={r['prompt_tokens_per_turn']:7.1f}  completion/turn={r['local_completion_tokens_per_turn']:5.1f}  "
+              f"json_fail={r['json_failure_rate']:.1%}  unresolved={r['unresolved_items']}/{r['items']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--live", action="store_true", help="use the real model configured via OPENAI_* env")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--out", help="write results as JSON")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,118 @@
+"""PromotionEngine vs. interpreting every rule per cart, on large synthetic rule sets.
+
+    cd server && python -m benchmarks.bench_promotions --rules 10 100 1000 5000 --carts 20000
+
+Rules are random ``bulk_discount`` / ``point_campaign`` / ``new_customer_offer`` entries (some
+inactive or outside their date window) mixed with the real ``promotions.json`` and a base
+``point_campaign`` that sets ``baht_per_point``. Carts are 1-6 random menu lines. Both evaluators are checked to agree on total, discount and points.
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+
+from app.services.order import OrderItem
+from app.services.promotions import PromotionEngine, _is_active
+
+TODAY = datetime.date(2026, 6, 15)
+# promotions.json ไม่กำหนดอัตราแต้ม ใส่กฎฐานไว้ให้ทั้งสองฝั่งคิดแต้มจริง
+BASE_POINTS = {"id": "BASE", "title": "สะสมแต้ม", "type": "point_campaign",
+               "condition": {"min_spend": 0, "bonus_points_multiplier": 1, "baht_per_point": 10}}
+
+
+def random_rules(count: int, rng: random.Random) -> list:
+    rules = []
+    for i in range(count):
+        kind = rng.choice(["bulk_discount", "point_campaign", "point_campaign", "bulk_discount", "new_customer_offer"])
+        rule = {"id": f"R{i:05d}", "title": f"โปร {i}", "type": kind}
+        if kind == "bulk_discount":
+            rule["condition"] = {"min_quantity": rng.randint(2, 12), "discount_amount": rng.randint(5, 60)}
+        elif kind == "point_campaign":
+            rule["condition"] = {"min_spend": rng.randint(50, 800), "bonus_points_multiplier": rng.choice([1.5, 2, 3, 5])}
+        else:
+            rule["condition"] = {"first_order_only": True}
+        roll = rng.random()
+        if roll < 0.1:
+            rule["active"] = False
+        elif roll < 0.3:
+            start = TODAY + datetime.timedelta(days=rng.randint(-30, 30))
+            rule["valid_from"] = start.isoformat()
+            rule["valid_until"] = (start + datetime.timedelta(days=rng.randint(0, 20))).isoformat()
+        rules.append(rule)
+    return rules
+
+
+def random_carts(menu: list, count: int, rng: random.Random) -> list:
+    return [
+        [OrderItem(name=m["name"], qty=rng.randint(1, 4), price=m["price"]) for m in rng.sample(menu, rng.randint(1, 6))]
+        for _ in range(count)
+    ]
+
+
+# --- the straightforward evaluator: every rule is interpreted against every cart ---
+
+def interpret(rules: list, cart: list) -> tuple:
+    subtotal = sum((item.price or 0) * item.qty for item in cart)
+    quantity = sum(item.qty for item in cart)
+    discount = 0.0
+    for rule in rules:
+        if not _is_active(rule, TODAY):
+            continue
+        cond = rule["condition"]
+        if rule["type"] == "bulk_discount" and quantity >= cond["min_quantity"]:
+            discount = max(discount, float(cond["discount_amount"]))
+    total = subtotal - min(discount, subtotal)
+    multiplier = 1.0
+    baht_per_point = None
+    for rule in rules:
+        if not _is_active(rule, TODAY):
+            continue
+        cond = rule["condition"]
+        if rule["type"] == "point_campaign" and cond.get("baht_per_point"):
+            baht_per_point = max(baht_per_point or 0, float(cond["baht_per_point"]))
+        if rule["type"] == "point_campaign" and total >= cond["min_spend"]:
+            multiplier = max(multiplier, float(cond["bonus_points_multiplier"]))
+    points = int(total // baht_per_point * multiplier) if baht_per_point else 0
+    return total, subtotal - total, points
+
+
+def main(args):
+    with open("app/data/menu.json", encoding="utf-8") as f:
+        menu = json.load(f)
+    with open("app/data/promotions.json", encoding="utf-8") as f:
+        promotions = json.load(f)
+    rng = random.Random(args.seed)
+    carts = random_carts(menu, args.carts, rng)
+
+    print(f"{args.carts} carts, {sum(len(c) for c in carts) / len(carts):.1f} lines/cart")
+    print(f"{'rules':>6s} {'interpret us/cart':>18s} {'engine us/cart':>15s} {'compile ms':>11s} {'speedup':>8s}")
+    for count in args.rules:
+        rules = promotions + [BASE_POINTS] + random_rules(count, rng)
+
+        start = time.perf_counter()
+        expected = [interpret(rules, cart) for cart in carts]
+        interpreted = (time.perf_counter() - start) / len(carts)
+
+        engine = PromotionEngine(rules)
+        start = time.perf_counter()
+        engine._compile(TODAY)
+        compile_s = time.perf_counter() - start
+        start = time.perf_counter()
+        results = [engine.evaluate(cart, today=TODAY) for cart in carts]
+        compiled = (time.perf_counter() - start) / len(carts)
+
+        for (total, discount, points), priced in zip(expected, results):
+            got = (priced.total, priced.subtotal - priced.total, priced.points)
+            if got != (total, discount, points):
+                raise AssertionError(f"mismatch: {got} != {(total, discount, points)}")
+        print(f"{len(rules):6d} {interpreted * 1e6:18.1f} {compiled * 1e6:15.1f} {compile_s * 1000:11.2f} "
+              f"{interpreted / compiled:7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--carts", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
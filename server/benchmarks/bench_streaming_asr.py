@@ -0,0 +1,129 @@
+"""End of speech -> first reply audio: recognize-after-speech + /ask vs. streaming /ws/asr.
+
+    cd server && python -m benchmarks.bench_streaming_asr --rounds 10 --speech-s 2.0
+
+Runs the app against the LLM/TTS stand-ins with the offline ``standin`` recognizer, which costs
+``--decode-rtf`` seconds per second of audio plus ``--finalize-ms``. A simulated kiosk speaks for
+``--speech-s`` seconds (30 ms frames, paced in real time):
+
+* batch: the old flow; the utterance is buffered, recognized after VAD ends it, then ``/ask``
+  is posted and the reply audio fetched.
+* stream: frames go over one persistent WebSocket while speaking; after the end marker the
+  server finalizes and runs the ``/ask`` pipeline itself, the reply arrives on the same socket.
+
+Both modes use inline audio (or ``--stream-tts`` for ``/speak-stream``) and report the time from
+the last voiced frame to the first byte of reply audio.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import websockets
+
+from benchmarks.load_test import ORDERS
+from benchmarks.standins import LatencyModel, percentile, start_stack
+
+SAMPLE_RATE = 48000
+FRAME_MS = 30
+
+
+async def first_stream_audio(client: httpx.AsyncClient, url: str):
+    async with client.stream("GET", url, params={"framed": 1}) as res:
+        async for _ in res.aiter_raw():
+            return time.perf_counter()
+    return None
+
+
+async def speak(ws, seconds: float, send: bool):
+    frame = b"\x00\x00" * (SAMPLE_RATE * FRAME_MS // 1000)
+    frames = [frame] * int(seconds * 1000 / FRAME_MS)
+    started = time.perf_counter()
+    for i, f in enumerate(frames):
+        if send:
+            await ws.send(f)
+        # เว้นจังหวะตามเวลาจริงเหมือนไมค์
+        await asyncio.sleep(max(0.0, started + (i + 1) * FRAME_MS / 1000 - time.perf_counter()))
+    return frames
+
+
+async def recv_event(ws):
+    while True:
+        message = await ws.recv()
+        if isinstance(message, bytes):
+            return message
+        data = json.loads(message)
+        if data["type"] != "partial":
+            return data
+
+
+async def run_batch(ws, client, session_id, text, args) -> float:
+    frames = await speak(ws, args.speech_s, send=False)
+    ended = time.perf_counter()
+    await ws.send(json.dumps({"type": "start", "sample_rate": SAMPLE_RATE, "hint": text, "ask": False}))
+    for f in frames:
+        await ws.send(f)
+    await ws.send(json.dumps({"type": "end"}))
+    final = await recv_event(ws)
+    res = await client.post("/ask", json={"text": final["text"], "session_id": session_id,
+                                          "stream_tts": args.stream_tts, "inline_audio": not args.stream_tts})
+    if args.stream_tts:
+        return await first_stream_audio(client, res.json()["tts_stream_url"]) - ended
+    return time.perf_counter() - ended
+
+
+async def run_stream(ws, client, session_id, text, args) -> float:
+    await ws.send(json.dumps({"type": "start", "session_id": session_id, "sample_rate": SAMPLE_RATE, "hint": text,
+                              "stream_tts": args.stream_tts, "inline_audio": not args.stream_tts}))
+    await speak(ws, args.speech_s, send=True)
+    ended = time.perf_counter()
+    await ws.send(json.dumps({"type": "end"}))
+    await recv_event(ws)  # final
+    reply = await recv_event(ws)
+    if args.stream_tts:
+        return await first_stream_audio(client, reply["tts_stream_url"]) - ended
+    await recv_event(ws)  # inline audio
+    return time.perf_counter() - ended
+
+
+async def main(args):
+    server, upstreams = start_stack(
+        LatencyModel(args.llm_delay_ms, 0),
+        LatencyModel(args.tts_delay_ms, 0),
+        extra_env={"ASR_ENGINE": "standin", "INTENT_FASTPATH_ENABLED": "false", "TTS_CACHE_ENABLED": "false"},
+    )
+    from app import main as app_main
+    from app.services.asr import StandinRecognizer
+    app_main.recognizer = StandinRecognizer(decode_rtf=args.decode_rtf, finalize_ms=args.finalize_ms)
+
+    results = {}
+    ws_url = server.url.replace("http", "ws", 1) + "/ws/asr"
+    async with httpx.AsyncClient(base_url=server.url, timeout=60) as client:
+        for name, run in (("batch", run_batch), ("stream", run_stream)):
+            samples = []
+            async with websockets.connect(ws_url, max_size=None) as ws:
+                for i in range(args.rounds):
+                    samples.append(await run(ws, client, f"bench-asr-{name}-{i}", ORDERS[i % len(ORDERS)], args))
+            results[name] = samples
+
+    for s in (server, *upstreams):
+        s.stop()
+
+    print(f"speech={args.speech_s}s decode_rtf={args.decode_rtf} finalize={args.finalize_ms}ms "
+          f"llm={args.llm_delay_ms}ms tts={args.tts_delay_ms}ms audio={'stream' if args.stream_tts else 'inline'}")
+    for name, samples in results.items():
+        print(f"{name:7s} end-of-speech -> first audio  p50={percentile(samples, 50) * 1000:7.1f} ms  "
+              f"p95={percentile(samples, 95) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--speech-s", type=float, default=2.0)
+    parser.add_argument("--decode-rtf", type=float, default=0.15)
+    parser.add_argument("--finalize-ms", type=float, default=80)
+    parser.add_argument("--llm-delay-ms", type=float, default=400)
+    parser.add_argument("--tts-delay-ms", type=float, default=150)
+    parser.add_argument("--stream-tts", action="store_true")
+    asyncio.run(main(parser.parse_args()))
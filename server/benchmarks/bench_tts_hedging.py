@@ -0,0 +1,118 @@
+"""TTS tail latency with and without hedging, against a primary that stalls now and then.
+
+    cd server && python -m benchmarks.bench_tts_hedging --requests 400 --stall-rate 0.03 --stall-ms 3000
+
+The primary stand-in answers in ~250 ms but ``--stall-rate`` of its requests hang for an extra
+``--stall-ms`` (the multi-second cloud stalls we see in production). The secondary is a second
+stand-in (another region / API key) or, with ``--offline``, an ``OfflineProvider`` running
+``--offline-command`` (a dummy pipeline by default so espeak-ng/ffmpeg are not needed).
+
+Rows:
+  legacy        a new HTTP client per request, primary only (what ``generate_tts`` used to do)
+  primary       one long-lived client, primary only
+  hedge N ms    hedged after a fixed delay
+  hedge auto    hedged after the primary's recent p95
+"""
+import argparse
+import asyncio
+import shlex
+import sys
+import time
+
+import httpx
+
+from app.services.tts_providers import GoogleRestProvider, HedgedTTS, OfflineProvider
+from benchmarks.standins import LatencyModel, ServerThread, create_fake_tts_app, percentile
+
+LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+TEXTS = [f"<speak>ลาเต้เย็น {i} แก้ว รวม {65 * i} บาทค่ะ</speak>" for i in range(1, 40)]
+DUMMY_OFFLINE = f"{shlex.quote(sys.executable)} -c " + shlex.quote(
+    "import sys,time; text=sys.stdin.read(); time.sleep(0.35); sys.stdout.buffer.write(b'\\xff\\xf3' + bytes(len(text) * 200))")
+
+
+def rest(url: str, name: str = None, voice: str = "th-TH-Standard-A") -> GoogleRestProvider:
+    return GoogleRestProvider(url, "", "th-TH", voice, limits=LIMITS, timeout=30, name=name)
+
+
+class LegacyProvider:
+    # client ใหม่ทุกคำขอ แล้วปิดทิ้ง
+    def __init__(self, url: str):
+        self.url = url
+
+    async def synthesize(self, text: str) -> bytes:
+        provider = rest(self.url)
+        try:
+            return await provider.synthesize(text)
+        finally:
+            await provider.close()
+
+    async def close(self):
+        pass
+
+
+async def run(tts, requests: int, concurrency: int) -> list:
+    gate = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with gate:
+            started = time.perf_counter()
+            await tts.synthesize(TEXTS[i % len(TEXTS)])
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies
+
+
+async def main(args):
+    primary_model = LatencyModel(args.base_ms, args.jitter_ms, "normal", args.stall_rate, args.stall_ms)
+    secondary_model = LatencyModel(args.base_ms * 1.2, args.jitter_ms, "normal")
+    primary_server = ServerThread(create_fake_tts_app(primary_model)).start()
+    secondary_server = ServerThread(create_fake_tts_app(secondary_model)).start()
+
+    def secondary():
+        if args.offline:
+            return OfflineProvider(args.offline_command, max_concurrency=args.concurrency)
+        return rest(secondary_server.url, name="google_rest_secondary")
+
+    setups = [
+        ("legacy", lambda: LegacyProvider(primary_server.url)),
+        ("primary", lambda: HedgedTTS(rest(primary_server.url))),
+        (f"hedge {args.hedge_ms:.0f} ms", lambda: HedgedTTS(rest(primary_server.url), secondary(), args.hedge_ms / 1000)),
+        ("hedge auto", lambda: HedgedTTS(rest(primary_server.url), secondary(), None)),
+    ]
+    print(f"{args.requests} requests, concurrency {args.concurrency}, primary ~{args.base_ms:.0f} ms "
+          f"with {args.stall_rate:.0%} stalls of +{args.stall_ms:.0f} ms, secondary "
+          f"{'offline' if args.offline else 'rest'}")
+    print(f"{'setup':>14s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'max ms':>8s} {'hedged':>7s} {'sec. won':>9s}")
+    for label, make in setups:
+        tts = make()
+        # warm-up: pool + (สำหรับ auto) ตัวอย่าง latency ของ primary
+        await run(tts, args.concurrency * 3, args.concurrency)
+        if isinstance(tts, HedgedTTS):
+            tts.hedged = 0
+            tts.wins.clear()
+        latencies = await run(tts, args.requests, args.concurrency)
+        await tts.close()
+        hedged = getattr(tts, "hedged", 0)
+        won = getattr(tts, "wins", {}).get("secondary", 0)
+        print(f"{label:>14s} {percentile(latencies, 50) * 1000:8.0f} {percentile(latencies, 95) * 1000:8.0f} "
+              f"{percentile(latencies, 99) * 1000:8.0f} {max(latencies) * 1000:8.0f} "
+              f"{hedged / args.requests:6.1%} {won:9d}")
+
+    primary_server.stop()
+    secondary_server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--base-ms", type=float, default=250)
+    parser.add_argument("--jitter-ms", type=float, default=60)
+    parser.add_argument("--stall-rate", type=float, default=0.03)
+    parser.add_argument("--stall-ms", type=float, default=3000)
+    parser.add_argument("--hedge-ms", type=float, default=800)
+    parser.add_argument("--offline", action="store_true", help="use OfflineProvider as the secondary")
+    parser.add_argument("--offline-command", default=DUMMY_OFFLINE)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,139 @@
+"""Turns/sec as uvicorn workers scale, per session backend.
+
+    cd server && python -m benchmarks.bench_workers --workers 1 2 4 --backends memory sqlite redis
+
+For every backend and worker count the app runs as ``uvicorn app.main:app --workers N`` (a real
+multi-process server sharing one socket) against the LLM/TTS stand-ins and, for ``redis``, the
+in-process ``FakeRedis``. Kiosks run the load test conversations (``/ask`` then ``/speak``) for
+``--duration-s`` seconds. Besides throughput it reports:
+
+* speak 404: reply audio requested from a worker that did not create the ``/speak`` id.
+* lost turns: conversations whose final turn count (``/debug-session-tokens``, served by any
+  worker) is lower than the number of turns sent, i.e. history written by one worker that
+  another worker did not see.
+
+With ``memory`` both are expected to be non-zero as soon as there is more than one worker.
+Throughput only scales when the server is CPU-bound and the machine has the cores for it.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load_test import Recorder, build_conversation, run_turn
+from benchmarks.standins import (
+    SERVER_DIR, FakeRedis, LatencyModel, ServerThread, create_fake_openai_app, create_fake_tts_app, free_port,
+)
+
+
+def start_app(workers: int, env: dict) -> tuple:
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=SERVER_DIR, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/debug-tts-stream", timeout=1).status_code == 200:
+                # ให้ทุก worker boot เสร็จก่อนเริ่มวัด
+                time.sleep(1.0 + 0.5 * workers)
+                return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("app did not start")
+
+
+async def run_kiosk(client, recorder: Recorder, kiosk_id: int, deadline: float, counts: dict):
+    rng = random.Random(kiosk_id)
+    conv = 0
+    while time.perf_counter() < deadline:
+        session_id = f"workers-{kiosk_id}-{conv}"
+        conv += 1
+        sent = 0
+        for text in build_conversation(rng):
+            if await run_turn(client, recorder, session_id, text, stream=False):
+                sent += 1
+        res = await client.get(f"/debug-session-tokens/{session_id}")
+        turns = res.json().get("turns", 0) if res.status_code == 200 else 0
+        counts["conversations"] += 1
+        counts["lost_turns"] += max(0, sent - turns)
+        await client.post("/reset-session", json={"session_id": session_id})
+
+
+async def measure(url: str, args) -> dict:
+    recorder = Recorder()
+    counts = {"conversations": 0, "lost_turns": 0}
+    # connection ใหม่ทุก request เหมือน kiosk หลายเครื่อง ให้ kernel กระจายไปทุก worker
+    limits = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        deadline = start + args.duration_s
+        await asyncio.gather(*(run_kiosk(client, recorder, k, deadline, counts) for k in range(args.kiosks)))
+        elapsed = time.perf_counter() - start
+    summary = recorder.summary(elapsed)
+    turn = summary.get("turn", {})
+    return {
+        "turns_per_s": turn.get("count", 0) / elapsed,
+        "turn_p50_ms": turn.get("p50_ms", 0),
+        "turn_p95_ms": turn.get("p95_ms", 0),
+        "speak_404": summary.get("/speak", {}).get("errors", 0),
+        **counts,
+    }
+
+
+def main(args):
+    llm = ServerThread(create_fake_openai_app(LatencyModel(args.llm_delay_ms, args.llm_delay_ms / 4))).start()
+    tts = ServerThread(create_fake_tts_app(LatencyModel(args.tts_delay_ms, args.tts_delay_ms / 4))).start()
+    redis = FakeRedis().start()
+    base_env = {
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{llm.url}/v1",
+        "TTS_PROVIDER": "GoogleCloudTTSRest",
+        "GOOGLE_TTS_ENDPOINT": tts.url,
+        "TTS_PATH": tempfile.mkdtemp(prefix="vera-bench-tts-"),
+        # ไม่มี cache เพื่อให้ /speak ต้องพึ่ง registry (cache บนดิสก์ใช้ร่วมกันได้อยู่แล้ว)
+        "TTS_CACHE_ENABLED": "false",
+        "INTENT_FASTPATH_ENABLED": "false",
+        "REDIS_URL": redis.url,
+    }
+
+    print(f"cpus={os.cpu_count()} kiosks={args.kiosks} duration={args.duration_s}s "
+          f"llm={args.llm_delay_ms}ms tts={args.tts_delay_ms}ms")
+    print(f"{'backend':8s} {'workers':>7s} {'turns/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} "
+          f"{'speak 404':>9s} {'lost turns':>10s} {'convs':>6s}")
+    for backend in args.backends:
+        for workers in args.workers:
+            env = {**base_env, "SESSION_BACKEND": backend,
+                   "SESSION_DB_PATH": os.path.join(tempfile.mkdtemp(prefix="vera-bench-sessions-"), "sessions.db")}
+            process, url = start_app(workers, env)
+            try:
+                r = asyncio.run(measure(url, args))
+            finally:
+                process.terminate()
+                process.wait(timeout=15)
+            print(f"{backend:8s} {workers:7d} {r['turns_per_s']:8.1f} {r['turn_p50_ms']:8.1f} {r['turn_p95_ms']:8.1f} "
+                  f"{r['speak_404']:9d} {r['lost_turns']:10d} {r['conversations']:6d}")
+
+    for s in (llm, tts, redis):
+        s.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite", "redis"])
+    parser.add_argument("--kiosks", type=int, default=32)
+    parser.add_argument("--duration-s", type=float, default=15)
+    parser.add_argument("--llm-delay-ms", type=float, default=200)
+    parser.add_argument("--tts-delay-ms", type=float, default=60)
+    main(parser.parse_args())
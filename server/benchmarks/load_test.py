@@ -0,0 +1,245 @@
+"""Fleet load test: N simulated kiosks run scripted conversations against the app + stand-ins.
+
+    cd server && python -m benchmarks.load_test --kiosks 50 --conversations 3 --out results.json
+    cd server && python -m benchmarks.load_test --baseline results.json   # exit 1 on regression
+
+Each conversation is greeting -> 1..3 orders -> "แค่นี้" -> confirm, fetching the reply audio
+(``/speak`` or ``/speak-stream`` with ``--stream``) after every ``/ask`` and ending with
+``/reset-session``. The result file holds per-endpoint p50/p95/p99, error rates, throughput
+and upstream call counts, so runs from different commits can be diffed or gated.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.standins import SERVER_DIR, LatencyModel, percentile, start_stack
+
+GREETINGS = ["สวัสดี", "สวัสดีค่ะ", "เริ่มใหม่"]
+ORDERS = [
+    "ขอลาเต้เย็นสองแก้ว",
+    "เอาโกโก้เย็นแก้วนึงค่ะ",
+    "ชาไทยเย็นหนึ่งแก้ว กับ อเมริกาโน่เย็น",
+    "มอคค่าเย็น 2 แก้วครับ",
+    "ขอลาเต้ร้อนด้วยค่ะ",
+    "อยากได้ลาเต้เย็นแบบไม่หวาน",  # มีคำปฏิเสธ ต้องไป LLM
+    "มีโปรอะไรบ้างคะ",
+]
+SUMMARY = "แค่นี้"
+CONFIRMS = ["ยืนยัน", "ถูกต้องค่ะ", "โอเคครับ"]
+
+ENDPOINTS = ["/ask", "/speak", "/speak-stream", "/reset-session", "turn"]
+
+
+def build_conversation(rng: random.Random) -> list:
+    orders = rng.sample(ORDERS, rng.randint(1, 3))
+    return [rng.choice(GREETINGS), *orders, SUMMARY, rng.choice(CONFIRMS)]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = defaultdict(list)
+
+    def ok(self, endpoint: str, seconds: float):
+        self.latencies[endpoint].append(seconds)
+
+    def fail(self, endpoint: str, seconds: float, reason: str):
+        self.latencies[endpoint].append(seconds)
+        self.errors[endpoint] += 1
+        if len(self.error_samples[endpoint]) < 5:
+            self.error_samples[endpoint].append(reason)
+
+    def summary(self, elapsed: float) -> dict:
+        result = {}
+        for endpoint in ENDPOINTS:
+            values = self.latencies.get(endpoint, [])
+            if not values:
+                continue
+            count = len(values)
+            result[endpoint] = {
+                "count": count,
+                "errors": self.errors[endpoint],
+                "error_rate": round(self.errors[endpoint] / count, 4),
+                "rps": round(count / elapsed, 2),
+                "mean_ms": round(sum(values) / count * 1000, 1),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "max_ms": round(max(values) * 1000, 1),
+                "error_samples": self.error_samples[endpoint],
+            }
+        return result
+
+
+async def timed(recorder: Recorder, endpoint: str, request):
+    start = time.perf_counter()
+    try:
+        res = await request
+    except httpx.HTTPError as e:
+        recorder.fail(endpoint, time.perf_counter() - start, type(e).__name__)
+        return None
+    elapsed = time.perf_counter() - start
+    if res.status_code >= 400:
+        recorder.fail(endpoint, elapsed, f"HTTP {res.status_code}")
+        return None
+    recorder.ok(endpoint, elapsed)
+    return res
+
+
+async def fetch_stream(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    # นับเวลาจนได้เสียงครบทุก chunk ไม่ใช่แค่ header
+    async with client.stream("GET", url, params={"framed": 1}) as res:
+        if res.status_code < 400:
+            async for _ in res.aiter_raw():
+                pass
+    return res
+
+
+async def run_turn(client, recorder: Recorder, session_id: str, text: str, stream: bool) -> bool:
+    start = time.perf_counter()
+    res = await timed(recorder, "/ask", client.post(
+        "/ask", json={"text": text, "session_id": session_id, "stream_tts": stream}))
+    if res is None:
+        recorder.fail("turn", time.perf_counter() - start, "ask failed")
+        return False
+
+    body = res.json()
+    if body.get("tts_stream_url"):
+        audio = await timed(recorder, "/speak-stream", fetch_stream(client, body["tts_stream_url"]))
+    elif body.get("tts_url"):
+        audio = await timed(recorder, "/speak", client.get(body["tts_url"]))
+    else:
+        audio = None
+    if audio is None:
+        recorder.fail("turn", time.perf_counter() - start, "no audio")
+        return False
+    recorder.ok("turn", time.perf_counter() - start)
+    return True
+
+
+async def run_kiosk(client, recorder: Recorder, kiosk_id: int, args, deadline: float):
+    rng = random.Random(args.seed * 1000 + kiosk_id)
+    await asyncio.sleep(rng.uniform(0, args.ramp_s))
+    for conv in range(args.conversations):
+        if time.perf_counter() > deadline:
+            return
+        session_id = f"load-kiosk-{kiosk_id}-{conv}"
+        for text in build_conversation(rng):
+            await run_turn(client, recorder, session_id, text, args.stream)
+            if args.think_ms:
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+        await timed(recorder, "/reset-session", client.post("/reset-session", json={"session_id": session_id}))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        return ""
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    problems = []
+    for endpoint, stats in result["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(endpoint)
+        if not base:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if base[key] > 0 and stats[key] > base[key] * (1 + tolerance):
+                problems.append(f"{endpoint} {key} {base[key]} -> {stats[key]}")
+        if stats["error_rate"] > base["error_rate"] + 0.01:
+            problems.append(f"{endpoint} error_rate {base['error_rate']} -> {stats['error_rate']}")
+    base_tp = baseline.get("throughput_turns_per_s", 0)
+    if base_tp and result["throughput_turns_per_s"] < base_tp * (1 - tolerance):
+        problems.append(f"throughput {base_tp} -> {result['throughput_turns_per_s']}")
+    return problems
+
+
+async def main(args) -> int:
+    server, (llm, tts) = start_stack(
+        LatencyModel(args.llm_delay_ms, args.llm_jitter_ms, args.distribution),
+        LatencyModel(args.tts_delay_ms, args.tts_jitter_ms, args.distribution),
+        extra_env={"INTENT_FASTPATH_ENABLED": "false"} if args.no_fastpath else None,
+        llm_error_rate=args.llm_error_rate,
+        tts_error_rate=args.tts_error_rate,
+    )
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.kiosks * 2, max_keepalive_connections=args.kiosks * 2)
+    async with httpx.AsyncClient(base_url=server.url, limits=limits, timeout=args.timeout_s) as client:
+        start = time.perf_counter()
+        deadline = start + args.duration_s if args.duration_s else float("inf")
+        await asyncio.gather(*(run_kiosk(client, recorder, k, args, deadline) for k in range(args.kiosks)))
+        elapsed = time.perf_counter() - start
+
+    for s in (server, llm, tts):
+        s.stop()
+
+    endpoints = recorder.summary(elapsed)
+    turns = endpoints.get("turn", {}).get("count", 0)
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "elapsed_s": round(elapsed, 2),
+        "throughput_turns_per_s": round(turns / elapsed, 2),
+        "upstream": {
+            "llm_requests": llm.app.state.requests, "llm_injected_errors": llm.app.state.errors,
+            "tts_requests": tts.app.state.requests, "tts_injected_errors": tts.app.state.errors,
+        },
+        "endpoints": endpoints,
+    }
+
+    print(f"kiosks={args.kiosks} conversations/kiosk={args.conversations} elapsed={elapsed:.1f}s "
+          f"throughput={result['throughput_turns_per_s']} turns/s  llm calls={llm.app.state.requests} "
+          f"tts calls={tts.app.state.requests}")
+    for endpoint, stats in endpoints.items():
+        print(f"  {endpoint:15s} n={stats['count']:6d} err={stats['error_rate']:6.2%} "
+              f"p50={stats['p50_ms']:8.1f} p95={stats['p95_ms']:8.1f} p99={stats['p99_ms']:8.1f} ms")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = compare(result, json.load(f), args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kiosks", type=int, default=50)
+    parser.add_argument("--conversations", type=int, default=3, help="conversations per kiosk")
+    parser.add_argument("--duration-s", type=float, default=0, help="stop starting new conversations after this")
+    parser.add_argument("--ramp-s", type=float, default=2.0, help="spread kiosk start times over this window")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between turns")
+    parser.add_argument("--stream", action="store_true", help="use stream_tts and /speak-stream")
+    parser.add_argument("--no-fastpath", action="store_true", help="send every turn to the LLM")
+    parser.add_argument("--llm-delay-ms", type=float, default=800)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200)
+    parser.add_argument("--tts-delay-ms", type=float, default=300)
+    parser.add_argument("--tts-jitter-ms", type=float, default=80)
+    parser.add_argument("--distribution", choices=["uniform", "normal", "lognormal"], default="lognormal")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--tts-error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-s", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write machine-readable results (JSON)")
+    parser.add_argument("--baseline", help="compare against a previous --out file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,357 @@
+"""Local stand-ins for OpenAI, Google TTS and Redis used by the benchmarks.
+
+Run benchmarks from the ``server/`` directory, e.g.::
+
+    python -m benchmarks.bench_async_ask --kiosks 32
+"""
+import asyncio
+import base64
+import collections
+import fnmatch
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class LatencyModel:
+    base_ms: float = 0.0
+    jitter_ms: float = 0.0
+    distribution: str = "uniform"  # uniform | normal | lognormal
+    stall_rate: float = 0.0  # สัดส่วนคำขอที่ค้างเพิ่มอีก stall_ms (จำลอง cloud stall หลายวินาที)
+    stall_ms: float = 0.0
+
+    def sample(self) -> float:
+        stall = self.stall_ms / 1000 if self.stall_rate and random.random() < self.stall_rate else 0.0
+        return self._sample_base() + stall
+
+    def _sample_base(self) -> float:
+        if self.jitter_ms <= 0:
+            return max(self.base_ms, 0.0) / 1000
+        if self.distribution == "normal":
+            ms = random.gauss(self.base_ms, self.jitter_ms)
+        elif self.distribution == "lognormal":
+            # heavy tail: median ~= base_ms, jitter controls spread
+            sigma = self.jitter_ms / max(self.base_ms, 1.0)
+            ms = self.base_ms * random.lognormvariate(0, sigma)
+        else:
+            ms = random.uniform(self.base_ms - self.jitter_ms, self.base_ms + self.jitter_ms)
+        return max(ms, 0.0) / 1000
+
+
+MENU_NAMES = {
+    "ลาเต้เย็น": "M002", "ลาเต้ร้อน": "M001", "โกโก้เย็น": "M012",
+    "ชาไทยเย็น": "M013", "อเมริกาโน่เย็น": "M006", "มอคค่าเย็น": "M010",
+}
+
+
+def canned_reply(messages: list) -> dict:
+    last = messages[-1]["content"] if messages else ""
+    compact = bool(messages) and "id|" in messages[0]["content"]
+    if '"greeting"' in last:
+        return {"intent": "greeting", "response": "<speak>สวัสดีค่ะ ยินดีต้อนรับสู่ร้านเวร่านะคะ รับอะไรดีคะ?</speak>"}
+    if '"cancel_order"' in last:
+        return {"intent": "cancel_order", "response": "<speak>ไม่เป็นไรค่ะ ยกเลิกรายการให้แล้วนะคะ</speak>"}
+    if "ลูกค้าสั่ง:" in last:
+        return {"intent": "confirm_order", "response": "<speak>สรุปรายการตามนี้นะคะ ถูกต้องไหมคะ?</speak>"}
+    for name, item_id in MENU_NAMES.items():
+        if name in last:
+            return {
+                "intent": "add_order",
+                **({"items": [{"id": item_id, "qty": 1}]} if compact else {"item": {"name": name, "qty": 1}}),
+                "response": f"<speak>รับ{name} 1 แก้วนะคะ</speak>",
+            }
+    return {"intent": "unknown", "response": "<speak>ขอโทษค่ะ ช่วยพูดอีกครั้งได้ไหมคะ?</speak>"}
+
+
+def _injected_error(app: FastAPI, error_rate: float):
+    if error_rate > 0 and random.random() < error_rate:
+        app.state.errors += 1
+        return JSONResponse({"error": {"message": "injected failure"}}, status_code=503)
+    return None
+
+
+def create_fake_openai_app(latency: LatencyModel, error_rate: float = 0.0, model_latency: dict = None,
+                           rate_limit_rps: float = 0.0) -> FastAPI:
+    # model_latency: {"model name": LatencyModel} แยก latency ตามรุ่น (เช่น fallback model ที่เร็วกว่า)
+    # rate_limit_rps: เกินจำนวนคำขอต่อวินาที (หน้าต่าง 1 วินาที) ตอบ 429 เหมือน upstream จริง
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.errors = 0
+    app.state.rate_limited = 0
+    app.state.models = collections.Counter()
+    recent = collections.deque()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        app.state.models[body.get("model")] += 1
+        if rate_limit_rps > 0:
+            now = time.monotonic()
+            while recent and recent[0] <= now - 1.0:
+                recent.popleft()
+            if len(recent) >= rate_limit_rps:
+                app.state.rate_limited += 1
+                return JSONResponse({"error": {"message": "rate limit exceeded"}}, status_code=429)
+            recent.append(now)
+        delay = (model_latency or {}).get(body.get("model"), latency).sample()
+        error = _injected_error(app, error_rate)
+        if error is not None:
+            await asyncio.sleep(delay)
+            return error
+        content = json.dumps(canned_reply(body.get("messages", [])), ensure_ascii=False)
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+        completion_tokens = len(content) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if body.get("stream"):
+            return StreamingResponse(
+                _sse_completion(app.state.requests, body.get("model", "fake"), content, usage, delay),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(delay)
+        return JSONResponse({
+            "id": f"chatcmpl-{app.state.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    return app
+
+
+async def _sse_completion(request_id: int, model: str, content: str, usage: dict, delay: float):
+    # ~40% ของ latency เป็น time-to-first-token ที่เหลือกระจายไปตาม token
+    pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+    await asyncio.sleep(delay * 0.4)
+    per_piece = delay * 0.6 / max(len(pieces), 1)
+
+    def event(choices, usage=None):
+        data = {
+            "id": f"chatcmpl-{request_id}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": choices,
+            "usage": usage,
+        }
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    for piece in pieces:
+        yield event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        await asyncio.sleep(per_piece)
+    yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+    yield event([], usage)
+    yield "data: [DONE]\n\n"
+
+
+def fake_audio(text: str) -> bytes:
+    # ไม่ใช่ MP3 จริง แค่ขนาดใกล้เคียง (~1KB ต่อ 5 ตัวอักษร)
+    return b"\xff\xf3" + bytes(len(text) * 200)
+
+
+def create_fake_tts_app(latency: LatencyModel, error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.errors = 0
+
+    @app.post("/v1/text:synthesize")
+    async def synthesize(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        await asyncio.sleep(latency.sample())
+        error = _injected_error(app, error_rate)
+        if error is not None:
+            return error
+        text = body["input"].get("ssml") or body["input"].get("text", "")
+        return JSONResponse({"audioContent": base64.b64encode(fake_audio(text)).decode()})
+
+    return app
+
+
+class FakeRedis:
+    """In-memory RESP2 server with the commands ``RedisStore`` uses (GET/SET PX/DEL/SCAN/AUTH/SELECT/PING
+    and WATCH/UNWATCH/MULTI/EXEC).
+
+    Runs its own event loop in a thread, so it can serve several uvicorn worker processes.
+    """
+
+    def __init__(self, port: int = None, latency: LatencyModel = None):
+        self.port = port or free_port()
+        self.url = f"redis://127.0.0.1:{self.port}/0"
+        self.latency = latency
+        self.data = {}  # key -> (value, expires_at)
+        self.revisions = {}  # key -> จำนวนครั้งที่ถูกเขียน/ลบ (ใช้ตรวจ WATCH)
+        self.commands = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        started = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._serve, "127.0.0.1", self.port), self._loop)
+        self._server = started.result(timeout=5)
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    async def _serve(self, reader, writer):
+        client = {"watch": {}, "multi": None}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                args = []
+                for _ in range(int(line[1:-2])):
+                    size = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(size + 2))[:-2])
+                if self.latency is not None:
+                    await asyncio.sleep(self.latency.sample())
+                self.commands += 1
+                writer.write(self._transact(client, args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _get(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    def _transact(self, client: dict, args) -> bytes:
+        command = args[0].upper()
+        if command == b"WATCH":
+            client["watch"].update({key: self.revisions.get(key, 0) for key in args[1:]})
+            return b"+OK\r\n"
+        if command == b"UNWATCH":
+            client["watch"].clear()
+            return b"+OK\r\n"
+        if command == b"MULTI":
+            client["multi"] = []
+            return b"+OK\r\n"
+        if command == b"EXEC":
+            queued, client["multi"] = client["multi"] or [], None
+            watched, client["watch"] = client["watch"], {}
+            if any(self.revisions.get(key, 0) != rev for key, rev in watched.items()):
+                return b"*-1\r\n"
+            return b"*%d\r\n" % len(queued) + b"".join(self._execute(queued_args) for queued_args in queued)
+        if client["multi"] is not None:
+            client["multi"].append(args)
+            return b"+QUEUED\r\n"
+        return self._execute(args)
+
+    def _execute(self, args) -> bytes:
+        command = args[0].upper()
+        if command in (b"PING", b"AUTH", b"SELECT"):
+            return b"+OK\r\n" if command != b"PING" else b"+PONG\r\n"
+        if command == b"GET":
+            entry = self._get(args[1])
+            return b"$-1\r\n" if entry is None else b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+        if command == b"SET":
+            expires_at = None
+            if len(args) >= 5 and args[3].upper() == b"PX":
+                expires_at = time.time() + int(args[4]) / 1000
+            self.data[args[1]] = (args[2], expires_at)
+            self.revisions[args[1]] = self.revisions.get(args[1], 0) + 1
+            return b"+OK\r\n"
+        if command == b"DEL":
+            for key in args[1:]:
+                self.revisions[key] = self.revisions.get(key, 0) + 1
+            removed = sum(self.data.pop(key, None) is not None for key in args[1:])
+            return b":%d\r\n" % removed
+        if command == b"SCAN":
+            # ส่งครบในรอบเดียว (cursor 0) พอสำหรับ benchmark
+            pattern = args[args.index(b"MATCH") + 1].decode() if b"MATCH" in args else "*"
+            keys = [k for k in list(self.data) if self._get(k) is not None and fnmatch.fnmatchcase(k.decode(), pattern)]
+            return b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(keys) + b"".join(b"$%d\r\n%s\r\n" % (len(k), k) for k in keys)
+        return b"-ERR unknown command '%s'\r\n" % command
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerThread:
+    def __init__(self, app, port: int = None):
+        self.app = app
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def start_stack(llm_latency: LatencyModel, tts_latency: LatencyModel, extra_env: dict = None,
+                llm_error_rate: float = 0.0, tts_error_rate: float = 0.0, llm_model_latency: dict = None,
+                llm_rate_limit_rps: float = 0.0):
+    """Start the stand-ins, point the app config at them and serve ``app.main``."""
+    llm = ServerThread(create_fake_openai_app(llm_latency, llm_error_rate, llm_model_latency, llm_rate_limit_rps)).start()
+    tts = ServerThread(create_fake_tts_app(tts_latency, tts_error_rate)).start()
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{llm.url}/v1",
+        "TTS_PROVIDER": "GoogleCloudTTSRest",
+        "GOOGLE_TTS_ENDPOINT": tts.url,
+        "TTS_PATH": tempfile.mkdtemp(prefix="vera-bench-tts-"),
+        "TTS_CACHE_PATH": tempfile.mkdtemp(prefix="vera-bench-tts-cache-"),
+        "SESSION_DB_PATH": os.path.join(tempfile.mkdtemp(prefix="vera-bench-sessions-"), "sessions.db"),
+        **(extra_env or {}),
+    })
+    os.chdir(SERVER_DIR)
+    if SERVER_DIR not in sys.path:
+        sys.path.insert(0, SERVER_DIR)
+    from app.main import app
+
+    server = ServerThread(app).start()
+    return server, [llm, tts]